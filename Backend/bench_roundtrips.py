@@ -0,0 +1,104 @@
+"""
+Before/after benchmark for the data-access layer.
+
+"before" opens a fresh connection per call and fetches with oracledb's
+default arraysize/prefetchrows, the way the handlers used to. "after" borrows
+a pooled session and uses the fetch presets from db.py.
+
+Usage: python bench_roundtrips.py [iterations]
+"""
+import sys
+import time
+
+import oracledb
+
+import db
+
+ROUNDTRIPS_SQL = """
+    SELECT s.value
+    FROM v$mystat s
+    JOIN v$statname n ON s.statistic# = n.statistic#
+    WHERE n.name = 'SQL*Net roundtrips to/from client'
+"""
+
+CASES = [
+    ("lob lookup", "SELECT id FROM lobs WHERE ROWNUM = 1", db.FETCH_SINGLE),
+    ("tables", """
+        SELECT t.id, t.name, t.schema_name, d.name AS database_name
+        FROM tables_metadata t
+        JOIN logical_databases d ON t.database_id = d.id
+        ORDER BY t.id
+    """, db.FETCH_BULK),
+    ("hierarchy", """
+        SELECT l.id, l.name, sa.id, sa.name, ldb.id, ldb.name, t.id, t.name
+        FROM LOBS l
+        LEFT JOIN SUBJECT_AREAS sa ON sa.lob_id = l.id
+        LEFT JOIN SUBJECT_AREA_LOGICAL_DATABASE sald ON sald.subject_area_id = sa.id
+        LEFT JOIN LOGICAL_DATABASES ldb ON ldb.id = sald.logical_database_id
+        LEFT JOIN TABLES_METADATA t ON t.database_id = ldb.id
+        ORDER BY l.id, sa.id, ldb.id, t.id
+    """, db.FETCH_BULK),
+    ("er relationships", """
+        SELECT id, from_table_id, from_column, to_table_id, to_column,
+               cardinality, relationship_type, created_at
+        FROM er_relationships
+        ORDER BY id
+    """, db.FETCH_BULK),
+]
+
+
+def roundtrips(conn):
+    """Session round-trip counter, or None if v$mystat is not readable"""
+    try:
+        with conn.cursor() as cur:
+            cur.execute(ROUNDTRIPS_SQL)
+            return cur.fetchone()[0]
+    except oracledb.DatabaseError:
+        return None
+
+
+def run_query(conn, sql, fetch):
+    with conn.cursor() as cur:
+        if fetch is not None:
+            db.tune(cur, fetch)
+        cur.execute(sql)
+        return len(cur.fetchall())
+
+
+def measure_roundtrips(conn, sql, fetch):
+    before = roundtrips(conn)
+    if before is None:
+        return None
+    run_query(conn, sql, fetch)
+    # The second counter read is itself one round trip
+    return roundtrips(conn) - before - 1
+
+
+def bench(iterations):
+    print(f"{'case':<18}{'rows':>8}{'rt before':>11}{'rt after':>10}{'ms before':>11}{'ms after':>10}")
+    for name, sql, fetch in CASES:
+        start = time.perf_counter()
+        for _ in range(iterations):
+            conn = oracledb.connect(user=db.DB_USER, password=db.DB_PASSWORD, dsn=db.get_dsn())
+            try:
+                rows = run_query(conn, sql, None)
+            finally:
+                conn.close()
+        ms_before = (time.perf_counter() - start) * 1000 / iterations
+
+        start = time.perf_counter()
+        for _ in range(iterations):
+            with db.connection() as conn:
+                run_query(conn, sql, fetch)
+        ms_after = (time.perf_counter() - start) * 1000 / iterations
+
+        with db.connection() as conn:
+            rt_before = measure_roundtrips(conn, sql, None)
+            rt_after = measure_roundtrips(conn, sql, fetch)
+
+        print(f"{name:<18}{rows:>8}{str(rt_before):>11}{str(rt_after):>10}{ms_before:>11.2f}{ms_after:>10.2f}")
+
+
+if __name__ == "__main__":
+    bench(int(sys.argv[1]) if len(sys.argv) > 1 else 20)
+    db.close_pool()
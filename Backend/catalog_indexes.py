@@ -0,0 +1,53 @@
+"""
+Secondary indexes that the catalog queries rely on.
+
+The catalog schema ships as a Data Pump dump, so indexes added for new access
+paths are created here at startup when they are missing.
+"""
+import logging
+
+import oracledb
+
+import db
+
+logger = logging.getLogger(__name__)
+
+
+# (index name, table, column list)
+CATALOG_INDEXES = [
+    # Keyset pages of a node's children in the lazy hierarchy
+    ("idx_subject_areas_lob", "subject_areas", "lob_id, id"),
+    ("idx_sald_subject_area", "subject_area_logical_database", "subject_area_id, logical_database_id"),
+    ("idx_tables_metadata_db", "tables_metadata", "database_id, id"),
+    # Filters and sort orders of the /api/tables and /api/er_relationships lists
+    ("idx_tables_metadata_uname", "tables_metadata", "UPPER(name), id"),
+    ("idx_tables_metadata_uschema", "tables_metadata", "UPPER(schema_name), id"),
+    ("idx_er_rel_entity", "er_relationships", "er_entity_id, id"),
+    ("idx_er_rel_from_table", "er_relationships", "from_table_id, id"),
+    ("idx_er_rel_to_table", "er_relationships", "to_table_id, id"),
+    ("idx_er_rel_type", "er_relationships", "relationship_type, id"),
+    ("idx_er_rel_cardinality", "er_relationships", "cardinality, id"),
+    ("idx_er_rel_created", "er_relationships", "created_at, id"),
+]
+
+
+def ensure_indexes():
+    """Create any missing catalog indexes; returns the names created"""
+    created = []
+    with db.connection() as conn, db.cursor(conn, db.FETCH_BULK) as cursor:
+        cursor.execute("SELECT index_name FROM user_indexes")
+        existing = {row[0] for row in cursor.fetchall()}
+
+        for name, table, columns in CATALOG_INDEXES:
+            if name.upper() in existing:
+                continue
+            try:
+                cursor.execute(f"CREATE INDEX {name} ON {table} ({columns})")
+                created.append(name)
+                logger.info(f"Created index {name} on {table} ({columns})")
+            except oracledb.DatabaseError as e:
+                error, = e.args
+                # ORA-01408: such column list already indexed (under another name)
+                if error.code != 1408:
+                    logger.warning(f"Could not create index {name} on {table}: {e}")
+    return created
@@ -0,0 +1,206 @@
+"""
+Server-side filtering, sorting and keyset paging for the catalog list endpoints.
+
+GET /api/tables and GET /api/er_relationships accept column filters and a
+?sort= field, and both are pushed down into the SQL. Passing ?limit= (or a
+cursor in ?after=) turns on keyset paging: the query continues strictly
+after the last row of the previous page on (sort value, id) and stops after
+limit + 1 rows, so a page costs the same however large the catalog is. The
+indexes behind these access paths are in catalog_indexes.CATALOG_INDEXES.
+
+When sorting by id the cursor is simply the last id; for other sort fields
+it is an opaque token holding the last sort value and id. A leading '-'
+sorts descending (?sort=-created_at). NULL sort values come last ascending
+and first descending, as Oracle orders them by default.
+"""
+import os
+import base64
+import binascii
+from datetime import datetime
+
+import orjson
+
+import db
+
+# --- Catalog List Configuration ---
+CATALOG_LIST_PAGE_SIZE = int(os.environ.get('CATALOG_LIST_PAGE_SIZE', '100'))
+CATALOG_LIST_MAX_PAGE_SIZE = int(os.environ.get('CATALOG_LIST_MAX_PAGE_SIZE', '1000'))
+
+_TIME_FORMAT = "%Y-%m-%dT%H:%M:%S.%f"
+
+
+def _prefix(value):
+    """LIKE pattern for a case-insensitive prefix match, with wildcards in value escaped"""
+    escaped = value.upper().replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return escaped + "%"
+
+
+# Each list is a base SELECT, its filters as query parameter -> (predicate on
+# :parameter, value transform), its sort fields as name -> (expression, kind)
+# and the id column used as the keyset tie-breaker.
+TABLES = {
+    "sql": """
+        SELECT t.id, t.name, t.schema_name, d.name AS database_name
+        FROM tables_metadata t
+        JOIN logical_databases d ON t.database_id = d.id
+    """,
+    "filters": {
+        "database": ("UPPER(d.name) = UPPER(:database)", None),
+        "database_id": ("t.database_id = :database_id", int),
+        "schema": ("UPPER(t.schema_name) = UPPER(:schema)", None),
+        "name": ("UPPER(t.name) LIKE :name ESCAPE '\\'", _prefix),
+    },
+    "sorts": {
+        "id": ("t.id", "int"),
+        "name": ("UPPER(t.name)", "str"),
+        "schema": ("UPPER(t.schema_name)", "str"),
+        "database": ("UPPER(d.name)", "str"),
+    },
+    "id": "t.id",
+}
+
+RELATIONSHIPS = {
+    "sql": """
+        SELECT
+            r.id, r.from_table_id, ft.name AS from_table_name,
+            r.from_column, r.to_table_id, tt.name AS to_table_name,
+            r.to_column, r.cardinality, r.relationship_type,
+            r.created_at, r.er_entity_id
+        FROM er_relationships r
+        -- Outer joins: a relationship whose table row is gone is still listed, with a NULL name
+        LEFT JOIN tables_metadata ft ON r.from_table_id = ft.id
+        LEFT JOIN tables_metadata tt ON r.to_table_id = tt.id
+    """,
+    "filters": {
+        "relationship_type": ("r.relationship_type = :relationship_type", None),
+        "cardinality": ("r.cardinality = :cardinality", None),
+        "er_entity_id": ("r.er_entity_id = :er_entity_id", int),
+        "table_id": ("(r.from_table_id = :table_id OR r.to_table_id = :table_id)", int),
+        "database": ("""EXISTS (
+            SELECT 1 FROM logical_databases d
+            WHERE d.id IN (ft.database_id, tt.database_id)
+            AND UPPER(d.name) = UPPER(:database)
+        )""", None),
+        "schema": ("(UPPER(ft.schema_name) = UPPER(:schema) OR UPPER(tt.schema_name) = UPPER(:schema))", None),
+        "name": ("(UPPER(ft.name) LIKE :name ESCAPE '\\' OR UPPER(tt.name) LIKE :name ESCAPE '\\')", _prefix),
+    },
+    "sorts": {
+        "id": ("r.id", "int"),
+        "created_at": ("r.created_at", "datetime"),
+        "relationship_type": ("r.relationship_type", "str"),
+        "cardinality": ("r.cardinality", "str"),
+        "from_table": ("UPPER(ft.name)", "str"),
+        "to_table": ("UPPER(tt.name)", "str"),
+    },
+    "id": "r.id",
+}
+
+
+def _encode_cursor(value, row_id):
+    if isinstance(value, datetime):
+        value = value.strftime(_TIME_FORMAT)
+    return base64.urlsafe_b64encode(orjson.dumps([value, row_id])).decode("ascii")
+
+
+def _decode_cursor(token, kind):
+    try:
+        value, row_id = orjson.loads(base64.urlsafe_b64decode(token.encode("ascii")))
+        if value is not None and kind == "datetime":
+            value = datetime.strptime(value, _TIME_FORMAT)
+        return value, int(row_id)
+    except (binascii.Error, orjson.JSONDecodeError, TypeError, ValueError):
+        raise ValueError(f"'after' is not a cursor from this list: {token}")
+
+
+def _keyset_predicate(expression, id_column, descending, value):
+    """Rows strictly after (value, :after_id) in ORDER BY expression, id (NULLs last ascending, first descending)"""
+    if descending:
+        if value is None:
+            return f"(({expression} IS NULL AND {id_column} < :after_id) OR {expression} IS NOT NULL)"
+        return f"({expression} < :after_value OR ({expression} = :after_value AND {id_column} < :after_id))"
+    if value is None:
+        return f"({expression} IS NULL AND {id_column} > :after_id)"
+    return (
+        f"({expression} > :after_value OR ({expression} = :after_value AND {id_column} > :after_id)"
+        f" OR {expression} IS NULL)"
+    )
+
+
+def query(spec, args):
+    """
+    (sql, params, page) for a list request's query string args; raises ValueError on bad input.
+
+    page is (limit, sort field) when the request is paged and None when it
+    wants every matching row.
+    """
+    conditions, params = [], {}
+    for name, (predicate, transform) in spec["filters"].items():
+        value = args.get(name)
+        if value is None or value == "":
+            continue
+        try:
+            params[name] = transform(value) if transform else value
+        except ValueError:
+            raise ValueError(f"'{name}' must be an integer")
+        conditions.append(predicate)
+
+    sort = args.get("sort", "id")
+    descending = sort.startswith("-")
+    field = sort.lstrip("-")
+    if field not in spec["sorts"]:
+        raise ValueError(f"Unknown sort '{field}'; expected one of {', '.join(spec['sorts'])}")
+    expression, kind = spec["sorts"][field]
+    id_column = spec["id"]
+    direction = " DESC" if descending else ""
+    order_by = (
+        f"{id_column}{direction}" if field == "id"
+        else f"{expression}{direction}, {id_column}{direction}"
+    )
+
+    paged = "limit" in args or "after" in args
+    select = spec["sql"]
+    if paged:
+        limit = int(args.get("limit", CATALOG_LIST_PAGE_SIZE))
+        if limit < 1:
+            raise ValueError("'limit' must be >= 1")
+        limit = min(limit, CATALOG_LIST_MAX_PAGE_SIZE)
+
+        after = args.get("after")
+        if after:
+            if field == "id":
+                params["after_id"] = int(after)
+                conditions.append(f"{id_column} {'<' if descending else '>'} :after_id")
+            else:
+                value, params["after_id"] = _decode_cursor(after, kind)
+                if value is not None:
+                    params["after_value"] = value
+                conditions.append(_keyset_predicate(expression, id_column, descending, value))
+        if field != "id":
+            # Carried along only to build the next cursor; page() drops it from the items
+            select = select.replace("SELECT", f"SELECT {expression} AS sort_value,", 1)
+
+    sql = select
+    if conditions:
+        sql += "\n        WHERE " + "\n        AND ".join(conditions)
+    sql += f"\n        ORDER BY {order_by}"
+    if paged:
+        params["limit_plus_one"] = limit + 1
+        sql += "\n        FETCH FIRST :limit_plus_one ROWS ONLY"
+        return sql, params, (limit, field)
+    return sql, params, None
+
+
+def page(sql, params, limit, field, row=None):
+    """Run a paged query and wrap it as {"items", "next_cursor"}; next_cursor is None on the last page"""
+    items = db.query_dicts(sql, params)
+    has_more = len(items) > limit
+    items = items[:limit]
+    next_cursor = None
+    if has_more:
+        last = items[-1]
+        next_cursor = last["id"] if field == "id" else _encode_cursor(last["sort_value"], last["id"])
+    for item in items:
+        item.pop("sort_value", None)
+    if row is not None:
+        items = [row(item) for item in items]
+    return {"items": items, "next_cursor": next_cursor}
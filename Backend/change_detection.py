@@ -0,0 +1,101 @@
+"""
+Server-side change detection for our tables.
+
+fingerprint() returns a string that changes whenever a table's definition or
+data changes. It costs one query against the data dictionary and never reads
+table data for large tables:
+
+- LAST_DDL_TIME moves on ALTER, TRUNCATE and other DDL
+- NUM_ROWS and LAST_ANALYZED move when statistics are gathered
+- USER_TAB_MODIFICATIONS counts DML since the last gather (flushed periodically)
+- MAX(ORA_ROWSCN) moves on any committed change, but scans the table, so it is
+  only included for tables up to CHANGE_ROWSCN_MAX_ROWS rows
+- an ORA_HASH checksum over every column catches changes that leave the
+  block SCNs alone (e.g. after export/import); it is off unless
+  CHANGE_HASH_MAX_ROWS is set
+"""
+import os
+import re
+import logging
+
+import oracledb
+
+import db
+
+logger = logging.getLogger(__name__)
+
+
+# --- Change Detection Configuration ---
+# MAX(ORA_ROWSCN) is part of the fingerprint for tables up to this many rows
+CHANGE_ROWSCN_MAX_ROWS = int(os.environ.get('CHANGE_ROWSCN_MAX_ROWS', '100000'))
+# ORA_HASH content checksum for tables up to this many rows; 0 turns it off
+CHANGE_HASH_MAX_ROWS = int(os.environ.get('CHANGE_HASH_MAX_ROWS', '0'))
+
+# Table names are interpolated into the query, so only plain identifiers are accepted
+_IDENTIFIER = re.compile(r'^[A-Za-z][A-Za-z0-9_$#]{0,127}$')
+_UNHASHABLE_TYPES = ('BLOB', 'CLOB', 'NCLOB', 'BFILE', 'LONG', 'LONG RAW', 'XMLTYPE')
+
+
+def _checksum_expression(conn, table_name_upper):
+    """SUM(ORA_HASH(...)) over the table's scalar columns, or NULL if it has none"""
+    rows = db.query_all("""
+        SELECT column_name
+        FROM user_tab_columns
+        WHERE table_name = :1
+        AND data_type NOT IN ({})
+        ORDER BY column_id
+    """.format(", ".join(f"'{data_type}'" for data_type in _UNHASHABLE_TYPES)), [table_name_upper], conn=conn)
+    if not rows:
+        return "NULL"
+    concatenated = " || '|' || ".join(f'"{row[0]}"' for row in rows)
+    return f"(SELECT SUM(ORA_HASH({concatenated})) FROM {table_name_upper})"
+
+
+def table_state(conn, table_name):
+    """The values that make up a table's fingerprint, or None if it does not exist"""
+    if not _IDENTIFIER.match(table_name or ""):
+        return None
+    table_name_upper = table_name.upper()
+    checksum = _checksum_expression(conn, table_name_upper) if CHANGE_HASH_MAX_ROWS else "NULL"
+
+    try:
+        row = db.query_one(f"""
+            SELECT TO_CHAR(o.last_ddl_time, 'YYYY-MM-DD HH24:MI:SS'),
+                   t.num_rows,
+                   TO_CHAR(t.last_analyzed, 'YYYY-MM-DD HH24:MI:SS'),
+                   NVL(m.inserts + m.updates + m.deletes, 0),
+                   TO_CHAR(m.timestamp, 'YYYY-MM-DD HH24:MI:SS'),
+                   CASE WHEN t.num_rows <= :rowscn_max_rows THEN (SELECT MAX(ORA_ROWSCN) FROM {table_name_upper}) END,
+                   CASE WHEN t.num_rows <= :hash_max_rows THEN {checksum} END
+            FROM user_objects o
+            JOIN user_tables t ON t.table_name = o.object_name
+            LEFT JOIN user_tab_modifications m
+                ON m.table_name = t.table_name AND m.partition_name IS NULL
+            WHERE o.object_type = 'TABLE'
+            AND o.object_name = :table_name
+        """, {
+            "table_name": table_name_upper,
+            "rowscn_max_rows": CHANGE_ROWSCN_MAX_ROWS,
+            "hash_max_rows": CHANGE_HASH_MAX_ROWS,
+        }, conn=conn)
+    except oracledb.DatabaseError as e:
+        error, = e.args
+        # ORA-00942: the table in the ORA_ROWSCN/ORA_HASH subquery does not exist
+        if error.code == 942:
+            return None
+        raise
+    if not row:
+        return None
+
+    return dict(zip(
+        ("last_ddl_time", "num_rows", "last_analyzed", "dml_count", "dml_timestamp", "max_rowscn", "checksum"),
+        row
+    ))
+
+
+def fingerprint(conn, table_name):
+    """Cheap change fingerprint for one of our tables, or None if it does not exist"""
+    state = table_state(conn, table_name)
+    if state is None:
+        return None
+    return "|".join("" if value is None else str(value) for value in state.values())
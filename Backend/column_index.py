@@ -0,0 +1,276 @@
+"""
+Precomputed column catalog for column search.
+
+Table, column, data type, nullability and comment for every catalog table
+come from the schema snapshot (USER_TAB_COLUMNS and USER_COL_COMMENTS as of
+its last harvest) and are indexed by column name with
+search_index.SearchIndex, so searches never touch the dictionary views.
+
+refresh() compares each catalog table's LAST_DDL_TIME in the snapshot with
+the one its columns were indexed at and re-indexes only the tables whose
+time moved, plus tables that are new to the catalog or were moved to another
+database. It runs every COLUMN_INDEX_REFRESH_MINUTES, whenever a search sees
+that the snapshot has changed, and in the background after table writes.
+"""
+import os
+import time
+import logging
+import threading
+from datetime import datetime
+
+import db
+import schema_snapshot
+# search_index also imports this module; only its attributes are used at call time
+import search_index
+
+logger = logging.getLogger(__name__)
+
+
+# --- Column Index Configuration ---
+COLUMN_INDEX_REFRESH_MINUTES = int(os.environ.get('COLUMN_INDEX_REFRESH_MINUTES', '10'))
+
+# One row per (table, lineage)
+_CATALOG_SQL = """
+    SELECT t.id, t.name, l.name, s.name, d.name
+    FROM tables_metadata t
+    JOIN logical_databases d ON t.database_id = d.id
+    JOIN subject_area_logical_database sald ON d.id = sald.logical_database_id
+    JOIN subject_areas s ON sald.subject_area_id = s.id
+    JOIN lobs l ON s.lob_id = l.id
+"""
+
+_lock = threading.Lock()
+_refresh_lock = threading.Lock()
+_index = None
+# TABLE_NAME -> (last_ddl_time, ((id, name, lob, subject, database), ...))
+_tables = {}
+# TABLE_NAME -> [(column_name, data_type, nullable, comment), ...]
+_columns = {}
+_dirty = False
+_synced_version = None
+_last_refresh = {}
+
+
+def display_type(data_type, data_length, data_precision, data_scale):
+    """Data type as it would be declared, e.g. VARCHAR2(100) or NUMBER(10,2)"""
+    if data_type == "NUMBER" and data_precision is not None:
+        return f"NUMBER({data_precision},{data_scale})" if data_scale else f"NUMBER({data_precision})"
+    if data_type in ("VARCHAR2", "NVARCHAR2", "CHAR", "NCHAR", "RAW"):
+        return f"{data_type}({data_length})"
+    return data_type
+
+
+def _snapshot_columns(entry):
+    if entry is None:
+        return []
+    return [
+        (
+            column["name"],
+            display_type(column["data_type"], column["length"], column["precision"], column["scale"]),
+            column["nullable"] == "Y",
+            column["comment"],
+        )
+        for column in entry["columns"]
+    ]
+
+
+def _add_table(index, table_name, keep_sorted=True):
+    _, lineage = _tables[table_name]
+    for table_id, name, lob, subject, database in lineage:
+        for column_name, data_type, nullable, comment in _columns.get(table_name, ()):
+            index.add(
+                "Column", table_id, column_name, lob, subject, database, keep_sorted,
+                table=name, data_type=data_type, nullable=nullable, comment=comment
+            )
+
+
+def _remove_table(index, table_name):
+    _, lineage = _tables.get(table_name, (None, ()))
+    for table_id in {row[0] for row in lineage}:
+        index.remove("Column", table_id)
+
+
+def _refresh_once(conn):
+    global _index, _tables, _synced_version
+    start = time.monotonic()
+    snapshot_version = schema_snapshot.version()
+    snapshot = schema_snapshot.tables(conn)
+
+    lineages = {}
+    for table_id, name, lob, subject, database in db.query_all(_CATALOG_SQL, conn=conn):
+        lineages.setdefault(name.upper(), []).append((table_id, name, lob, subject, database))
+    catalog = {}
+    for table_name, lineage in lineages.items():
+        entry = snapshot.get(table_name)
+        catalog[table_name] = (entry["last_ddl_time"] if entry else None, tuple(lineage))
+
+    changed = [
+        table_name for table_name, (ddl_time, _) in catalog.items()
+        if table_name not in _tables or _tables[table_name][0] != ddl_time
+    ]
+    relinked = [
+        table_name for table_name, (ddl_time, lineage) in catalog.items()
+        if table_name in _tables and _tables[table_name][0] == ddl_time and _tables[table_name][1] != lineage
+    ]
+    dropped = [table_name for table_name in _tables if table_name not in catalog]
+    touched = len(changed) + len(relinked) + len(dropped)
+    # Re-inserting into the sorted token list one by one only pays off for a small share of tables
+    full = _index is None or touched > len(catalog) // 4
+
+    harvested = {table_name: _snapshot_columns(snapshot.get(table_name)) for table_name in changed}
+
+    if full:
+        _tables = catalog
+        for table_name in dropped:
+            _columns.pop(table_name, None)
+        for table_name in changed:
+            _columns[table_name] = harvested.get(table_name, [])
+        index = search_index.SearchIndex()
+        for table_name in _tables:
+            _add_table(index, table_name, keep_sorted=False)
+        index.tokens.sort()
+        with _lock:
+            _index = index
+    elif touched:
+        with _lock:
+            for table_name in changed + relinked + dropped:
+                _remove_table(_index, table_name)
+            for table_name in dropped:
+                _tables.pop(table_name)
+                _columns.pop(table_name, None)
+            for table_name in changed + relinked:
+                _tables[table_name] = catalog[table_name]
+                if table_name in harvested:
+                    _columns[table_name] = harvested[table_name]
+                _add_table(_index, table_name)
+
+    summary = {
+        "finished_at": datetime.now().isoformat(),
+        "seconds": round(time.monotonic() - start, 3),
+        "full": full,
+        "tables": len(_tables),
+        "columns": sum(len(columns) for columns in _columns.values()),
+        "reindexed": len(changed),
+        "relinked": len(relinked),
+        "dropped": len(dropped),
+    }
+    if touched:
+        logger.info(
+            f"Column index refreshed in {summary['seconds']}s: {len(changed)} tables re-indexed, "
+            f"{len(relinked)} relinked, {len(dropped)} dropped"
+        )
+    _synced_version = snapshot_version
+    return summary
+
+
+def refresh(conn=None):
+    """
+    Bring the index up to date with the schema snapshot and the catalog.
+
+    If a refresh is already running it is asked to go round once more instead,
+    and this call returns None straight away.
+    """
+    global _dirty
+    if not _refresh_lock.acquire(blocking=False):
+        _dirty = True
+        return None
+    try:
+        if conn is None:
+            with db.connection() as conn:
+                return _refresh_until_clean(conn)
+        return _refresh_until_clean(conn)
+    finally:
+        _refresh_lock.release()
+
+
+def _refresh_until_clean(conn):
+    global _dirty
+    while True:
+        _dirty = False
+        summary = _refresh_once(conn)
+        _last_refresh.clear()
+        _last_refresh.update(summary)
+        if not _dirty:
+            return summary
+
+
+def _refresh_quietly():
+    try:
+        refresh()
+    except Exception as e:
+        logger.error(f"Column index refresh failed: {e}")
+
+
+def _refresh_snapshot_first():
+    try:
+        schema_snapshot.refresh()
+    except Exception as e:
+        logger.error(f"Schema snapshot refresh failed: {e}")
+    _refresh_quietly()
+
+
+def refresh_in_background(refresh_snapshot=False):
+    """Refresh off the calling thread, optionally re-reading changed tables into the snapshot first"""
+    target = _refresh_snapshot_first if refresh_snapshot else _refresh_quietly
+    threading.Thread(target=target, name="column-index-refresh", daemon=True).start()
+
+
+def warm():
+    """Load or harvest the snapshot and index its columns ahead of the first search"""
+    refresh_in_background()
+
+
+def _ensure_built():
+    if _index is None:
+        with _refresh_lock:
+            if _index is None:
+                with db.connection() as conn:
+                    _last_refresh.update(_refresh_once(conn))
+
+
+def ranked(query, table=None, data_type=None, limit=None):
+    """(rank, doc) pairs for column names matching query, as search_index.SearchIndex.ranked"""
+    _ensure_built()
+    if _synced_version != schema_snapshot.version() and not _refresh_lock.locked():
+        refresh_in_background()
+    table = table.upper() if table else None
+    data_type = data_type.upper() if data_type else None
+
+    def where(doc):
+        return (
+            (table is None or doc["table"].upper() == table)
+            and (data_type is None or doc["data_type"].startswith(data_type))
+        )
+
+    limit = limit or search_index.SEARCH_DEFAULT_LIMIT
+    with _lock:
+        return _index.ranked(query, ("Column",), limit, where if table or data_type else None)
+
+
+def search(query, table=None, data_type=None, limit=None):
+    """Columns whose name matches query, optionally within one table or of one data type"""
+    limit = min(limit or search_index.SEARCH_DEFAULT_LIMIT, search_index.SEARCH_MAX_LIMIT)
+    return [doc for _, doc in ranked(query, table, data_type, limit)]
+
+
+def status():
+    return {
+        "refresh_minutes": COLUMN_INDEX_REFRESH_MINUTES,
+        "built": _index is not None,
+        "running": _refresh_lock.locked(),
+        "snapshot_version": _synced_version,
+        "last_refresh": dict(_last_refresh) or None,
+    }
+
+
+def schedule(scheduler):
+    """Register the periodic incremental refresh on an APScheduler scheduler"""
+    scheduler.add_job(
+        func=_refresh_quietly,
+        trigger='interval',
+        minutes=COLUMN_INDEX_REFRESH_MINUTES,
+        id='column_index_refresh',
+        max_instances=1,
+        coalesce=True,
+        replace_existing=True
+    )
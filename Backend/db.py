@@ -0,0 +1,224 @@
+import os
+import time
+import logging
+import threading
+from contextlib import contextmanager
+
+import oracledb
+from dotenv import load_dotenv
+
+load_dotenv()
+logger = logging.getLogger(__name__)
+
+
+# --- Database Configuration ---
+DB_HOST = os.environ.get('DB_HOST')
+DB_PORT = int(os.environ.get('DB_PORT', '1521'))  # Convert to integer
+DB_SERVICE = os.environ.get('DB_SERVICE')
+DB_USER = os.environ.get('DB_USER')
+DB_PASSWORD = os.environ.get('DB_PASSWORD')
+
+# --- Pool Configuration ---
+DB_POOL_MIN = int(os.environ.get('DB_POOL_MIN', '2'))
+DB_POOL_MAX = int(os.environ.get('DB_POOL_MAX', '10'))
+DB_POOL_INCREMENT = int(os.environ.get('DB_POOL_INCREMENT', '1'))
+# How long a request may wait for a free session before giving up (ms)
+DB_POOL_WAIT_TIMEOUT_MS = int(os.environ.get('DB_POOL_WAIT_TIMEOUT_MS', '5000'))
+# Sessions idle longer than this are pinged before being handed out (seconds)
+DB_POOL_PING_INTERVAL = int(os.environ.get('DB_POOL_PING_INTERVAL', '60'))
+# Idle sessions above DB_POOL_MIN are closed after this many seconds
+DB_POOL_IDLE_TIMEOUT = int(os.environ.get('DB_POOL_IDLE_TIMEOUT', '300'))
+# Statements cached per pooled session; pooled sessions keep it warm across requests
+DB_STMT_CACHE_SIZE = int(os.environ.get('DB_STMT_CACHE_SIZE', '50'))
+
+# --- Fetch Tuning ---
+# (arraysize, prefetchrows) presets. Setting prefetchrows one above the
+# expected row count lets the first round trip also confirm end-of-fetch.
+FETCH_SINGLE = (1, 2)
+FETCH_DEFAULT = (100, 2)
+FETCH_BULK = (1000, 1000)
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+_stats_lock = threading.Lock()
+_stats = {
+    "acquired": 0,
+    "timeouts": 0,
+    "errors": 0,
+    "total_wait_ms": 0.0,
+    "max_wait_ms": 0.0,
+}
+
+
+def get_dsn():
+    return f"{DB_HOST}:{DB_PORT}/{DB_SERVICE}"
+
+
+def get_pool():
+    """Return the process-wide session pool, creating it on first use"""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = oracledb.create_pool(
+                    user=DB_USER,
+                    password=DB_PASSWORD,
+                    dsn=get_dsn(),
+                    min=DB_POOL_MIN,
+                    max=DB_POOL_MAX,
+                    increment=DB_POOL_INCREMENT,
+                    getmode=oracledb.POOL_GETMODE_TIMEDWAIT,
+                    wait_timeout=DB_POOL_WAIT_TIMEOUT_MS,
+                    ping_interval=DB_POOL_PING_INTERVAL,
+                    timeout=DB_POOL_IDLE_TIMEOUT,
+                    stmtcachesize=DB_STMT_CACHE_SIZE,
+                )
+                logger.info(
+                    f"Created session pool for {get_dsn()} "
+                    f"(min={DB_POOL_MIN}, max={DB_POOL_MAX}, increment={DB_POOL_INCREMENT})"
+                )
+    return _pool
+
+
+def _record_acquire(wait_ms, outcome):
+    with _stats_lock:
+        if outcome == "ok":
+            _stats["acquired"] += 1
+            _stats["total_wait_ms"] += wait_ms
+            _stats["max_wait_ms"] = max(_stats["max_wait_ms"], wait_ms)
+        elif outcome == "timeout":
+            _stats["timeouts"] += 1
+        else:
+            _stats["errors"] += 1
+
+
+def acquire():
+    """Borrow a session from the pool. Calling close() on it returns it to the pool."""
+    start = time.perf_counter()
+    try:
+        conn = get_pool().acquire()
+    except oracledb.Error as e:
+        error, = e.args
+        # DPY-4005: timed out waiting for the pool to hand out a session
+        timed_out = getattr(error, "full_code", None) == "DPY-4005"
+        _record_acquire(None, "timeout" if timed_out else "error")
+        raise
+    _record_acquire((time.perf_counter() - start) * 1000, "ok")
+    return conn
+
+
+@contextmanager
+def connection():
+    """
+    Borrow a pooled session for the duration of a with-block.
+
+    Uncommitted work is rolled back if the block raises, and the session is
+    always released back to the pool on exit.
+    """
+    conn = acquire()
+    try:
+        yield conn
+    except Exception:
+        try:
+            conn.rollback()
+        except oracledb.Error as e:
+            logger.warning(f"Rollback on pooled session failed: {e}")
+        raise
+    finally:
+        conn.close()
+
+
+def tune(cur, fetch):
+    """Apply an (arraysize, prefetchrows) preset; must happen before execute()"""
+    cur.arraysize, cur.prefetchrows = fetch
+    return cur
+
+
+@contextmanager
+def cursor(conn, fetch=FETCH_DEFAULT):
+    """Open a cursor on conn tuned for the expected result size, closing it on exit"""
+    cur = tune(conn.cursor(), fetch)
+    try:
+        yield cur
+    finally:
+        cur.close()
+
+
+def rows_as_dicts(cur, rows=None):
+    """Zip fetched rows with lower-cased column names from cursor.description"""
+    columns = [desc[0].lower() for desc in cur.description]
+    if rows is None:
+        rows = cur.fetchall()
+    return [dict(zip(columns, row)) for row in rows]
+
+
+def query_one(sql, params=None, conn=None):
+    """Run a single-row lookup, on conn if given or on a freshly borrowed session"""
+    if conn is None:
+        with connection() as conn:
+            return query_one(sql, params, conn)
+    with cursor(conn, FETCH_SINGLE) as cur:
+        cur.execute(sql, params or [])
+        return cur.fetchone()
+
+
+def query_all(sql, params=None, conn=None, fetch=FETCH_BULK):
+    """Run a query and return every row, fetching in large batches by default"""
+    if conn is None:
+        with connection() as conn:
+            return query_all(sql, params, conn, fetch)
+    with cursor(conn, fetch) as cur:
+        cur.execute(sql, params or [])
+        return cur.fetchall()
+
+
+def query_dicts(sql, params=None, conn=None, fetch=FETCH_BULK):
+    """Like query_all but returns a list of dicts keyed by lower-cased column name"""
+    if conn is None:
+        with connection() as conn:
+            return query_dicts(sql, params, conn, fetch)
+    with cursor(conn, fetch) as cur:
+        cur.execute(sql, params or [])
+        return rows_as_dicts(cur)
+
+
+def pool_stats():
+    """Current pool occupancy plus cumulative acquire statistics, for sizing the pool"""
+    with _stats_lock:
+        stats = dict(_stats)
+
+    acquired = stats.pop("acquired")
+    total_wait_ms = stats.pop("total_wait_ms")
+    result = {
+        "min": DB_POOL_MIN,
+        "max": DB_POOL_MAX,
+        "increment": DB_POOL_INCREMENT,
+        "wait_timeout_ms": DB_POOL_WAIT_TIMEOUT_MS,
+        "ping_interval": DB_POOL_PING_INTERVAL,
+        "stmt_cache_size": DB_STMT_CACHE_SIZE,
+        "opened": None,
+        "busy": None,
+        "idle": None,
+        "acquired": acquired,
+        "timeouts": stats["timeouts"],
+        "errors": stats["errors"],
+        "avg_wait_ms": round(total_wait_ms / acquired, 3) if acquired else 0.0,
+        "max_wait_ms": round(stats["max_wait_ms"], 3),
+    }
+
+    if _pool is not None:
+        result["opened"] = _pool.opened
+        result["busy"] = _pool.busy
+        result["idle"] = _pool.opened - _pool.busy
+    return result
+
+
+def close_pool():
+    """Close the pool, e.g. on interpreter shutdown"""
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.close(force=True)
+            _pool = None
@@ -0,0 +1,339 @@
+"""
+In-memory graph of ER relationships.
+
+Every er_relationships row is an edge from_table_id -> to_table_id, kept in
+an adjacency list keyed by table id, so connectivity questions are answered
+by walking the graph in memory instead of issuing one SQL query per hop:
+
+- neighborhood(): tables within n hops of a table, with the edges between them
+- shortest_path(): the fewest relationships linking two tables
+- components(): groups of tables connected to each other
+- impact(): tables that reference a table, directly or transitively, and
+  would be affected by changing it
+
+Every query can be limited to one ER entity. The ER write endpoints call
+refresh_relationship(), refresh_entity() or remove_table() for what they
+changed, and a full rebuild runs every ER_GRAPH_REBUILD_SECONDS in the
+background to pick up changes made outside this process.
+"""
+import os
+import time
+import logging
+import threading
+from collections import deque
+
+import db
+
+logger = logging.getLogger(__name__)
+
+
+# --- ER Graph Configuration ---
+ER_GRAPH_REBUILD_SECONDS = int(os.environ.get('ER_GRAPH_REBUILD_SECONDS', '900'))
+ER_GRAPH_MAX_HOPS = int(os.environ.get('ER_GRAPH_MAX_HOPS', '6'))
+
+_EDGE_SQL = """
+    SELECT r.id, r.from_table_id, ft.name, r.from_column, r.to_table_id, tt.name,
+           r.to_column, r.cardinality, r.relationship_type, r.er_entity_id
+    FROM er_relationships r
+    JOIN tables_metadata ft ON r.from_table_id = ft.id
+    JOIN tables_metadata tt ON r.to_table_id = tt.id
+"""
+_EDGE_FIELDS = (
+    "id", "from_table_id", "from_table_name", "from_column", "to_table_id", "to_table_name",
+    "to_column", "cardinality", "relationship_type", "er_entity_id",
+)
+
+
+class ERGraph:
+    """Adjacency lists over relationship edges, with add/remove by relationship id"""
+
+    def __init__(self):
+        self.edges = {}      # relationship id -> edge dict
+        self.adjacency = {}  # table id -> set of relationship ids touching it
+        self.names = {}      # table id -> table name
+        self.by_name = {}    # TABLE_NAME -> set of table ids
+
+    def add(self, row):
+        edge = dict(zip(_EDGE_FIELDS, row))
+        self.remove(edge["id"])
+        self.edges[edge["id"]] = edge
+        for side in ("from", "to"):
+            table_id, name = edge[f"{side}_table_id"], edge[f"{side}_table_name"]
+            self.adjacency.setdefault(table_id, set()).add(edge["id"])
+            self.names[table_id] = name
+            self.by_name.setdefault(name.upper(), set()).add(table_id)
+
+    def remove(self, relationship_id):
+        edge = self.edges.pop(relationship_id, None)
+        if edge is None:
+            return
+        for table_id in (edge["from_table_id"], edge["to_table_id"]):
+            touching = self.adjacency.get(table_id)
+            if touching is None:
+                continue
+            touching.discard(relationship_id)
+            if not touching:
+                del self.adjacency[table_id]
+                name = self.names.pop(table_id)
+                ids = self.by_name.get(name.upper(), set())
+                ids.discard(table_id)
+                if not ids:
+                    self.by_name.pop(name.upper(), None)
+
+    def resolve(self, table):
+        """Table ids for an id or a (case-insensitive) name; empty if it has no relationships"""
+        if isinstance(table, int) or str(table).isdigit():
+            return {int(table)} if int(table) in self.adjacency else set()
+        return set(self.by_name.get(str(table).upper(), ()))
+
+    def _edges_of(self, table_id, er_entity_id=None):
+        for relationship_id in self.adjacency.get(table_id, ()):
+            edge = self.edges[relationship_id]
+            if er_entity_id is None or edge["er_entity_id"] == er_entity_id:
+                yield edge
+
+    def _table(self, table_id, **fields):
+        return dict(id=table_id, name=self.names.get(table_id), **fields)
+
+    def neighborhood(self, sources, hops=1, er_entity_id=None):
+        """Tables within hops of sources (either direction) and every edge among them"""
+        distance = {table_id: 0 for table_id in sources}
+        queue = deque(sources)
+        while queue:
+            table_id = queue.popleft()
+            if distance[table_id] >= hops:
+                continue
+            for edge in self._edges_of(table_id, er_entity_id):
+                other = edge["to_table_id"] if edge["from_table_id"] == table_id else edge["from_table_id"]
+                if other not in distance:
+                    distance[other] = distance[table_id] + 1
+                    queue.append(other)
+        edges = {
+            edge["id"]: edge
+            for table_id in distance for edge in self._edges_of(table_id, er_entity_id)
+            if edge["from_table_id"] in distance and edge["to_table_id"] in distance
+        }
+        return {
+            "tables": [self._table(t, distance=d) for t, d in sorted(distance.items(), key=lambda item: item[1])],
+            "relationships": sorted(edges.values(), key=lambda edge: edge["id"]),
+        }
+
+    def shortest_path(self, sources, targets, er_entity_id=None):
+        """Edges of a shortest path from any of sources to any of targets, in order; None if unconnected"""
+        via = {table_id: None for table_id in sources}
+        queue = deque(sources)
+        while queue:
+            table_id = queue.popleft()
+            if table_id in targets:
+                path = []
+                while via[table_id] is not None:
+                    edge = via[table_id]
+                    path.append(edge)
+                    table_id = edge["to_table_id"] if edge["from_table_id"] == table_id else edge["from_table_id"]
+                return path[::-1]
+            for edge in self._edges_of(table_id, er_entity_id):
+                other = edge["to_table_id"] if edge["from_table_id"] == table_id else edge["from_table_id"]
+                if other not in via:
+                    via[other] = edge
+                    queue.append(other)
+        return None
+
+    def components(self, er_entity_id=None):
+        """Connected groups of tables, largest first"""
+        seen, groups = set(), []
+        for start in self.adjacency:
+            if start in seen or not any(True for _ in self._edges_of(start, er_entity_id)):
+                continue
+            seen.add(start)
+            group, queue = [start], deque([start])
+            while queue:
+                table_id = queue.popleft()
+                for edge in self._edges_of(table_id, er_entity_id):
+                    for other in (edge["from_table_id"], edge["to_table_id"]):
+                        if other not in seen:
+                            seen.add(other)
+                            group.append(other)
+                            queue.append(other)
+            groups.append(group)
+        groups.sort(key=len, reverse=True)
+        return [[self._table(table_id) for table_id in sorted(group)] for group in groups]
+
+    def impact(self, sources, max_depth=ER_GRAPH_MAX_HOPS, er_entity_id=None):
+        """Tables that reference sources through chains of relationships, with their depth and the edge that reached them"""
+        depth = {table_id: 0 for table_id in sources}
+        reached = []
+        queue = deque(sources)
+        while queue:
+            table_id = queue.popleft()
+            if depth[table_id] >= max_depth:
+                continue
+            for edge in self._edges_of(table_id, er_entity_id):
+                referencing = edge["from_table_id"]
+                if edge["to_table_id"] == table_id and referencing not in depth:
+                    depth[referencing] = depth[table_id] + 1
+                    reached.append(self._table(referencing, depth=depth[referencing], via=edge))
+                    queue.append(referencing)
+        return reached
+
+
+_lock = threading.Lock()
+_rebuild_lock = threading.Lock()
+_graph = None
+_built_at = None
+_generation = 0
+
+
+def _build():
+    """Build a fresh graph from er_relationships and swap it in (caller holds _rebuild_lock)"""
+    global _graph, _built_at
+    start = time.monotonic()
+    started_generation = _generation
+    graph = ERGraph()
+    for row in db.query_all(_EDGE_SQL):
+        graph.add(row)
+
+    with _lock:
+        unchanged = _generation == started_generation
+        # Same rule as search_index: a graph built while writes landed may have missed them
+        if unchanged or _graph is None:
+            _graph = graph
+        _built_at = time.monotonic() if unchanged else None
+    logger.info(f"Built ER graph over {len(graph.edges)} relationships in {time.monotonic() - start:.2f}s")
+
+
+def rebuild():
+    with _rebuild_lock:
+        _build()
+
+
+def _rebuild_in_background():
+    if _rebuild_lock.locked():
+        return
+    def run():
+        try:
+            rebuild()
+        except Exception as e:
+            logger.error(f"ER graph rebuild failed: {e}")
+    threading.Thread(target=run, name="er-graph-rebuild", daemon=True).start()
+
+
+def trigger():
+    """Start a full rebuild in the background; returns False if one is already running"""
+    if _rebuild_lock.locked():
+        return False
+    _rebuild_in_background()
+    return True
+
+
+def warm():
+    """Build the graph ahead of the first query"""
+    _rebuild_in_background()
+
+
+def _current():
+    if _graph is None:
+        with _rebuild_lock:
+            if _graph is None:
+                _build()
+    elif _built_at is None or time.monotonic() - _built_at > ER_GRAPH_REBUILD_SECONDS:
+        _rebuild_in_background()
+    return _graph
+
+
+def neighborhood(table, hops=1, er_entity_id=None):
+    """Tables within hops of a table (id or name) and the edges among them; None if it has no relationships"""
+    graph = _current()
+    with _lock:
+        sources = graph.resolve(table)
+        if not sources:
+            return None
+        return graph.neighborhood(sources, min(hops, ER_GRAPH_MAX_HOPS), er_entity_id)
+
+
+def shortest_path(from_table, to_table, er_entity_id=None):
+    """
+    {"connected", "relationships" in path order} between two tables given by
+    id or name; None if either has no relationships.
+    """
+    graph = _current()
+    with _lock:
+        sources, targets = graph.resolve(from_table), graph.resolve(to_table)
+        if not sources or not targets:
+            return None
+        path = graph.shortest_path(sources, targets, er_entity_id)
+    return {"connected": path is not None, "relationships": path or []}
+
+
+def components(er_entity_id=None):
+    """Connected groups of tables, largest first"""
+    graph = _current()
+    with _lock:
+        return graph.components(er_entity_id)
+
+
+def impact(table, max_depth=ER_GRAPH_MAX_HOPS, er_entity_id=None):
+    """Tables referencing a table (id or name) directly or transitively; None if it has no relationships"""
+    graph = _current()
+    with _lock:
+        sources = graph.resolve(table)
+        if not sources:
+            return None
+        return graph.impact(sources, min(max_depth, ER_GRAPH_MAX_HOPS), er_entity_id)
+
+
+def _reread(where, params, remove, conn):
+    global _generation
+    with _lock:
+        _generation += 1
+        if _graph is None:
+            return
+    try:
+        if conn is None:
+            with db.connection() as conn:
+                return _reread(where, params, remove, conn)
+        rows = db.query_all(f"{_EDGE_SQL} WHERE {where}", params, conn=conn)
+        with _lock:
+            remove(_graph)
+            for row in rows:
+                _graph.add(row)
+    except Exception as e:
+        # The periodic rebuild will catch up; a failed refresh must not fail the write
+        logger.warning(f"Could not refresh ER graph for {where} {params}: {e}")
+
+
+def refresh_relationship(relationship_id, conn=None):
+    """Re-read one relationship after a create, update or delete; drops it if it is gone"""
+    if isinstance(relationship_id, list):
+        # As returned by a RETURNING INTO variable
+        relationship_id = relationship_id[0]
+    _reread("r.id = :1", [relationship_id], lambda graph: graph.remove(relationship_id), conn)
+
+
+def refresh_entity(er_entity_id, conn=None):
+    """Re-read all of an ER entity's relationships, e.g. after a bulk import or deleting the diagram"""
+    def remove(graph):
+        for relationship_id in [i for i, edge in graph.edges.items() if edge["er_entity_id"] == er_entity_id]:
+            graph.remove(relationship_id)
+    _reread("r.er_entity_id = :1", [er_entity_id], remove, conn)
+
+
+def remove_table(table_id):
+    """Drop every relationship touching a table that was deleted"""
+    global _generation
+    with _lock:
+        _generation += 1
+        if _graph is None:
+            return
+        for relationship_id in list(_graph.adjacency.get(table_id, ())):
+            _graph.remove(relationship_id)
+
+
+def status():
+    with _lock:
+        return {
+            "built": _graph is not None,
+            "rebuild_seconds": ER_GRAPH_REBUILD_SECONDS,
+            "seconds_since_build": round(time.monotonic() - _built_at, 1) if _built_at else None,
+            "tables": len(_graph.adjacency) if _graph else 0,
+            "relationships": len(_graph.edges) if _graph else 0,
+        }
@@ -0,0 +1,157 @@
+"""
+Bulk import of ER relationships into one ER entity.
+
+Creating edges one request at a time costs a connection, a duplicate-check
+SELECT, an INSERT and a commit per edge. import_edges() instead reads the
+entity's existing edges once, drops the ones already there (or repeated in
+the same request), inserts the rest with executemany in batches of
+ER_IMPORT_BATCH_ROWS with batch errors enabled, and commits once. A row
+that the database rejects (unknown table id, value too long, ...) is
+reported in its result and does not stop the others.
+
+Every input row gets a result in input order:
+{"index", "status": created | duplicate | invalid | error, "id", "error"}.
+"""
+import os
+import logging
+
+import oracledb
+
+import db
+
+logger = logging.getLogger(__name__)
+
+
+# --- ER Import Configuration ---
+ER_IMPORT_BATCH_ROWS = int(os.environ.get('ER_IMPORT_BATCH_ROWS', '1000'))
+ER_IMPORT_MAX_ROWS = int(os.environ.get('ER_IMPORT_MAX_ROWS', '50000'))
+
+DEFAULT_RELATIONSHIP_TYPE = "foreign_key"
+
+# (field, camelCase alias as sent to /api/createER)
+_FIELDS = (
+    ("from_table_id", "fromTableId"),
+    ("from_column", "fromColumn"),
+    ("to_table_id", "toTableId"),
+    ("to_column", "toColumn"),
+    ("cardinality", "cardinality"),
+    ("relationship_type", "relationshipType"),
+)
+
+_INSERT_SQL = """
+    INSERT INTO er_relationships
+    (from_table_id, from_column, to_table_id, to_column,
+    cardinality, relationship_type, created_at, er_entity_id)
+    VALUES (:1, :2, :3, :4, :5, :6, SYSTIMESTAMP, :7)
+    RETURNING id INTO :8
+"""
+
+
+def parse_edge(item):
+    """
+    (from_table_id, from_column, to_table_id, to_column, cardinality, relationship_type)
+    from a request row in snake_case or camelCase; raises ValueError naming the problem.
+    """
+    if not isinstance(item, dict):
+        raise ValueError("Relationship must be an object")
+    values = {}
+    for field, alias in _FIELDS:
+        value = item.get(field, item.get(alias))
+        if value is None or value == "":
+            if field == "relationship_type":
+                value = DEFAULT_RELATIONSHIP_TYPE
+            else:
+                raise ValueError(f"Missing required field: {alias}")
+        values[field] = value
+    for field, alias in _FIELDS[0], _FIELDS[2]:
+        try:
+            values[field] = int(values[field])
+        except (TypeError, ValueError):
+            raise ValueError(f"{alias} must be an integer")
+    return tuple(values[field] for field, _ in _FIELDS)
+
+
+def existing_edges(conn, er_entity_id):
+    """{(from_table_id, from_column, to_table_id, to_column): id} for an ER entity's relationships"""
+    rows = db.query_all("""
+        SELECT from_table_id, from_column, to_table_id, to_column, id
+        FROM er_relationships
+        WHERE er_entity_id = :1
+    """, [er_entity_id], conn=conn)
+    return {tuple(row[:4]): row[4] for row in rows}
+
+
+def _insert_batch(cursor, er_entity_id, batch):
+    """Insert (index, edge) pairs; yields (index, id, error) per pair"""
+    ids = cursor.var(oracledb.NUMBER, arraysize=len(batch))
+    cursor.setinputsizes(None, None, None, None, None, None, None, ids)
+    cursor.executemany(_INSERT_SQL, [edge + (er_entity_id,) for _, edge in batch], batcherrors=True)
+    errors = {error.offset: error.message for error in cursor.getbatcherrors()}
+    for offset, (index, _) in enumerate(batch):
+        if offset in errors:
+            yield index, None, errors[offset]
+        else:
+            returned = ids.getvalue(offset)
+            yield index, int(returned[0]) if returned else None, None
+
+
+def import_edges(conn, er_entity_id, edges, known=None):
+    """
+    Insert edges (tuples as returned by parse_edge, or exceptions for rows that
+    failed to parse) into er_entity_id and commit once; returns per-row results.
+
+    known is the entity's existing_edges() if the caller has already read them.
+    """
+    results = [None] * len(edges)
+    if known is None:
+        known = existing_edges(conn, er_entity_id)
+    pending, seen = [], {}
+
+    for index, edge in enumerate(edges):
+        if isinstance(edge, Exception):
+            results[index] = {"index": index, "status": "invalid", "id": None, "error": str(edge)}
+            continue
+        key = edge[:4]
+        if key in known:
+            results[index] = {"index": index, "status": "duplicate", "id": known[key], "error": None}
+        elif key in seen:
+            results[index] = {
+                "index": index, "status": "duplicate", "id": None,
+                "error": f"Same relationship as row {seen[key]}"
+            }
+        else:
+            seen[key] = index
+            pending.append((index, edge))
+
+    with db.cursor(conn, db.FETCH_SINGLE) as cursor:
+        for start in range(0, len(pending), ER_IMPORT_BATCH_ROWS):
+            batch = pending[start:start + ER_IMPORT_BATCH_ROWS]
+            for index, relationship_id, error in _insert_batch(cursor, er_entity_id, batch):
+                if error:
+                    results[index] = {"index": index, "status": "error", "id": None, "error": error}
+                else:
+                    results[index] = {"index": index, "status": "created", "id": relationship_id, "error": None}
+    conn.commit()
+
+    created = sum(1 for result in results if result["status"] == "created")
+    logger.info(f"Imported {created} of {len(edges)} relationships into ER entity {er_entity_id}")
+    return results
+
+
+def import_relationships(conn, er_entity_id, items):
+    """Parse request rows and import them with import_edges()"""
+    edges = []
+    for item in items:
+        try:
+            edges.append(parse_edge(item))
+        except ValueError as e:
+            edges.append(e)
+    return import_edges(conn, er_entity_id, edges)
+
+
+def summarize(results):
+    """Counts of each result status"""
+    counts = {"created": 0, "duplicate": 0, "invalid": 0, "error": 0}
+    for result in results:
+        counts[result["status"]] += 1
+    return counts
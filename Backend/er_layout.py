@@ -0,0 +1,363 @@
+"""
+Precomputed ER diagram layouts.
+
+The layout of an ER entity's diagram is computed on the server, stored in
+the er_layouts table as a JSON document, and returned as ready-to-render
+node coordinates, so the browser no longer lays out every table each time a
+diagram opens.
+
+Layouts are layered: a relationship points from the referencing table to
+the referenced one, and referenced tables are placed above the tables that
+reference them. Cycles are broken by ignoring DFS back edges. Each table's
+layer is its longest path from a root, and a few barycenter sweeps order the
+tables within each layer to cut down crossings. Connected groups of tables
+are laid out separately and packed in rows ER_LAYOUT_MAX_COLUMNS wide.
+Positions are grid cells scaled by ER_LAYOUT_SPACING_X / _Y, which match the
+node sizes ErDiagram.jsx uses.
+
+Each stored layout records the table pairs it was computed for. When an
+entity's relationships no longer match them, only the difference is laid
+out: tables that left are dropped, new tables go in the nearest free cell
+next to the tables they are related to, and everything else keeps its
+position. A full relayout happens when there is no stored layout, when more
+than a quarter of the tables changed, or when it is asked for.
+"""
+import os
+import json
+import logging
+import threading
+from datetime import datetime
+from collections import deque
+
+import oracledb
+
+import db
+
+logger = logging.getLogger(__name__)
+
+
+# --- ER Layout Configuration ---
+ER_LAYOUT_SPACING_X = int(os.environ.get('ER_LAYOUT_SPACING_X', '600'))
+ER_LAYOUT_SPACING_Y = int(os.environ.get('ER_LAYOUT_SPACING_Y', '700'))
+ER_LAYOUT_MAX_COLUMNS = int(os.environ.get('ER_LAYOUT_MAX_COLUMNS', '12'))
+ER_LAYOUT_SWEEPS = int(os.environ.get('ER_LAYOUT_SWEEPS', '4'))
+
+ALGORITHM = "layered"
+
+_CREATE_TABLE_SQL = """
+    CREATE TABLE er_layouts (
+        er_entity_id NUMBER PRIMARY KEY,
+        layout CLOB NOT NULL,
+        updated_at TIMESTAMP DEFAULT SYSTIMESTAMP
+    )
+"""
+_PAIRS_SQL = """
+    SELECT DISTINCT from_table_id, to_table_id
+    FROM er_relationships
+    WHERE er_entity_id = :1
+"""
+
+_lock = threading.Lock()
+_table_lock = threading.Lock()
+_table_ready = False
+# er_entity_id -> stored layout document, as last read or written by this process
+_layouts = {}
+
+
+def ensure_table():
+    """Create the er_layouts table if it does not exist yet; runs once per process"""
+    global _table_ready
+    if _table_ready:
+        return
+    with _table_lock:
+        if _table_ready:
+            return
+        with db.connection() as conn, conn.cursor() as cursor:
+            try:
+                cursor.execute(_CREATE_TABLE_SQL)
+                logger.info("Created er_layouts table")
+            except oracledb.DatabaseError as e:
+                error, = e.args
+                # ORA-00955: name is already used by an existing object
+                if error.code != 955:
+                    raise
+        _table_ready = True
+
+
+def _components(nodes, pairs):
+    parent = {node: node for node in nodes}
+
+    def find(node):
+        while parent[node] != node:
+            parent[node] = parent[parent[node]]
+            node = parent[node]
+        return node
+
+    for a, b in pairs:
+        parent[find(a)] = find(b)
+    groups = {}
+    for node in sorted(nodes):
+        groups.setdefault(find(node), []).append(node)
+    return sorted(groups.values(), key=len, reverse=True)
+
+
+def _layered(nodes, pairs):
+    """{node: (column, row)} for one connected group, referenced tables on top"""
+    children = {node: [] for node in nodes}
+    for child, referenced in pairs:
+        if child != referenced:
+            children[referenced].append(child)
+    for node in children:
+        children[node].sort()
+    indegree = {node: 0 for node in nodes}
+    for node in nodes:
+        for child in children[node]:
+            indegree[child] += 1
+
+    # Drop back edges found by an iterative DFS, roots first, to get a DAG
+    state, dag = {}, {node: [] for node in nodes}
+    for start in sorted(nodes, key=lambda node: (indegree[node] > 0, node)):
+        if start in state:
+            continue
+        state[start] = "open"
+        stack = [(start, iter(children[start]))]
+        while stack:
+            node, pending = stack[-1]
+            child = next(pending, None)
+            if child is None:
+                state[node] = "done"
+                stack.pop()
+            elif state.get(child) != "open":
+                dag[node].append(child)
+                if child not in state:
+                    state[child] = "open"
+                    stack.append((child, iter(children[child])))
+
+    # Longest-path layering in topological order
+    incoming = {node: 0 for node in nodes}
+    for node in nodes:
+        for child in dag[node]:
+            incoming[child] += 1
+    row = {node: 0 for node in nodes}
+    queue = deque(sorted(node for node in nodes if incoming[node] == 0))
+    order = []
+    while queue:
+        node = queue.popleft()
+        order.append(node)
+        for child in dag[node]:
+            row[child] = max(row[child], row[node] + 1)
+            incoming[child] -= 1
+            if incoming[child] == 0:
+                queue.append(child)
+
+    layers = {}
+    for node in order:
+        layers.setdefault(row[node], []).append(node)
+    layers = [layers[i] for i in sorted(layers)]
+    parents = {node: [] for node in nodes}
+    for node in nodes:
+        for child in dag[node]:
+            parents[child].append(node)
+
+    # Barycenter sweeps, down using parents and up using children
+    for sweep in range(ER_LAYOUT_SWEEPS):
+        downward = sweep % 2 == 0
+        indices = range(1, len(layers)) if downward else range(len(layers) - 2, -1, -1)
+        for i in indices:
+            neighbour_layer = layers[i - 1] if downward else layers[i + 1]
+            position = {node: p for p, node in enumerate(neighbour_layer)}
+            current = {node: p for p, node in enumerate(layers[i])}
+
+            def barycenter(node):
+                linked = [position[n] for n in (parents[node] if downward else dag[node]) if n in position]
+                return sum(linked) / len(linked) if linked else current[node]
+
+            layers[i].sort(key=lambda node: (barycenter(node), current[node]))
+
+    width = max(len(layer) for layer in layers)
+    grid = {}
+    for r, layer in enumerate(layers):
+        offset = (width - len(layer)) // 2
+        for c, node in enumerate(layer):
+            grid[node] = (offset + c, r)
+    return grid
+
+
+def compute(nodes, pairs, top=0):
+    """{node: (column, row)} for a whole diagram, connected groups packed in rows from row top down"""
+    grid = {}
+    column, shelf_top, shelf_height = 0, top, 0
+    groups = _components(nodes, pairs)
+    group_of = {node: i for i, group in enumerate(groups) for node in group}
+    group_pairs = [[] for _ in groups]
+    for a, b in pairs:
+        group_pairs[group_of[a]].append((a, b))
+    for group, members_pairs in zip(groups, group_pairs):
+        cells = _layered(set(group), members_pairs)
+        width = max(c for c, _ in cells.values()) + 1
+        height = max(r for _, r in cells.values()) + 1
+        if column and column + width > ER_LAYOUT_MAX_COLUMNS:
+            column, shelf_top, shelf_height = 0, shelf_top + shelf_height + 1, 0
+        for node, (c, r) in cells.items():
+            grid[node] = (column + c, shelf_top + r)
+        column += width + 1
+        shelf_height = max(shelf_height, height)
+    return grid
+
+
+def _nearest_free(column, row, occupied):
+    """Closest unoccupied cell to (column, row), preferring the same row"""
+    distance = 0
+    while True:
+        ring = [
+            (column + dc, row + dr)
+            for dr in range(-distance, distance + 1)
+            for dc in range(-distance, distance + 1)
+            if max(abs(dc), abs(dr)) == distance
+        ]
+        ring.sort(key=lambda cell: (abs(cell[1] - row), abs(cell[0] - column)))
+        for cell in ring:
+            if cell not in occupied:
+                return cell
+        distance += 1
+
+
+def extend(grid, nodes, pairs):
+    """
+    Update grid (as returned by compute) to a changed diagram: keep the cells
+    of tables still present, drop the rest, and place new tables next to
+    their related tables. New tables with no placed neighbour are laid out
+    on their own below the diagram.
+    """
+    grid = {node: cell for node, cell in grid.items() if node in nodes}
+    occupied = set(grid.values())
+    referenced_by, references = {}, {}
+    for child, referenced in pairs:
+        if child != referenced:
+            referenced_by.setdefault(referenced, []).append(child)
+            references.setdefault(child, []).append(referenced)
+
+    pending = sorted(node for node in nodes if node not in grid)
+    progress = True
+    while pending and progress:
+        progress, waiting = False, []
+        for node in pending:
+            above = [grid[n] for n in references.get(node, ()) if n in grid]
+            below = [grid[n] for n in referenced_by.get(node, ()) if n in grid]
+            if not above and not below:
+                waiting.append(node)
+                continue
+            linked = above + below
+            column = round(sum(c for c, _ in linked) / len(linked))
+            row = max(r for _, r in above) + 1 if above else min(r for _, r in below) - 1
+            grid[node] = _nearest_free(column, row, occupied)
+            occupied.add(grid[node])
+            progress = True
+        pending = waiting
+
+    if pending:
+        members = set(pending)
+        top = max((r for _, r in grid.values()), default=-2) + 2
+        grid.update(compute(members, [(a, b) for a, b in pairs if a in members and b in members], top))
+    return grid
+
+
+def _document(grid, pairs, mode):
+    return {
+        "algorithm": ALGORITHM,
+        "cells": {str(node): list(cell) for node, cell in grid.items()},
+        "pairs": sorted([list(pair) for pair in pairs]),
+        "computed": mode,
+        "computed_at": datetime.now().isoformat(),
+    }
+
+
+def _read(conn, er_entity_id):
+    with _lock:
+        if er_entity_id in _layouts:
+            return _layouts[er_entity_id]
+    row = db.query_one("SELECT layout FROM er_layouts WHERE er_entity_id = :1", [er_entity_id], conn=conn)
+    if row is None:
+        return None
+    value = row[0].read() if hasattr(row[0], "read") else row[0]
+    document = json.loads(value)
+    with _lock:
+        _layouts[er_entity_id] = document
+    return document
+
+
+def _write(conn, er_entity_id, document):
+    with db.cursor(conn, db.FETCH_SINGLE) as cursor:
+        cursor.setinputsizes(layout=oracledb.DB_TYPE_CLOB)
+        cursor.execute("""
+            MERGE INTO er_layouts l
+            USING (SELECT :er_entity_id AS er_entity_id FROM dual) s
+            ON (l.er_entity_id = s.er_entity_id)
+            WHEN MATCHED THEN
+                UPDATE SET l.layout = :layout, l.updated_at = SYSTIMESTAMP
+            WHEN NOT MATCHED THEN
+                INSERT (er_entity_id, layout, updated_at) VALUES (:er_entity_id, :layout, SYSTIMESTAMP)
+        """, {"er_entity_id": er_entity_id, "layout": json.dumps(document)})
+    conn.commit()
+    with _lock:
+        _layouts[er_entity_id] = document
+
+
+def layout(conn, er_entity_id, pairs=None, relayout=False):
+    """
+    Node positions for an ER entity's diagram, recomputed only as far as its
+    relationships changed since the stored layout.
+
+    pairs are the entity's distinct (from_table_id, to_table_id) pairs if the
+    caller has already fetched them. Returns {"algorithm", "positions":
+    {table_id: {"x", "y"}}, "width", "height", "computed", "computed_at",
+    "recomputed"}; recomputed is "none", "incremental" or "full".
+    """
+    ensure_table()
+    if pairs is None:
+        pairs = db.query_all(_PAIRS_SQL, [er_entity_id], conn=conn)
+    pairs = {(int(a), int(b)) for a, b in pairs}
+    nodes = {node for pair in pairs for node in pair}
+
+    document = None if relayout else _read(conn, er_entity_id)
+    if document is not None and {tuple(pair) for pair in document["pairs"]} == pairs:
+        recomputed = "none"
+    else:
+        stored = {int(node): tuple(cell) for node, cell in document["cells"].items()} if document else {}
+        changed = len(nodes.symmetric_difference(stored))
+        if document is None or changed > len(nodes) // 4:
+            grid, recomputed = compute(nodes, pairs), "full"
+        else:
+            grid, recomputed = extend(stored, nodes, pairs), "incremental"
+        document = _document(grid, pairs, recomputed)
+        _write(conn, er_entity_id, document)
+        logger.info(f"{recomputed.capitalize()} layout of ER entity {er_entity_id}: {len(nodes)} tables")
+
+    cells = document["cells"]
+    columns = [c for c, _ in cells.values()] or [0]
+    rows = [r for _, r in cells.values()] or [0]
+    return {
+        "algorithm": document["algorithm"],
+        "positions": {
+            node: {"x": c * ER_LAYOUT_SPACING_X, "y": r * ER_LAYOUT_SPACING_Y} for node, (c, r) in cells.items()
+        },
+        "width": (max(columns) - min(columns) + 1) * ER_LAYOUT_SPACING_X if cells else 0,
+        "height": (max(rows) - min(rows) + 1) * ER_LAYOUT_SPACING_Y if cells else 0,
+        "computed": document["computed"],
+        "computed_at": document["computed_at"],
+        "recomputed": recomputed,
+    }
+
+
+def forget(conn, er_entity_id):
+    """Delete an ER entity's stored layout, e.g. with the diagram itself; the caller commits"""
+    with _lock:
+        _layouts.pop(er_entity_id, None)
+    with db.cursor(conn, db.FETCH_SINGLE) as cursor:
+        try:
+            cursor.execute("DELETE FROM er_layouts WHERE er_entity_id = :1", [er_entity_id])
+        except oracledb.DatabaseError as e:
+            error, = e.args
+            # ORA-00942: table or view does not exist, so there is no layout to forget
+            if error.code != 942:
+                raise
@@ -0,0 +1,164 @@
+"""
+Discovery of ER relationships from declared foreign keys.
+
+Referential constraints come from the schema snapshot, which already holds
+every USER_CONSTRAINTS / USER_CONS_COLUMNS row together with the table the
+constraint references, so discovery costs no dictionary queries of its own.
+Each FK column is paired with the referenced key's column at the same
+position, and both tables are mapped to tables_metadata ids in one catalog
+query over the ER entity's LOB (optionally narrowed to one logical
+database). When a table name is registered in more than one of those
+databases, only pairs within the same database are used.
+
+The resulting edges go through er_import.import_edges, which skips the ones
+the ER entity already has and bulk-inserts the rest in one transaction.
+"""
+import logging
+
+import db
+import er_import
+import schema_snapshot
+
+logger = logging.getLogger(__name__)
+
+
+# Catalog tables under an ER entity's LOB; :database narrows it to one logical database
+_CATALOG_SQL = """
+    SELECT t.id, t.name, t.database_id
+    FROM tables_metadata t
+    WHERE t.database_id IN (
+        SELECT sald.logical_database_id
+        FROM subject_area_logical_database sald
+        JOIN subject_areas s ON sald.subject_area_id = s.id
+        JOIN er_entities ee ON ee.lob_id = s.lob_id
+        WHERE ee.id = :er_entity_id
+    )
+"""
+_DATABASE_FILTER = """
+    AND t.database_id IN (SELECT id FROM logical_databases WHERE UPPER(name) = UPPER(:database))
+"""
+
+
+def _key_columns(entry, constraint_name):
+    return [
+        c["column"] for c in sorted(
+            (c for c in entry["constraints"] if c["name"] == constraint_name),
+            key=lambda c: c["position"] or 0
+        )
+    ]
+
+
+def foreign_keys(snapshot):
+    """
+    Every referential constraint in the snapshot as a dict with name, table,
+    columns, references_table, references_columns and one_to_one (the FK
+    columns are also the table's primary or a unique key).
+    """
+    found = []
+    for table_name, entry in snapshot.items():
+        fks = {}
+        for constraint in entry["constraints"]:
+            if constraint["type"] == "R" and constraint["column"]:
+                fks.setdefault(constraint["name"], constraint)
+        if not fks:
+            continue
+        unique_keys = {}
+        for constraint in entry["constraints"]:
+            if constraint["type"] in ("P", "U"):
+                unique_keys.setdefault(constraint["name"], set()).add(constraint["column"])
+
+        for name, constraint in fks.items():
+            columns = _key_columns(entry, name)
+            referenced = snapshot.get(constraint["references_table"] or "")
+            found.append({
+                "name": name,
+                "table": table_name,
+                "columns": columns,
+                "references_table": constraint["references_table"],
+                # Empty if the referenced table is in another schema, so not in the snapshot
+                "references_columns": _key_columns(referenced, constraint["references"]) if referenced else [],
+                "one_to_one": set(columns) in unique_keys.values(),
+            })
+    return found
+
+
+def _catalog(conn, er_entity_id, database=None):
+    """TABLE_NAME -> [(id, database_id), ...] for the tables an ER entity can use"""
+    sql, params = _CATALOG_SQL, {"er_entity_id": er_entity_id}
+    if database:
+        sql += _DATABASE_FILTER
+        params["database"] = database
+    catalog = {}
+    for table_id, name, database_id in db.query_all(sql, params, conn=conn):
+        catalog.setdefault(name.upper(), []).append((table_id, database_id))
+    return catalog
+
+
+def _table_pairs(from_ids, to_ids):
+    same_database = [(f, t) for f, f_db in from_ids for t, t_db in to_ids if f_db == t_db]
+    if same_database:
+        return same_database
+    if len(from_ids) == 1 and len(to_ids) == 1:
+        return [(from_ids[0][0], to_ids[0][0])]
+    return []
+
+
+def edges(conn, er_entity_id, database=None):
+    """
+    (edges, unmapped) for the schema's foreign keys: edge tuples in the
+    er_import.parse_edge layout, and {"constraint", "reason"} for every FK
+    that could not be turned into edges.
+    """
+    catalog = _catalog(conn, er_entity_id, database)
+    found, unmapped = [], []
+    for fk in foreign_keys(schema_snapshot.tables(conn)):
+        if len(fk["references_columns"]) != len(fk["columns"]):
+            unmapped.append({"constraint": fk["name"], "reason": f"Referenced key on {fk['references_table']} not found"})
+            continue
+        from_ids, to_ids = catalog.get(fk["table"]), catalog.get(fk["references_table"])
+        if not from_ids or not to_ids:
+            missing = fk["table"] if not from_ids else fk["references_table"]
+            unmapped.append({"constraint": fk["name"], "reason": f"Table {missing} is not in the catalog for this ER entity"})
+            continue
+        pairs = _table_pairs(from_ids, to_ids)
+        if not pairs:
+            unmapped.append({"constraint": fk["name"], "reason": "Tables are registered in several databases"})
+            continue
+        cardinality = "one-to-one" if fk["one_to_one"] else "many-to-one"
+        for from_id, to_id in pairs:
+            for from_column, to_column in zip(fk["columns"], fk["references_columns"]):
+                found.append((from_id, from_column, to_id, to_column, cardinality, er_import.DEFAULT_RELATIONSHIP_TYPE))
+    return found, unmapped
+
+
+def discover(conn, er_entity_id, database=None, dry_run=False):
+    """
+    Add the edges of every declared FK that the ER entity does not have yet.
+
+    With dry_run the new edges are only reported. Returns a summary with the
+    new edges, their results and the FKs that could not be mapped.
+    """
+    found, unmapped = edges(conn, er_entity_id, database)
+    known = er_import.existing_edges(conn, er_entity_id)
+    new = list({edge[:4]: edge for edge in found if edge[:4] not in known}.values())
+    summary = {
+        "er_entity_id": er_entity_id,
+        "foreign_key_edges": len(found),
+        "existing": len(found) - len(new),
+        "new": len(new),
+        "unmapped": unmapped,
+    }
+    keys = ("from_table_id", "from_column", "to_table_id", "to_column", "cardinality", "relationship_type")
+    relationships = [dict(zip(keys, edge)) for edge in new]
+    if dry_run or not new:
+        summary["relationships"] = relationships
+        return summary
+
+    results = er_import.import_edges(conn, er_entity_id, new, known)
+    summary["summary"] = er_import.summarize(results)
+    summary["relationships"] = [
+        dict(relationship, id=result["id"], status=result["status"], error=result["error"])
+        for relationship, result in zip(relationships, results)
+    ]
+    logger.info(f"FK discovery added {summary['summary']['created']} relationships to ER entity {er_entity_id}")
+    return summary
@@ -0,0 +1,77 @@
+"""
+Process-wide cache of the serialized LOB / subject area / database / table tree.
+
+The tree is built once and kept as a ready-to-send JSON body with an ETag
+derived from its content. The write endpoints that change the tree call
+invalidate(); every invalidation bumps a version number so that a rebuild
+that was already in flight when the write committed is thrown away instead
+of being cached. HIERARCHY_CACHE_TTL_SECONDS bounds how stale the tree can
+get when the catalog tables are changed outside this process.
+"""
+import os
+import time
+import hashlib
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+# --- Hierarchy Cache Configuration ---
+HIERARCHY_CACHE_TTL_SECONDS = int(os.environ.get('HIERARCHY_CACHE_TTL_SECONDS', '300'))
+
+_lock = threading.Lock()
+_build_lock = threading.Lock()
+_version = 0
+# (version, body, etag, built_at) of the cached tree, or None
+_entry = None
+
+
+def version():
+    return _version
+
+
+def invalidate():
+    """Drop the cached tree; called after a write to the hierarchy commits"""
+    global _version, _entry
+    with _lock:
+        _version += 1
+        _entry = None
+
+
+def _fresh(entry):
+    return (
+        entry is not None
+        and entry[0] == _version
+        and time.monotonic() - entry[3] < HIERARCHY_CACHE_TTL_SECONDS
+    )
+
+
+def get(build):
+    """
+    Return (body, etag, version) for the current tree.
+
+    build() must return the tree serialized as a JSON string; it is only
+    called when the cached copy is missing, invalidated or expired, and only
+    one thread builds at a time.
+    """
+    global _entry
+    entry = _entry
+    if _fresh(entry):
+        return entry[1], entry[2], entry[0]
+
+    with _build_lock:
+        entry = _entry
+        if _fresh(entry):
+            return entry[1], entry[2], entry[0]
+
+        started_version = _version
+        body = build()
+        etag = hashlib.sha256(body.encode("utf-8")).hexdigest()[:32]
+        entry = (started_version, body, etag, time.monotonic())
+        with _lock:
+            # A write committed while we were building; serve this copy once but do not keep it
+            if _version == started_version:
+                _entry = entry
+        logger.info(f"Built hierarchy tree version {started_version} ({len(body)} bytes)")
+        return body, etag, started_version
@@ -0,0 +1,106 @@
+"""
+Streaming JSON responses for the list endpoints.
+
+Instead of fetching every row, turning them all into dicts and serializing
+the whole list at once, query() fetches JSON_STREAM_FETCH_ROWS rows at a
+time and iter_json() serializes each batch with orjson as soon as it
+arrives. Only one batch is held in memory and the client gets the opening
+bytes straight after the first fetch. orjson writes datetimes as ISO 8601
+itself, so rows no longer need an isoformat() pass.
+
+Output is the same JSON array the endpoints always returned, or NDJSON (one
+object per line) when the client asks for it with ?format=ndjson or an
+Accept: application/x-ndjson header.
+"""
+import os
+import logging
+from decimal import Decimal
+
+import oracledb
+import orjson
+
+import db
+
+logger = logging.getLogger(__name__)
+
+
+# --- JSON Stream Configuration ---
+JSON_STREAM_FETCH_ROWS = int(os.environ.get('JSON_STREAM_FETCH_ROWS', '1000'))
+
+JSON_MIMETYPE = "application/json"
+NDJSON_MIMETYPE = "application/x-ndjson"
+
+
+def _default(value):
+    """Types orjson does not serialize natively"""
+    if isinstance(value, Decimal):
+        return int(value) if value == value.to_integral_value() else float(value)
+    if isinstance(value, oracledb.LOB):
+        return value.read()
+    if isinstance(value, bytes):
+        return value.hex()
+    raise TypeError(f"Type is not JSON serializable: {type(value).__name__}")
+
+
+def dumps(obj):
+    """obj as UTF-8 JSON bytes"""
+    return orjson.dumps(obj, default=_default)
+
+
+def wants_ndjson(request):
+    """True if the client asked for NDJSON rather than a JSON array"""
+    fmt = request.args.get("format", "").lower()
+    if fmt:
+        return fmt == "ndjson"
+    return request.accept_mimetypes.best_match([JSON_MIMETYPE, NDJSON_MIMETYPE]) == NDJSON_MIMETYPE
+
+
+def _batches(sql, params, row):
+    with db.connection() as conn, db.cursor(conn, (JSON_STREAM_FETCH_ROWS, JSON_STREAM_FETCH_ROWS)) as cursor:
+        cursor.execute(sql, params or [])
+        columns = [desc[0].lower() for desc in cursor.description]
+        yield None
+        while True:
+            rows = cursor.fetchmany()
+            if not rows:
+                break
+            dicts = [dict(zip(columns, values)) for values in rows]
+            yield dicts if row is None else [row(item) for item in dicts]
+
+
+def query(sql, params=None, row=None):
+    """
+    Batches of row dicts keyed by lower-cased column name, optionally passed through row().
+
+    The statement is executed before this returns, so errors in it reach the
+    caller while it can still answer with an error status. The pooled
+    connection is held until the batches are exhausted or closed.
+    """
+    batches = _batches(sql, params, row)
+    next(batches)
+    return batches
+
+
+def iter_json(batches, ndjson=False):
+    """Bytes chunks of a JSON array (or NDJSON lines) over batches of dicts, one chunk per batch"""
+    sent = 0
+    try:
+        if ndjson:
+            for batch in batches:
+                if batch:
+                    yield b"".join(dumps(item) + b"\n" for item in batch)
+                    sent += len(batch)
+        else:
+            separator = b"["
+            for batch in batches:
+                if batch:
+                    yield separator + b",".join(dumps(item) for item in batch)
+                    separator = b","
+                    sent += len(batch)
+            yield b"[]" if separator == b"[" else b"]"
+    except Exception as e:
+        # Headers are already sent; the client sees a truncated body
+        logger.error(f"JSON stream failed after {sent} rows: {e}")
+        raise
+    finally:
+        batches.close()
@@ -0,0 +1,233 @@
+"""
+On-disk cache of rendered profile reports.
+
+Entries are keyed by table plus the profiling options and are only served
+while the table's change fingerprint (see change_detection) still matches the
+one recorded when the report was built.
+
+Each entry is three files in PROFILE_CACHE_DIR: <key>.html, <key>.json and
+<key>.meta.json. Entries expire after PROFILE_CACHE_TTL_SECONDS and the least
+recently used ones are evicted once the cache exceeds PROFILE_CACHE_MAX_BYTES
+or PROFILE_CACHE_MAX_ENTRIES. The files are the source of truth, so entries
+written by profiling worker processes are visible to the server process too.
+A hit touches the entry's .meta.json, whose mtime is its last access time, so
+the LRU order survives restarts and is shared by every process. put(),
+invalidate() and status() rescan the directory rather than trust this
+process's index.
+"""
+import os
+import json
+import time
+import hashlib
+import logging
+import tempfile
+import threading
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+
+# --- Profile Cache Configuration ---
+PROFILE_CACHE_DIR = os.environ.get(
+    'PROFILE_CACHE_DIR',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'profile_cache')
+)
+PROFILE_CACHE_TTL_SECONDS = int(os.environ.get('PROFILE_CACHE_TTL_SECONDS', str(7 * 24 * 3600)))
+PROFILE_CACHE_MAX_BYTES = int(os.environ.get('PROFILE_CACHE_MAX_BYTES', str(512 * 1024 * 1024)))
+PROFILE_CACHE_MAX_ENTRIES = int(os.environ.get('PROFILE_CACHE_MAX_ENTRIES', '500'))
+
+_lock = threading.Lock()
+# key -> {"size": bytes, "accessed": epoch seconds}, least recently used first
+_index = None
+_stats = {"hits": 0, "misses": 0, "stale": 0, "expired": 0, "evicted": 0}
+
+
+def cache_key(table_name, mode, options=None):
+    """Stable file-name-safe key for a table and the options its report was built with"""
+    raw = json.dumps([table_name.upper(), mode, options or {}], sort_keys=True, default=str)
+    return hashlib.sha256(raw.encode()).hexdigest()[:32]
+
+
+def _path(key, suffix):
+    return os.path.join(PROFILE_CACHE_DIR, f"{key}{suffix}")
+
+
+def _write_atomic(path, content):
+    fd, tmp_path = tempfile.mkstemp(dir=PROFILE_CACHE_DIR, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write(content)
+        os.replace(tmp_path, path)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return len(content.encode("utf-8"))
+
+
+def _remove(key):
+    for suffix in (".meta.json", ".html", ".json"):
+        try:
+            os.remove(_path(key, suffix))
+        except FileNotFoundError:
+            pass
+    if _index is not None:
+        _index.pop(key, None)
+
+
+def _load_index():
+    """The LRU index, built from the entries on disk on first use (caller holds _lock)"""
+    global _index
+    if _index is None:
+        _index = _scan()
+    return _index
+
+
+def _scan():
+    """LRU index of the entries on disk, ordered by their meta files' mtimes (caller holds _lock)"""
+    os.makedirs(PROFILE_CACHE_DIR, exist_ok=True)
+    entries = []
+    for name in os.listdir(PROFILE_CACHE_DIR):
+        if not name.endswith(".meta.json"):
+            continue
+        key = name[:-len(".meta.json")]
+        try:
+            with open(_path(key, ".meta.json"), encoding="utf-8") as f:
+                accessed = os.fstat(f.fileno()).st_mtime
+                meta = json.load(f)
+            entries.append((accessed, key, meta["size"]))
+        except FileNotFoundError:
+            # Removed by another process since listdir()
+            continue
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning(f"Dropping unreadable profile cache entry {key}: {e}")
+            _remove(key)
+
+    return OrderedDict(
+        (key, {"size": size, "accessed": accessed})
+        for accessed, key, size in sorted(entries)
+    )
+
+
+def _evict(index):
+    total = sum(entry["size"] for entry in index.values())
+    while index and (total > PROFILE_CACHE_MAX_BYTES or len(index) > PROFILE_CACHE_MAX_ENTRIES):
+        key, entry = next(iter(index.items()))
+        _remove(key)
+        total -= entry["size"]
+        _stats["evicted"] += 1
+
+
+def get(key, fingerprint, fmt="html"):
+    """
+    Cached report content and its metadata, or None.
+
+    An entry whose fingerprint no longer matches the table, or that is older
+    than the TTL, is deleted and counts as a miss. fingerprint=None skips the
+    change check and fmt=None skips reading the content.
+    """
+    with _lock:
+        index = _load_index()
+        try:
+            with open(_path(key, ".meta.json"), encoding="utf-8") as f:
+                meta = json.load(f)
+        except FileNotFoundError:
+            index.pop(key, None)
+            _stats["misses"] += 1
+            return None
+        except (OSError, ValueError) as e:
+            logger.warning(f"Could not read profile cache entry {key}: {e}")
+            _remove(key)
+            _stats["misses"] += 1
+            return None
+
+        if fingerprint is not None and meta["fingerprint"] != fingerprint:
+            _remove(key)
+            _stats["stale"] += 1
+            _stats["misses"] += 1
+            return None
+        if time.time() - meta["created"] > PROFILE_CACHE_TTL_SECONDS:
+            _remove(key)
+            _stats["expired"] += 1
+            _stats["misses"] += 1
+            return None
+
+        content = None
+        if fmt is not None:
+            try:
+                with open(_path(key, ".json" if fmt == "json" else ".html"), encoding="utf-8") as f:
+                    content = f.read()
+            except OSError as e:
+                logger.warning(f"Could not read profile cache entry {key}: {e}")
+                _remove(key)
+                _stats["misses"] += 1
+                return None
+
+        now = time.time()
+        try:
+            os.utime(_path(key, ".meta.json"), (now, now))
+        except OSError as e:
+            logger.warning(f"Could not record access to profile cache entry {key}: {e}")
+        # Profiling workers write entries from their own processes; adopt them here
+        index[key] = {"size": meta["size"], "accessed": now}
+        index.move_to_end(key)
+        _stats["hits"] += 1
+        return content, meta
+
+
+def put(key, fingerprint, html_content, json_content, **meta):
+    """Store a rendered report under key, evicting old entries to stay within the limits"""
+    if fingerprint is None:
+        return False
+    global _index
+    with _lock:
+        os.makedirs(PROFILE_CACHE_DIR, exist_ok=True)
+        try:
+            size = _write_atomic(_path(key, ".html"), html_content)
+            size += _write_atomic(_path(key, ".json"), json_content)
+            meta.update({"fingerprint": fingerprint, "created": time.time(), "size": size})
+            _write_atomic(_path(key, ".meta.json"), json.dumps(meta, default=str))
+        except OSError as e:
+            logger.warning(f"Could not write profile cache entry {key}: {e}")
+            _remove(key)
+            return False
+
+        # Other processes have added, read and evicted entries since this one last looked
+        _index = _scan()
+        _evict(_index)
+        return True
+
+
+def invalidate(table_name=None):
+    """Drop every cached report, or only those for one table; returns how many were dropped"""
+    global _index
+    with _lock:
+        # Rescan: profiling workers put entries this process has not seen
+        _index = index = _scan()
+        dropped = 0
+        for key in list(index):
+            if table_name is not None:
+                try:
+                    with open(_path(key, ".meta.json"), encoding="utf-8") as f:
+                        if json.load(f).get("table") != table_name.upper():
+                            continue
+                except (OSError, ValueError):
+                    pass
+            _remove(key)
+            dropped += 1
+        return dropped
+
+
+def status():
+    global _index
+    with _lock:
+        _index = index = _scan()
+        return {
+            "dir": PROFILE_CACHE_DIR,
+            "entries": len(index),
+            "bytes": sum(entry["size"] for entry in index.values()),
+            "max_entries": PROFILE_CACHE_MAX_ENTRIES,
+            "max_bytes": PROFILE_CACHE_MAX_BYTES,
+            "ttl_seconds": PROFILE_CACHE_TTL_SECONDS,
+            **_stats,
+        }
@@ -0,0 +1,353 @@
+"""
+Profile generation and the background job queue that runs it.
+
+build_profile() does the actual work: it reads the table (whole, sampled or
+in chunks), renders the report and stores it in the profile cache. /api/profile
+calls it inline; /api/profile-jobs hands it to a bounded process pool so a
+minutes-long ydata-profiling run neither blocks a request thread nor competes
+with them for the GIL.
+
+Jobs are keyed like cache entries (table, mode, options), so submitting the
+same profile while one is queued or running returns the existing job.
+Workers send (job id, stage, progress) messages back over a queue that a
+daemon thread in the server process folds into the job table.
+"""
+import os
+import json
+import uuid
+import time
+import logging
+import threading
+import multiprocessing
+from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import pandas as pd
+from ydata_profiling import ProfileReport
+
+import db
+import change_detection
+import profile_cache
+import profile_sampling
+import streaming_profile
+
+logger = logging.getLogger(__name__)
+
+
+# --- Profile Job Configuration ---
+# Worker processes; each one holds a whole table (or sample) in pandas while it runs
+PROFILE_JOB_WORKERS = int(os.environ.get('PROFILE_JOB_WORKERS', '2'))
+# Submissions beyond this many queued/running jobs are refused
+PROFILE_JOB_MAX_ACTIVE = int(os.environ.get('PROFILE_JOB_MAX_ACTIVE', '20'))
+# Finished jobs are forgotten after this long (seconds); their reports stay in the cache
+PROFILE_JOB_RETENTION_SECONDS = int(os.environ.get('PROFILE_JOB_RETENTION_SECONDS', '3600'))
+
+# "full" loads the table into one DataFrame for ydata-profiling, "streaming"
+# folds it in chunk by chunk, "sampled" profiles an Oracle-side SAMPLE of it,
+# "auto" picks streaming for large tables
+PROFILE_MODES = ("auto", "full", "streaming", "sampled")
+
+
+def parse_options(mode, data):
+    """Profiling options for a mode from request data; raises ValueError on bad input"""
+    if mode not in PROFILE_MODES:
+        raise ValueError(f"Invalid mode '{mode}'. Expected one of: {', '.join(PROFILE_MODES)}")
+    if mode != "sampled":
+        return {}
+    return {
+        "target_error": float(data.get("target_error", profile_sampling.PROFILE_SAMPLE_TARGET_ERROR)),
+        "confidence": float(data.get("confidence", profile_sampling.PROFILE_SAMPLE_CONFIDENCE)),
+        "method": data.get("sample_method", "row"),
+        "seed": int(data.get("seed", profile_sampling.PROFILE_SAMPLE_SEED)),
+        "minimal": str(data.get("minimal", True)).lower() != "false",
+    }
+
+
+def _no_progress(stage, fraction):
+    pass
+
+
+def build_profile(schema, table, mode, options, key, fingerprint, progress=_no_progress):
+    """
+    Profile a table, store the rendered report in the profile cache and
+    return (html_content, json_content, meta).
+
+    Raises ValueError for an empty table or bad sampling options.
+    """
+    query = f'SELECT * FROM {table}'  # No quotes unless table/schema is mixed/lowercase
+    sample_plan = None
+    with db.connection() as db_conn:
+        if mode == "auto":
+            mode = "streaming" if streaming_profile.should_stream(db_conn, table) else "full"
+
+        progress("fetching", 0.05)
+        if mode == "streaming":
+            # Statistics are folded in chunk by chunk, never holding the whole table
+            total = streaming_profile.estimated_rows(db_conn, table)
+            on_chunk = None
+            if total:
+                on_chunk = lambda rows: progress("fetching", 0.05 + 0.85 * min(rows / total, 1.0))
+            report = streaming_profile.profile_query(db_conn, query, on_chunk=on_chunk)
+        else:
+            if mode == "sampled":
+                query, sample_plan = profile_sampling.plan_sample(
+                    db_conn,
+                    table,
+                    target_error=options["target_error"],
+                    confidence=options["confidence"],
+                    method=options["method"],
+                    seed=options["seed"]
+                )
+            df = pd.read_sql(query, con=db_conn)
+
+    if mode == "streaming":
+        if report["rows"] == 0:
+            raise ValueError("Table is empty")
+        row_count, column_count = report["rows"], report["column_count"]
+        progress("rendering", 0.9)
+        html_content = streaming_profile.to_html(report, title=f"Streaming Profile - {schema}.{table}")
+        json_content = json.dumps(report, default=str)
+        report_label = "Streaming Profiling Report"
+    else:
+        if df.empty:
+            raise ValueError("Table is empty")
+        row_count, column_count = len(df), len(df.columns)
+
+        progress("profiling", 0.3)
+        if sample_plan:
+            sample_plan["sample_rows"] = row_count
+            profile = ProfileReport(
+                df,
+                title=f"YData Sampled Profile - {schema}.{table}",
+                minimal=options["minimal"]
+            )
+            report_label = "Sampled Profiling Report"
+        else:
+            profile = ProfileReport(df, title=f"YData Profile - {schema}.{table}", explorative=True)
+            report_label = "Real-time Profiling Report"
+        html_content = profile.to_html()
+        progress("rendering", 0.9)
+        json_content = profile.to_json()
+
+    meta = {
+        "table": table.upper(),
+        "mode": mode,
+        "report_label": report_label,
+        "row_count": row_count,
+        "column_count": column_count,
+        "generated_at": datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+        "sample_plan": sample_plan,
+    }
+    progress("caching", 0.95)
+    profile_cache.put(key, fingerprint, html_content, json_content, **meta)
+    return html_content, json_content, meta
+
+
+# --- Worker process side ---
+
+_progress_queue = None
+
+
+def _init_worker(progress_queue):
+    global _progress_queue
+    _progress_queue = progress_queue
+
+
+def refresh_profile(schema, table, mode="auto", options=None, refresh=False, progress=_no_progress):
+    """
+    Make sure the profile cache holds a current report for a table and return
+    its metadata, with cache="hit" if the cached one was still valid.
+
+    Raises LookupError if the table does not exist.
+    """
+    options = options or {}
+    key = profile_cache.cache_key(table, mode, options)
+    progress("fingerprint", 0.0)
+    with db.connection() as conn:
+        fingerprint = change_detection.fingerprint(conn, table)
+    if fingerprint is None:
+        raise LookupError(f"Table '{table}' not found")
+
+    if not refresh:
+        cached = profile_cache.get(key, fingerprint, fmt=None)
+        if cached:
+            return dict(cached[1], cache="hit")
+
+    _, _, meta = build_profile(schema, table, mode, options, key, fingerprint, progress)
+    return dict(meta, cache="miss")
+
+
+def _run_job(job_id, schema, table, mode, options, refresh):
+    """Job body, run in a pool process"""
+    def progress(stage, fraction):
+        _progress_queue.put((job_id, stage, round(fraction, 3)))
+
+    return refresh_profile(schema, table, mode, options, refresh, progress)
+
+
+def process_pool(workers, **kwargs):
+    """A process pool whose workers start from a fresh interpreter"""
+    # spawn, not fork: forked children would inherit the parent's pooled Oracle sessions
+    return ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"), **kwargs)
+
+
+# --- Server process side ---
+
+_lock = threading.Lock()
+_executor = None
+_progress_queue_parent = None
+_jobs = {}
+_active_by_key = {}
+
+
+def _get_executor():
+    """Start the process pool and its progress reader on first use (caller holds _lock)"""
+    global _executor, _progress_queue_parent
+    if _executor is None:
+        _progress_queue_parent = multiprocessing.get_context("spawn").Queue()
+        _executor = process_pool(
+            PROFILE_JOB_WORKERS,
+            initializer=_init_worker,
+            initargs=(_progress_queue_parent,)
+        )
+        threading.Thread(
+            target=_read_progress,
+            args=(_progress_queue_parent,),
+            name="profile-job-progress",
+            daemon=True
+        ).start()
+        logger.info(f"Started profiling process pool with {PROFILE_JOB_WORKERS} workers")
+    return _executor
+
+
+def _read_progress(progress_queue):
+    while True:
+        try:
+            job_id, stage, fraction = progress_queue.get()
+        except (EOFError, OSError):
+            return
+        with _lock:
+            job = _jobs.get(job_id)
+            if job is None or job["status"] in ("done", "failed"):
+                continue
+            if job["status"] == "queued":
+                job["status"] = "running"
+                job["started_at"] = datetime.now().isoformat()
+            job["stage"] = stage
+            job["progress"] = max(job["progress"], fraction)
+
+
+def _finish(job_id, executor, future):
+    """Record a job's outcome; executor is the pool the job was submitted to"""
+    global _executor
+    with _lock:
+        job = _jobs[job_id]
+        _active_by_key.pop(job["key"], None)
+        job["finished_at"] = datetime.now().isoformat()
+        job["finished"] = time.time()
+        try:
+            job["result"] = future.result()
+            job.update({"status": "done", "stage": "done", "progress": 1.0})
+            logger.info(f"Profiling job {job_id} for {job['table']} finished")
+        except BrokenProcessPool as e:
+            # A worker died (e.g. out of memory); start a fresh pool for the next job
+            job.update({"status": "failed", "error": f"Profiling worker crashed: {e}"})
+            # Late callbacks from an older pool must not drop a newer, healthy one
+            if _executor is executor:
+                _executor = None
+                executor.shutdown(wait=False)
+            logger.error(f"Profiling job {job_id} for {job['table']} lost its worker: {e}")
+        except Exception as e:
+            job.update({"status": "failed", "error": str(e)})
+            logger.error(f"Profiling job {job_id} for {job['table']} failed: {e}")
+
+
+def _prune():
+    cutoff = time.time() - PROFILE_JOB_RETENTION_SECONDS
+    expired = [job_id for job_id, job in _jobs.items() if job.get("finished") and job["finished"] < cutoff]
+    for job_id in expired:
+        del _jobs[job_id]
+
+
+def _public(job):
+    return {k: v for k, v in job.items() if k not in ("key", "finished", "options")}
+
+
+def submit(schema, table, mode="auto", options=None, refresh=False):
+    """
+    Queue a profiling job and return (job, created).
+
+    If an identical job is already queued or running, that job is returned
+    with created=False. Returns (None, False) when too many jobs are active.
+    """
+    options = options or {}
+    key = profile_cache.cache_key(table, mode, options)
+    with _lock:
+        _prune()
+        existing = _active_by_key.get(key)
+        if existing:
+            return _public(_jobs[existing]), False
+        if len(_active_by_key) >= PROFILE_JOB_MAX_ACTIVE:
+            return None, False
+
+        job_id = uuid.uuid4().hex
+        job = {
+            "id": job_id,
+            "key": key,
+            "table": table.upper(),
+            "mode": mode,
+            "options": options,
+            "status": "queued",
+            "stage": "queued",
+            "progress": 0.0,
+            "submitted_at": datetime.now().isoformat(),
+            "started_at": None,
+            "finished_at": None,
+            "error": None,
+            "result": None,
+        }
+        executor = _get_executor()
+        future = executor.submit(_run_job, job_id, schema, table, mode, options, refresh)
+        _jobs[job_id] = job
+        _active_by_key[key] = job_id
+
+    future.add_done_callback(lambda f: _finish(job_id, executor, f))
+    logger.info(f"Queued profiling job {job_id} for {table} ({mode})")
+    return _public(job), True
+
+
+def get_job(job_id):
+    """A copy of a job's state, or None if unknown or already pruned"""
+    with _lock:
+        job = _jobs.get(job_id)
+        return _public(job) if job else None
+
+
+def get_result(job_id, fmt="html"):
+    """
+    (content, meta) for a finished job, read back from the profile cache.
+
+    Returns None if the job is unknown or not done yet, or if its report has
+    since been evicted from the cache.
+    """
+    with _lock:
+        job = _jobs.get(job_id)
+        if job is None or job["status"] != "done":
+            return None
+        key = job["key"]
+    return profile_cache.get(key, None, fmt)
+
+
+def list_jobs():
+    with _lock:
+        _prune()
+        return [_public(job) for job in sorted(_jobs.values(), key=lambda job: job["submitted_at"], reverse=True)]
+
+
+def shutdown():
+    global _executor
+    with _lock:
+        if _executor is not None:
+            _executor.shutdown(wait=False, cancel_futures=True)
+            _executor = None
@@ -0,0 +1,106 @@
+"""
+Sample sizing and SAMPLE-clause queries for profiling large tables.
+
+The sample size comes from the usual margin-of-error formula for a
+proportion, n0 = z^2 * p(1-p) / e^2 with the worst case p = 0.5, corrected
+for the finite population, so it stops growing with table size. Sampling is
+pushed down to Oracle with SAMPLE / SAMPLE BLOCK and a SEED so repeated runs
+over unchanged data see the same rows.
+"""
+import os
+import math
+from statistics import NormalDist
+
+import db
+
+
+# --- Sampling Configuration ---
+PROFILE_SAMPLE_TARGET_ERROR = float(os.environ.get('PROFILE_SAMPLE_TARGET_ERROR', '0.01'))
+PROFILE_SAMPLE_CONFIDENCE = float(os.environ.get('PROFILE_SAMPLE_CONFIDENCE', '0.95'))
+PROFILE_SAMPLE_SEED = int(os.environ.get('PROFILE_SAMPLE_SEED', '42'))
+# Cap on the planned sample size pulled into pandas, whatever the requested accuracy
+PROFILE_SAMPLE_MAX_ROWS = int(os.environ.get('PROFILE_SAMPLE_MAX_ROWS', '100000'))
+
+SAMPLE_METHODS = ("row", "block")
+
+# Oracle accepts SAMPLE percentages in [0.000001, 100)
+_MIN_PERCENT = 0.000001
+_MAX_PERCENT = 99.999999
+
+
+def sample_size(population, target_error=PROFILE_SAMPLE_TARGET_ERROR, confidence=PROFILE_SAMPLE_CONFIDENCE):
+    """Rows needed to estimate any proportion within +/- target_error at the given confidence"""
+    z = NormalDist().inv_cdf((1 + confidence) / 2)
+    n0 = z * z * 0.25 / (target_error * target_error)
+    if population:
+        n0 = n0 / (1 + (n0 - 1) / population)
+    return min(int(math.ceil(n0)), PROFILE_SAMPLE_MAX_ROWS)
+
+
+def sample_error(rows, population, confidence=PROFILE_SAMPLE_CONFIDENCE):
+    """Margin of error a sample of rows achieves at the given confidence; the inverse of sample_size()"""
+    if population and rows >= population:
+        return 0.0
+    z = NormalDist().inv_cdf((1 + confidence) / 2)
+    # Undo the finite population correction to get the equivalent infinite-population n0
+    n0 = rows * (population - 1) / (population - rows) if population else rows
+    return z * 0.5 / math.sqrt(n0)
+
+
+def plan_sample(conn, table_name, target_error=PROFILE_SAMPLE_TARGET_ERROR,
+                confidence=PROFILE_SAMPLE_CONFIDENCE, method="row", seed=PROFILE_SAMPLE_SEED):
+    """
+    Build the sampling query for a table and describe the sample it will draw.
+
+    The population comes from dictionary NUM_ROWS. Without statistics there is
+    nothing to size a SAMPLE percentage from, so the query falls back to the
+    first rows and the plan says the sample is not random.
+    """
+    if method not in SAMPLE_METHODS:
+        raise ValueError(f"Invalid sample method '{method}'. Expected one of: {', '.join(SAMPLE_METHODS)}")
+    if not 0 < target_error < 1:
+        raise ValueError("target_error must be between 0 and 1")
+    if not 0 < confidence < 1:
+        raise ValueError("confidence must be between 0 and 1")
+
+    row = db.query_one(
+        "SELECT num_rows FROM user_tables WHERE table_name = :1",
+        [table_name.upper()],
+        conn=conn
+    )
+    population = row[0] if row else None
+    rows = sample_size(population, target_error, confidence)
+
+    plan = {
+        "population_rows": population,
+        "sample_rows_target": rows,
+        "target_error": target_error,
+        # What the planned size achieves; larger than target_error when PROFILE_SAMPLE_MAX_ROWS caps it
+        "error": max(sample_error(rows, population, confidence), target_error),
+        "confidence": confidence,
+        "method": method,
+        "seed": int(seed),
+        "random": True,
+    }
+
+    if not population:
+        plan.update({"fraction": None, "random": False, "method": None})
+        query = f'SELECT * FROM {table_name} FETCH FIRST {rows} ROWS ONLY'
+        return query, plan
+
+    if rows >= population:
+        # The whole table is no bigger than the sample; read it as is
+        plan.update({"fraction": 1.0, "method": None})
+        query = f'SELECT * FROM {table_name} FETCH FIRST {rows} ROWS ONLY'
+        return query, plan
+
+    percent = min(max(rows / population * 100, _MIN_PERCENT), _MAX_PERCENT)
+    plan["fraction"] = rows / population
+
+    # SAMPLE and SEED only take literals, never binds; both values are numbers built here.
+    # No FETCH FIRST: cutting the sample off would drop the rows it reached last in
+    # scan order. The sample comes back near the target size; the caller records
+    # how many rows it actually got.
+    sample_clause = "SAMPLE BLOCK" if method == "block" else "SAMPLE"
+    query = f'SELECT * FROM {table_name} {sample_clause} ({percent:.6f}) SEED ({int(seed)})'
+    return query, plan
@@ -0,0 +1,253 @@
+"""
+Parallel scheduled profiling passes.
+
+A pass profiles every due table on a pool of worker processes. Instead of
+a fixed sleep between tables, the number of tables in flight follows the
+database load: it is halved while active sessions per CPU are above
+PROFILE_LOAD_HIGH, and grows by one again while load stays below
+PROFILE_LOAD_LOW.
+
+Progress is checkpointed to a JSON file after every table. A pass that was
+interrupted (server restart, crash) is resumed from its remaining tables,
+in their original order, the next time a pass starts.
+"""
+import os
+import json
+import time
+import uuid
+import logging
+import tempfile
+import threading
+from datetime import datetime
+from concurrent.futures import wait, FIRST_COMPLETED
+
+import oracledb
+
+import db
+import profile_jobs
+
+logger = logging.getLogger(__name__)
+
+
+# --- Scheduled Profiling Configuration ---
+PROFILE_SCHEDULE_WORKERS = int(os.environ.get('PROFILE_SCHEDULE_WORKERS', '4'))
+# Active sessions per CPU above which fewer tables are profiled at once...
+PROFILE_LOAD_HIGH = float(os.environ.get('PROFILE_LOAD_HIGH', '0.8'))
+# ...and below which more are
+PROFILE_LOAD_LOW = float(os.environ.get('PROFILE_LOAD_LOW', '0.4'))
+# How often the load is re-read while tables are being profiled (seconds)
+PROFILE_THROTTLE_INTERVAL_SECONDS = int(os.environ.get('PROFILE_THROTTLE_INTERVAL_SECONDS', '15'))
+# Longest pause before starting another table while the database stays busy (seconds)
+PROFILE_THROTTLE_MAX_PAUSE_SECONDS = int(os.environ.get('PROFILE_THROTTLE_MAX_PAUSE_SECONDS', '120'))
+PROFILE_SCHEDULE_CHECKPOINT = os.environ.get(
+    'PROFILE_SCHEDULE_CHECKPOINT',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'profile_schedule_checkpoint.json')
+)
+
+_pass_lock = threading.Lock()
+_current = {}
+_last_pass = {}
+
+
+def database_load(conn):
+    """
+    Average active sessions per CPU over the last minute.
+
+    Falls back to the share of busy pool sessions if V$SYSMETRIC / V$OSSTAT
+    are not readable by this user.
+    """
+    try:
+        row = db.query_one("""
+            SELECT m.value / NULLIF(c.value, 0)
+            FROM v$sysmetric m
+            CROSS JOIN v$osstat c
+            WHERE m.metric_name = 'Average Active Sessions'
+            AND m.group_id = 2
+            AND c.stat_name = 'NUM_CPUS'
+        """, conn=conn)
+        if row and row[0] is not None:
+            return float(row[0])
+    except oracledb.DatabaseError as e:
+        logger.debug(f"Could not read database load metrics: {e}")
+
+    stats = db.pool_stats()
+    if stats["busy"] is None or not stats["max"]:
+        return None
+    return stats["busy"] / stats["max"]
+
+
+class AdaptiveThrottle:
+    """Additive-increase / multiplicative-decrease limit on tables in flight"""
+
+    def __init__(self, max_workers):
+        self.max_workers = max_workers
+        self.limit = max_workers
+        self.pause = 0
+        self.load = None
+        self.checked_at = None
+
+    def adjust(self):
+        """Re-read the load at most every PROFILE_THROTTLE_INTERVAL_SECONDS; returns (limit, pause)"""
+        now = time.monotonic()
+        if self.checked_at is not None and now - self.checked_at < PROFILE_THROTTLE_INTERVAL_SECONDS:
+            return self.limit, self.pause
+        self.checked_at = now
+
+        try:
+            with db.connection() as conn:
+                self.load = database_load(conn)
+        except oracledb.Error as e:
+            logger.warning(f"Could not sample database load: {e}")
+            self.load = None
+
+        if self.load is None:
+            return self.limit, self.pause
+        if self.load > PROFILE_LOAD_HIGH:
+            self.limit = max(1, self.limit // 2)
+            self.pause = min(max(self.pause * 2, 5), PROFILE_THROTTLE_MAX_PAUSE_SECONDS)
+        elif self.load < PROFILE_LOAD_LOW:
+            self.limit = min(self.max_workers, self.limit + 1)
+            self.pause = 0
+        else:
+            self.pause = 0
+        return self.limit, self.pause
+
+
+def load_checkpoint():
+    """The last pass's checkpoint, or None if there is none or it is unreadable"""
+    try:
+        with open(PROFILE_SCHEDULE_CHECKPOINT, encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError) as e:
+        logger.warning(f"Ignoring unreadable profiling checkpoint: {e}")
+        return None
+
+
+def _save_checkpoint(checkpoint):
+    directory = os.path.dirname(PROFILE_SCHEDULE_CHECKPOINT)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(checkpoint, f)
+        os.replace(tmp_path, PROFILE_SCHEDULE_CHECKPOINT)
+    except OSError as e:
+        logger.warning(f"Could not write profiling checkpoint: {e}")
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def run_pass(plan_tables, on_result):
+    """
+    Profile due tables in parallel, resuming an interrupted pass if there is one.
+
+    plan_tables() returns [(schema, table), ...] in priority order and is only
+    called when there is nothing to resume. on_result(schema, table, result, error)
+    is called in this thread as each table finishes, with either the report
+    metadata or the error message.
+    """
+    if not _pass_lock.acquire(blocking=False):
+        logger.info("Scheduled profiling pass already running, skipping")
+        return None
+
+    try:
+        checkpoint = load_checkpoint()
+        if checkpoint and checkpoint.get("status") == "running":
+            logger.info(
+                f"Resuming profiling pass {checkpoint['run_id']} with "
+                f"{len(checkpoint['remaining'])} tables left"
+            )
+        else:
+            checkpoint = {
+                "run_id": uuid.uuid4().hex,
+                "status": "running",
+                "started_at": datetime.now().isoformat(),
+                "total": 0,
+                "profiled": 0,
+                "unchanged": 0,
+                "failed": 0,
+                "remaining": [list(table) for table in plan_tables()],
+            }
+            checkpoint["total"] = len(checkpoint["remaining"])
+            logger.info(f"Starting profiling pass {checkpoint['run_id']} over {checkpoint['total']} tables")
+        checkpoint["resumed_at"] = datetime.now().isoformat()
+        _save_checkpoint(checkpoint)
+
+        _current.clear()
+        _current.update(checkpoint)
+
+        queue = list(checkpoint["remaining"])
+        running = {}
+        throttle = AdaptiveThrottle(PROFILE_SCHEDULE_WORKERS)
+        executor = profile_jobs.process_pool(PROFILE_SCHEDULE_WORKERS)
+        try:
+            while queue or running:
+                limit, pause = throttle.adjust()
+                if queue and pause and not running:
+                    # Nothing in flight and the database is still busy; back off before starting more
+                    logger.info(f"Database load {throttle.load:.2f}, pausing profiling for {pause}s")
+                    time.sleep(pause)
+                    throttle.checked_at = None
+                    continue
+
+                while queue and len(running) < limit:
+                    schema, table = queue.pop(0)
+                    future = executor.submit(profile_jobs.refresh_profile, schema, table)
+                    running[future] = (schema, table)
+
+                done, _ = wait(running, timeout=PROFILE_THROTTLE_INTERVAL_SECONDS, return_when=FIRST_COMPLETED)
+                for future in done:
+                    schema, table = running.pop(future)
+                    try:
+                        result, error = future.result(), None
+                        checkpoint["unchanged" if result.get("cache") == "hit" else "profiled"] += 1
+                    except Exception as e:
+                        result, error = None, str(e)
+                        checkpoint["failed"] += 1
+                        logger.error(f"Failed to profile {schema}.{table}: {e}")
+                    on_result(schema, table, result, error)
+
+                    checkpoint["remaining"] = [list(item) for item in running.values()] + queue
+                    checkpoint["limit"] = limit
+                    checkpoint["load"] = throttle.load
+                    _save_checkpoint(checkpoint)
+                    _current.update(checkpoint)
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+        checkpoint.update({"status": "finished", "finished_at": datetime.now().isoformat(), "remaining": []})
+        _save_checkpoint(checkpoint)
+        _last_pass.clear()
+        _last_pass.update(checkpoint)
+        logger.info(
+            f"Profiling pass {checkpoint['run_id']} finished: {checkpoint['profiled']} profiled, "
+            f"{checkpoint['unchanged']} unchanged, {checkpoint['failed']} failed"
+        )
+        return dict(checkpoint)
+
+    except Exception as e:
+        # The checkpoint still says "running", so the next pass picks up from here
+        logger.error(f"Scheduled profiling pass failed: {e}")
+        return None
+    finally:
+        _current.clear()
+        _pass_lock.release()
+
+
+def status():
+    running = _pass_lock.locked()
+    current = dict(_current) if running else None
+    if current:
+        current["remaining"] = len(current["remaining"])
+    last = dict(_last_pass) or load_checkpoint()
+    if last:
+        last = dict(last, remaining=len(last.get("remaining", [])))
+    return {
+        "workers": PROFILE_SCHEDULE_WORKERS,
+        "load_high": PROFILE_LOAD_HIGH,
+        "load_low": PROFILE_LOAD_LOW,
+        "running": running,
+        "current": current,
+        "last_pass": last,
+    }
@@ -0,0 +1,335 @@
+"""
+Inferred relationships for schemas without declared foreign keys.
+
+Suggestions for a logical database are built in two steps:
+
+1. Name and type matching. Every single-column primary or unique key K of a
+   table T is registered in a hash map under the names a referencing column
+   would typically carry: K itself (unless it is a generic name like ID),
+   T_K / TK and the same with T singularized. Each other column of a
+   compatible type family is then looked up by name, so candidate generation
+   is linear in the number of columns rather than pairwise.
+
+2. Value containment. Each candidate is checked on sampled data: the key
+   column's values go into a Bloom filter and a sample of the referencing
+   column is probed against it. The share of sampled values found estimates
+   how much of the column is contained in the key. Sketches are computed once
+   per column and kept in an LRU cache for INFER_SKETCH_TTL_SECONDS, or until
+   the table's DDL or statistics change, so each column is read at most once
+   per run however many candidates it takes part in.
+
+Column names, types and keys come from the schema snapshot. Declared FKs and
+edges already in the given ER entity are left out. Suggestions are returned
+best first in the bulk import row format, so the ER screens can post the
+accepted ones to /api/er_relationships/bulk.
+"""
+import os
+import math
+import time
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+
+import db
+import er_import
+import schema_snapshot
+
+logger = logging.getLogger(__name__)
+
+
+# --- Relationship Inference Configuration ---
+# Sampled values of a referencing column probed against the key's filter
+INFER_SAMPLE_VALUES = int(os.environ.get('INFER_SAMPLE_VALUES', '1000'))
+# Key values read into a column's Bloom filter
+INFER_KEY_VALUES = int(os.environ.get('INFER_KEY_VALUES', '50000'))
+INFER_BLOOM_FALSE_POSITIVE = float(os.environ.get('INFER_BLOOM_FALSE_POSITIVE', '0.01'))
+INFER_MIN_CONTAINMENT = float(os.environ.get('INFER_MIN_CONTAINMENT', '0.9'))
+# Candidates verified per run, best name matches first
+INFER_MAX_CANDIDATES = int(os.environ.get('INFER_MAX_CANDIDATES', '500'))
+INFER_SKETCH_TTL_SECONDS = int(os.environ.get('INFER_SKETCH_TTL_SECONDS', '3600'))
+INFER_SKETCH_CACHE_SIZE = int(os.environ.get('INFER_SKETCH_CACHE_SIZE', '2000'))
+
+INFERRED_RELATIONSHIP_TYPE = "inferred"
+
+# Key names too common to match on their own
+_GENERIC_NAMES = {"ID", "CODE", "KEY", "NO", "NUM", "NAME", "TYPE", "STATUS", "SEQ"}
+
+_TYPE_FAMILIES = {
+    "NUMBER": "number", "FLOAT": "number", "BINARY_FLOAT": "number", "BINARY_DOUBLE": "number",
+    "VARCHAR2": "string", "NVARCHAR2": "string", "CHAR": "string", "NCHAR": "string",
+    "DATE": "date", "RAW": "raw",
+}
+
+# Name match -> weight in the score
+_NAME_WEIGHTS = {"same_name": 1.0, "table_prefixed": 0.9}
+
+
+def type_family(data_type):
+    """Comparable group of an Oracle data type, or None for types not worth matching (LOBs, ...)"""
+    if data_type.startswith("TIMESTAMP"):
+        return "date"
+    return _TYPE_FAMILIES.get(data_type)
+
+
+class BloomFilter:
+    """Fixed-size Bloom filter over bytes values, k probes by double hashing one blake2b digest"""
+
+    def __init__(self, capacity, false_positive=INFER_BLOOM_FALSE_POSITIVE):
+        capacity = max(capacity, 1)
+        self.size = max(8, int(-capacity * math.log(false_positive) / math.log(2) ** 2))
+        self.probes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, value):
+        digest = hashlib.blake2b(value, digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return ((h1 + i * h2) % self.size for i in range(self.probes))
+
+    def add(self, value):
+        for position in self._positions(value):
+            self.bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, value):
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(value))
+
+
+def _canonical(value):
+    """Bytes form of a value that compares equal across NUMBER/CHAR representations"""
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    elif isinstance(value, str):
+        value = value.rstrip()
+    return str(value).encode("utf-8")
+
+
+_lock = threading.Lock()
+# (TABLE, COLUMN, kind) -> (stamp, created, sketch), least recently used first
+_sketches = OrderedDict()
+_stats = {"hits": 0, "misses": 0}
+
+
+def _stamp(entry):
+    return entry["last_ddl_time"], entry["last_analyzed"]
+
+
+def _cached(key, stamp):
+    with _lock:
+        cached = _sketches.get(key)
+        if cached is not None and cached[0] == stamp and time.time() - cached[1] < INFER_SKETCH_TTL_SECONDS:
+            _sketches.move_to_end(key)
+            _stats["hits"] += 1
+            return cached[2]
+        _stats["misses"] += 1
+    return None
+
+
+def _store(key, stamp, sketch):
+    with _lock:
+        _sketches[key] = (stamp, time.time(), sketch)
+        _sketches.move_to_end(key)
+        while len(_sketches) > INFER_SKETCH_CACHE_SIZE:
+            _sketches.popitem(last=False)
+
+
+def _key_sketch(conn, table_name, column_name, entry):
+    """(Bloom filter of the key's values, share of the key's rows it covers)"""
+    key = (table_name, column_name, "key")
+    sketch = _cached(key, _stamp(entry))
+    if sketch is None:
+        # Names come from the dictionary snapshot, so quoting them is safe
+        rows = db.query_all(
+            f'SELECT "{column_name}" FROM "{table_name}" WHERE "{column_name}" IS NOT NULL '
+            f'FETCH FIRST :1 ROWS ONLY',
+            [INFER_KEY_VALUES], conn=conn
+        )
+        bloom = BloomFilter(len(rows))
+        for (value,) in rows:
+            bloom.add(_canonical(value))
+        num_rows = entry["num_rows"]
+        coverage = 1.0 if len(rows) < INFER_KEY_VALUES or not num_rows else min(1.0, len(rows) / num_rows)
+        sketch = (bloom, coverage)
+        _store(key, _stamp(entry), sketch)
+    return sketch
+
+
+def _value_sample(conn, table_name, column_name, entry):
+    """Distinct non-null values from a sample of the column"""
+    key = (table_name, column_name, "sample")
+    sample = _cached(key, _stamp(entry))
+    if sample is None:
+        num_rows = entry["num_rows"] or 0
+        clause = ""
+        if num_rows > INFER_SAMPLE_VALUES:
+            # Spread the sample over the table instead of reading its first blocks
+            percent = max(0.001, min(99.0, 100.0 * INFER_SAMPLE_VALUES * 2 / num_rows))
+            clause = f" SAMPLE ({percent:.3f})"
+        rows = db.query_all(
+            f'SELECT "{column_name}" FROM "{table_name}"{clause} WHERE "{column_name}" IS NOT NULL '
+            f'FETCH FIRST :1 ROWS ONLY',
+            [INFER_SAMPLE_VALUES], conn=conn
+        )
+        sample = frozenset(_canonical(value) for (value,) in rows)
+        _store(key, _stamp(entry), sample)
+    return sample
+
+
+def containment(conn, from_table, from_column, from_entry, to_table, to_column, to_entry):
+    """Estimated share of from_column's values that occur in to_column, or None if it has no values"""
+    sample = _value_sample(conn, from_table, from_column, from_entry)
+    if not sample:
+        return None
+    bloom, coverage = _key_sketch(conn, to_table, to_column, to_entry)
+    found = sum(1 for value in sample if value in bloom)
+    return min(1.0, found / len(sample) / coverage)
+
+
+def _singular(name):
+    if name.endswith("IES"):
+        return name[:-3] + "Y"
+    if name.endswith("S") and not name.endswith("SS"):
+        return name[:-1]
+    return name
+
+
+def _unique_keys(entry):
+    """Column names of the table's single-column primary and unique keys"""
+    keys = {}
+    for constraint in entry["constraints"]:
+        if constraint["type"] in ("P", "U"):
+            keys.setdefault(constraint["name"], []).append(constraint["column"])
+    return {columns[0] for columns in keys.values() if len(columns) == 1}
+
+
+def _key_aliases(table_name, key_column):
+    """(referencing column name, match kind) pairs a key is likely to be referenced by"""
+    aliases = {}
+    for prefix in {table_name, _singular(table_name)}:
+        aliases[f"{prefix}_{key_column}"] = "table_prefixed"
+        aliases[f"{prefix}{key_column}"] = "table_prefixed"
+    if key_column not in _GENERIC_NAMES:
+        aliases[key_column] = "same_name"
+    return aliases
+
+
+def candidates(tables, snapshot):
+    """
+    Name- and type-matched (from, to, match) candidates over tables
+    (TABLE_NAME -> tables_metadata id) in one pass over their columns.
+    """
+    by_name = {}
+    for table_name in tables:
+        entry = snapshot.get(table_name)
+        if entry is None:
+            continue
+        types = {column["name"]: type_family(column["data_type"]) for column in entry["columns"]}
+        for key_column in _unique_keys(entry):
+            family = types.get(key_column)
+            if family is None:
+                continue
+            for alias, match in _key_aliases(table_name, key_column).items():
+                by_name.setdefault((alias, family), []).append((table_name, key_column, match))
+
+    declared = set()
+    for table_name in tables:
+        entry = snapshot.get(table_name)
+        for constraint in entry["constraints"] if entry else ():
+            if constraint["type"] == "R":
+                declared.add((table_name, constraint["column"], constraint["references_table"]))
+
+    found = []
+    for table_name in tables:
+        entry = snapshot.get(table_name)
+        if entry is None:
+            continue
+        keys = _unique_keys(entry)
+        for column in entry["columns"]:
+            family = type_family(column["data_type"])
+            if family is None:
+                continue
+            for to_table, to_column, match in by_name.get((column["name"], family), ()):
+                if to_table == table_name and to_column == column["name"]:
+                    continue
+                if (table_name, column["name"], to_table) in declared:
+                    continue
+                found.append({
+                    "from_table": table_name,
+                    "from_column": column["name"],
+                    "to_table": to_table,
+                    "to_column": to_column,
+                    "match": match,
+                    "one_to_one": column["name"] in keys,
+                })
+    return found
+
+
+def suggest(conn, database_name, er_entity_id=None, verify=True, limit=None):
+    """
+    Ranked relationship suggestions for a logical database's tables, or None
+    if the database does not exist.
+
+    Each suggestion carries the bulk import fields plus table names, the name
+    match, the estimated containment and a score in [0, 1].
+    """
+    database = db.query_one(
+        "SELECT id FROM logical_databases WHERE UPPER(name) = UPPER(:1)", [database_name], conn=conn
+    )
+    if database is None:
+        return None
+    tables = {}
+    for table_id, name in db.query_all(
+        "SELECT id, name FROM tables_metadata WHERE database_id = :1", [database[0]], conn=conn
+    ):
+        tables.setdefault(name.upper(), table_id)
+
+    snapshot = schema_snapshot.tables(conn)
+    found = candidates(tables, snapshot)
+    known = er_import.existing_edges(conn, er_entity_id) if er_entity_id is not None else {}
+    found = [
+        c for c in found
+        if (tables[c["from_table"]], c["from_column"], tables[c["to_table"]], c["to_column"]) not in known
+    ]
+    found.sort(key=lambda c: -_NAME_WEIGHTS[c["match"]])
+    found = found[:INFER_MAX_CANDIDATES]
+
+    suggestions = []
+    for c in found:
+        ratio = None
+        if verify:
+            ratio = containment(
+                conn, c["from_table"], c["from_column"], snapshot[c["from_table"]],
+                c["to_table"], c["to_column"], snapshot[c["to_table"]]
+            )
+            if ratio is None or ratio < INFER_MIN_CONTAINMENT:
+                continue
+        score = _NAME_WEIGHTS[c["match"]] * (ratio if ratio is not None else 0.5)
+        suggestions.append({
+            "from_table_id": tables[c["from_table"]],
+            "from_table_name": c["from_table"],
+            "from_column": c["from_column"],
+            "to_table_id": tables[c["to_table"]],
+            "to_table_name": c["to_table"],
+            "to_column": c["to_column"],
+            "cardinality": "one-to-one" if c["one_to_one"] else "many-to-one",
+            "relationship_type": INFERRED_RELATIONSHIP_TYPE,
+            "match": c["match"],
+            "containment": round(ratio, 4) if ratio is not None else None,
+            "score": round(score, 4),
+        })
+    suggestions.sort(key=lambda s: (-s["score"], s["from_table_name"], s["from_column"]))
+    logger.info(
+        f"Inferred {len(suggestions)} relationships for {database_name} "
+        f"from {len(found)} name-matched candidates"
+    )
+    return suggestions[:limit] if limit else suggestions
+
+
+def status():
+    with _lock:
+        return {
+            "sketches": len(_sketches),
+            "max_sketches": INFER_SKETCH_CACHE_SIZE,
+            "ttl_seconds": INFER_SKETCH_TTL_SECONDS,
+            **_stats,
+        }
@@ -0,0 +1,508 @@
+"""
+Local snapshot of the data dictionary for this schema's tables.
+
+A refresh reads USER_OBJECTS once to find tables whose LAST_DDL_TIME moved
+(or that are new, dropped, or were marked stale), then harvests them with one
+bulk query per dictionary area:
+
+- USER_TABLES (+ statistics and table comments) and USER_SEGMENTS, for every
+  table on every refresh, since row counts, statistics and sizes change
+  without DDL
+- USER_TAB_COLUMNS (+ column comments), USER_CONSTRAINTS / USER_CONS_COLUMNS,
+  USER_INDEXES / USER_IND_COLUMNS and USER_TRIGGERS, only for the tables that
+  changed
+
+The first refresh, or one where more than a quarter of the tables changed,
+harvests every table without IN lists. The snapshot is kept in memory and
+written to SCHEMA_SNAPSHOT_PATH as gzipped JSON, so a restart picks up
+incrementally from where the last refresh left off. Entries are plain dicts
+that are replaced, never modified, so readers need no lock.
+"""
+import os
+import gzip
+import json
+import time
+import logging
+import tempfile
+import threading
+from datetime import datetime
+
+import db
+
+logger = logging.getLogger(__name__)
+
+
+# --- Schema Snapshot Configuration ---
+SCHEMA_SNAPSHOT_REFRESH_MINUTES = int(os.environ.get('SCHEMA_SNAPSHOT_REFRESH_MINUTES', '10'))
+# Tables per IN list when harvesting changed tables (Oracle caps IN lists at 1000)
+SCHEMA_SNAPSHOT_BATCH = int(os.environ.get('SCHEMA_SNAPSHOT_BATCH', '500'))
+# How long table() remembers that a name does not exist before looking it up again
+SCHEMA_SNAPSHOT_MISSING_SECONDS = int(os.environ.get('SCHEMA_SNAPSHOT_MISSING_SECONDS', '60'))
+SCHEMA_SNAPSHOT_PATH = os.environ.get(
+    'SCHEMA_SNAPSHOT_PATH',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'schema_snapshot.json.gz')
+)
+
+_TIME_FORMAT = "YYYY-MM-DD HH24:MI:SS"
+
+_OBJECTS_SQL = f"""
+    SELECT object_name, TO_CHAR(last_ddl_time, '{_TIME_FORMAT}'), status,
+           TO_CHAR(created, '{_TIME_FORMAT}'), timestamp
+    FROM user_objects
+    WHERE object_type = 'TABLE'
+    AND object_name NOT LIKE 'BIN$%'
+    {{where}}
+"""
+
+# part -> (query, column the IN list filters on); every query returns the table name first
+_QUERIES = {
+    "tables": (f"""
+        SELECT t.table_name, t.num_rows, t.tablespace_name, t.blocks, t.empty_blocks,
+               TO_CHAR(t.last_analyzed, '{_TIME_FORMAT}'), ts.stale_stats, tc.comments
+        FROM user_tables t
+        LEFT JOIN user_tab_statistics ts
+            ON ts.table_name = t.table_name AND ts.object_type = 'TABLE'
+        LEFT JOIN user_tab_comments tc ON tc.table_name = t.table_name
+        WHERE t.dropped = 'NO'
+        {{where}}
+    """, "t.table_name"),
+    "segments": ("""
+        SELECT segment_name, SUM(bytes), SUM(blocks), MAX(initial_extent), MAX(next_extent)
+        FROM user_segments
+        WHERE segment_type IN ('TABLE', 'TABLE PARTITION', 'TABLE SUBPARTITION')
+        {where}
+        GROUP BY segment_name
+    """, "segment_name"),
+    "columns": ("""
+        SELECT c.table_name, c.column_name, c.data_type, c.data_length, c.data_precision,
+               c.data_scale, c.nullable, c.column_id, c.data_default, c.char_length,
+               c.char_used, c.virtual_column, cm.comments
+        FROM user_tab_columns c
+        LEFT JOIN user_col_comments cm
+            ON cm.table_name = c.table_name AND cm.column_name = c.column_name
+        WHERE 1 = 1
+        {where}
+        ORDER BY c.table_name, c.column_id
+    """, "c.table_name"),
+    # SEARCH_CONDITION is LONG; SEARCH_CONDITION_VC carries the same text as VARCHAR2
+    "constraints": ("""
+        SELECT c.table_name, c.constraint_name, c.constraint_type, c.status, c.validated,
+               c.search_condition_vc, cc.column_name, cc.position,
+               c.r_constraint_name, r.table_name, c.delete_rule
+        FROM user_constraints c
+        LEFT JOIN user_cons_columns cc
+            ON cc.constraint_name = c.constraint_name AND cc.table_name = c.table_name
+        LEFT JOIN user_constraints r ON r.constraint_name = c.r_constraint_name
+        WHERE c.table_name NOT LIKE 'BIN$%'
+        {where}
+        ORDER BY c.table_name, c.constraint_name, cc.position
+    """, "c.table_name"),
+    "indexes": ("""
+        SELECT i.table_name, i.index_name, i.index_type, i.status, i.uniqueness,
+               i.compression, ic.column_name, ic.column_position, ic.descend
+        FROM user_indexes i
+        LEFT JOIN user_ind_columns ic ON ic.index_name = i.index_name
+        WHERE i.table_name NOT LIKE 'BIN$%'
+        {where}
+        ORDER BY i.table_name, i.index_name, ic.column_position
+    """, "i.table_name"),
+    "triggers": ("""
+        SELECT table_name, trigger_name, trigger_type, triggering_event, status, description
+        FROM user_triggers
+        WHERE base_object_type = 'TABLE'
+        {where}
+        ORDER BY table_name, trigger_name
+    """, "table_name"),
+}
+# Parts that change without DDL and are re-read for every table on every refresh
+_VOLATILE_PARTS = ("tables", "segments")
+_STRUCTURE_PARTS = ("columns", "constraints", "indexes", "triggers")
+
+_lock = threading.Lock()
+_refresh_lock = threading.Lock()
+_load_lock = threading.Lock()
+_loaded = False
+# TABLE_NAME -> entry dict
+_tables = {}
+_stale = set()
+# TABLE_NAME -> monotonic time table() last found it missing
+_missing = {}
+_version = 0
+_harvested_at = None
+_last_refresh = {}
+
+
+def _empty_entry(object_row):
+    _, last_ddl_time, status, created, timestamp = object_row
+    return {
+        "last_ddl_time": last_ddl_time,
+        "status": status,
+        "created": created,
+        "timestamp": timestamp,
+        "columns": [],
+        "constraints": [],
+        "indexes": [],
+        "triggers": [],
+    }
+
+
+def _volatile_defaults():
+    return {
+        "num_rows": None,
+        "tablespace": None,
+        "blocks": None,
+        "empty_blocks": None,
+        "last_analyzed": None,
+        "stats_stale": None,
+        "comment": None,
+        "segment": None,
+    }
+
+
+def _collect(part, entry, row):
+    if part == "tables":
+        entry.update({
+            "num_rows": row[1],
+            "tablespace": row[2],
+            "blocks": row[3],
+            "empty_blocks": row[4],
+            "last_analyzed": row[5],
+            "stats_stale": row[6] == "YES" if row[6] else None,
+            "comment": row[7],
+        })
+    elif part == "segments":
+        entry["segment"] = {"bytes": row[1], "blocks": row[2], "initial_extent": row[3], "next_extent": row[4]}
+    elif part == "columns":
+        entry["columns"].append({
+            "name": row[1],
+            "data_type": row[2],
+            "length": row[3],
+            "precision": row[4],
+            "scale": row[5],
+            "nullable": row[6],
+            "position": row[7],
+            "default": row[8].strip() if row[8] else None,
+            "char_length": row[9],
+            "char_used": row[10],
+            "virtual_column": row[11],
+            "comment": row[12],
+        })
+    elif part == "constraints":
+        entry["constraints"].append({
+            "name": row[1],
+            "type": row[2],
+            "status": row[3],
+            "validated": row[4],
+            "condition": row[5],
+            "column": row[6],
+            "position": row[7],
+            "references": row[8],
+            "references_table": row[9],
+            "delete_rule": row[10],
+        })
+    elif part == "indexes":
+        indexes = entry["indexes"]
+        if not indexes or indexes[-1]["index_name"] != row[1]:
+            indexes.append({
+                "index_name": row[1],
+                "type": row[2],
+                "status": row[3],
+                "uniqueness": row[4],
+                "compression": row[5],
+                "columns": [],
+            })
+        if row[6] is not None:
+            indexes[-1]["columns"].append({"column_name": row[6], "position": row[7], "descend": row[8]})
+    else:
+        entry["triggers"].append({
+            "trigger_name": row[1],
+            "trigger_type": row[2],
+            "event": row[3],
+            "status": row[4],
+            "description": row[5],
+        })
+
+
+def _batches(table_names):
+    """(where clause template, binds) pairs; a single unfiltered pass when table_names is None"""
+    if table_names is None:
+        return [("", None)]
+    batches = []
+    for start in range(0, len(table_names), SCHEMA_SNAPSHOT_BATCH):
+        batch = table_names[start:start + SCHEMA_SNAPSHOT_BATCH]
+        batches.append((f"AND {{column}} IN ({', '.join(f':{i + 1}' for i in range(len(batch)))})", batch))
+    return batches
+
+
+def _harvest(conn, parts, entries, table_names=None):
+    """Run the bulk query for each part over table_names (None = all) and fold rows into entries"""
+    with db.cursor(conn, db.FETCH_BULK) as cursor:
+        for part in parts:
+            sql, column = _QUERIES[part]
+            for where, binds in _batches(table_names):
+                cursor.execute(sql.format(where=where.format(column=column)), binds or [])
+                for row in cursor:
+                    entry = entries.get(row[0])
+                    if entry is not None:
+                        _collect(part, entry, row)
+
+
+def _read_objects(conn, table_names=None):
+    objects = {}
+    with db.cursor(conn, db.FETCH_BULK) as cursor:
+        for where, binds in _batches(table_names):
+            cursor.execute(_OBJECTS_SQL.format(where=where.format(column="object_name")), binds or [])
+            for row in cursor:
+                objects[row[0]] = row
+    return objects
+
+
+def _load():
+    """Read the snapshot written by the last refresh, once per process"""
+    global _loaded
+    if _loaded:
+        return
+    with _load_lock:
+        if not _loaded:
+            _read_stored()
+            _loaded = True
+
+
+def _read_stored():
+    global _tables, _harvested_at
+    try:
+        with gzip.open(SCHEMA_SNAPSHOT_PATH, "rt", encoding="utf-8") as f:
+            stored = json.load(f)
+        _tables = stored["tables"]
+        _harvested_at = stored.get("harvested_at")
+        logger.info(f"Loaded schema snapshot of {len(_tables)} tables from {_harvested_at}")
+    except FileNotFoundError:
+        pass
+    except (OSError, ValueError, KeyError) as e:
+        logger.warning(f"Ignoring unreadable schema snapshot: {e}")
+
+
+def _save():
+    directory = os.path.dirname(SCHEMA_SNAPSHOT_PATH)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as raw, gzip.open(raw, "wt", encoding="utf-8") as f:
+            json.dump({"harvested_at": _harvested_at, "tables": _tables}, f, separators=(",", ":"))
+        os.replace(tmp_path, SCHEMA_SNAPSHOT_PATH)
+    except OSError as e:
+        logger.warning(f"Could not write schema snapshot: {e}")
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def _apply(updates, volatile, removed):
+    """Swap in a new table map with updated entries (caller holds _refresh_lock)"""
+    global _tables, _version
+    with _lock:
+        tables = dict(_tables)
+        for table_name, fields in volatile.items():
+            if table_name in tables and table_name not in updates:
+                tables[table_name] = dict(tables[table_name], **fields)
+        tables.update(updates)
+        for table_name in removed:
+            tables.pop(table_name, None)
+        _tables = tables
+        if updates or removed:
+            _version += 1
+
+
+def _refresh_once(conn):
+    start = time.monotonic()
+    _load()
+
+    # Taken off before reading, as in _harvest_tables, and put back if the refresh fails
+    with _lock:
+        stale = set(_stale)
+        _stale.clear()
+    try:
+        return _refresh_tables(conn, start, stale)
+    except Exception:
+        with _lock:
+            _stale.update(stale)
+        raise
+
+
+def _refresh_tables(conn, start, stale):
+    global _harvested_at
+    objects = _read_objects(conn)
+    changed = [
+        table_name for table_name, row in objects.items()
+        if table_name not in _tables or _tables[table_name]["last_ddl_time"] != row[1] or table_name in stale
+    ]
+    dropped = [table_name for table_name in _tables if table_name not in objects]
+    full = not _tables or len(changed) > len(objects) // 4
+
+    updates = {table_name: _empty_entry(objects[table_name]) for table_name in changed}
+    for entry in updates.values():
+        entry.update(_volatile_defaults())
+    volatile = {table_name: _volatile_defaults() for table_name in objects if table_name not in updates}
+
+    _harvest(conn, _VOLATILE_PARTS, {**volatile, **updates})
+    if full:
+        _harvest(conn, _STRUCTURE_PARTS, updates)
+    elif changed:
+        _harvest(conn, _STRUCTURE_PARTS, updates, changed)
+
+    _apply(updates, volatile, dropped)
+    _harvested_at = datetime.now().isoformat()
+    _save()
+
+    summary = {
+        "finished_at": _harvested_at,
+        "seconds": round(time.monotonic() - start, 3),
+        "full": full,
+        "tables": len(_tables),
+        "reharvested": len(changed),
+        "dropped": len(dropped),
+    }
+    logger.info(
+        f"Schema snapshot refreshed in {summary['seconds']}s: {len(changed)} of {len(objects)} tables "
+        f"re-harvested, {len(dropped)} dropped"
+    )
+    return summary
+
+
+def refresh(conn=None):
+    """Bring the snapshot up to date; returns a summary, or None if a refresh is already running"""
+    if not _refresh_lock.acquire(blocking=False):
+        return None
+    try:
+        if conn is None:
+            with db.connection() as conn:
+                summary = _refresh_once(conn)
+        else:
+            summary = _refresh_once(conn)
+        _last_refresh.clear()
+        _last_refresh.update(summary)
+        return summary
+    finally:
+        _refresh_lock.release()
+
+
+def _refresh_quietly():
+    try:
+        refresh()
+    except Exception as e:
+        logger.error(f"Schema snapshot refresh failed: {e}")
+
+
+def trigger():
+    """Start a refresh in the background; returns False if one is already running"""
+    if _refresh_lock.locked():
+        return False
+    threading.Thread(target=_refresh_quietly, name="schema-snapshot-refresh", daemon=True).start()
+    return True
+
+
+def _harvest_tables(conn, table_names):
+    """Re-harvest a few tables right away, outside the periodic refresh"""
+    # Serialized with refresh() so neither swaps in a map built from older reads
+    with _refresh_lock:
+        # Clear the marks before reading, so a mark_stale() that lands mid-harvest survives it
+        with _lock:
+            _stale.difference_update(table_names)
+        try:
+            objects = _read_objects(conn, table_names)
+            updates = {table_name: _empty_entry(row) for table_name, row in objects.items()}
+            for entry in updates.values():
+                entry.update(_volatile_defaults())
+            if updates:
+                _harvest(conn, _VOLATILE_PARTS + _STRUCTURE_PARTS, updates, list(updates))
+            removed = [table_name for table_name in table_names if table_name not in objects and table_name in _tables]
+            _apply(updates, {}, removed)
+        except Exception:
+            with _lock:
+                _stale.update(table_names)
+            raise
+
+
+def tables(conn=None):
+    """The whole snapshot as TABLE_NAME -> entry; harvested first if there is none yet"""
+    _load()
+    if not _tables:
+        with _refresh_lock:
+            if not _tables:
+                if conn is None:
+                    with db.connection() as conn:
+                        _refresh_once(conn)
+                else:
+                    _refresh_once(conn)
+    return _tables
+
+
+def table(table_name, conn=None):
+    """
+    One table's entry, harvesting just that table if it is marked stale or
+    missing; None if it does not exist. A name found missing is not looked
+    up again for SCHEMA_SNAPSHOT_MISSING_SECONDS unless it is marked stale.
+    """
+    table_name_upper = table_name.upper()
+    _load()
+    entry = _tables.get(table_name_upper)
+    if table_name_upper not in _stale:
+        if entry is not None:
+            return entry
+        # Unknown names would otherwise hit the dictionary, and wait for any refresh, every time
+        with _lock:
+            missed = _missing.get(table_name_upper)
+        if missed is not None and time.monotonic() - missed < SCHEMA_SNAPSHOT_MISSING_SECONDS:
+            return None
+
+    if conn is None:
+        with db.connection() as conn:
+            _harvest_tables(conn, [table_name_upper])
+    else:
+        _harvest_tables(conn, [table_name_upper])
+    entry = _tables.get(table_name_upper)
+    now = time.monotonic()
+    with _lock:
+        for name in [name for name, missed in _missing.items() if now - missed >= SCHEMA_SNAPSHOT_MISSING_SECONDS]:
+            del _missing[name]
+        if entry is None:
+            _missing[table_name_upper] = now
+        else:
+            _missing.pop(table_name_upper, None)
+    return entry
+
+
+def mark_stale(table_name):
+    """Have the next read of table_name re-harvest it, e.g. after DDL or a stats gather"""
+    with _lock:
+        _stale.add(table_name.upper())
+
+
+def version():
+    """Bumped whenever any table's structure entry is replaced or removed"""
+    return _version
+
+
+def status():
+    return {
+        "refresh_minutes": SCHEMA_SNAPSHOT_REFRESH_MINUTES,
+        "path": SCHEMA_SNAPSHOT_PATH,
+        "tables": len(_tables),
+        "stale": len(_stale),
+        "missing": len(_missing),
+        "version": _version,
+        "harvested_at": _harvested_at,
+        "running": _refresh_lock.locked(),
+        "last_refresh": dict(_last_refresh) or None,
+    }
+
+
+def schedule(scheduler):
+    """Register the periodic incremental refresh on an APScheduler scheduler"""
+    scheduler.add_job(
+        func=_refresh_quietly,
+        trigger='interval',
+        minutes=SCHEMA_SNAPSHOT_REFRESH_MINUTES,
+        id='schema_snapshot_refresh',
+        max_instances=1,
+        coalesce=True,
+        replace_existing=True
+    )
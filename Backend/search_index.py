@@ -0,0 +1,267 @@
+"""
+In-process search index over catalog names and column names.
+
+Every LOB, subject area, logical database and table becomes a document
+carrying its lineage (lob / subject / database); table columns live in the
+separate column_index and are merged into results when asked for. Names are
+indexed two ways:
+
+- trigram postings answer substring queries of three or more characters by
+  intersecting the postings of the query's trigrams and then checking the
+  few candidates left
+- a sorted list of name tokens (split on '_', spaces, etc.) answers one- and
+  two-character queries by prefix with a binary search
+
+Results are ranked exact match, then prefix, then word prefix, then
+substring, with ties broken by entity type and name length. The write
+endpoints call refresh_entity() for what they changed, so the index stays
+current without a full rebuild; a full rebuild still happens every
+SEARCH_INDEX_REBUILD_SECONDS in the background to pick up changes made
+outside this process.
+"""
+import os
+import re
+import time
+import heapq
+import bisect
+import logging
+import threading
+from operator import itemgetter
+
+import db
+import column_index
+
+logger = logging.getLogger(__name__)
+
+
+# --- Search Index Configuration ---
+SEARCH_INDEX_REBUILD_SECONDS = int(os.environ.get('SEARCH_INDEX_REBUILD_SECONDS', '900'))
+SEARCH_DEFAULT_LIMIT = int(os.environ.get('SEARCH_DEFAULT_LIMIT', '50'))
+SEARCH_MAX_LIMIT = int(os.environ.get('SEARCH_MAX_LIMIT', '500'))
+
+TYPE_ORDER = ("LOB", "Subject Area", "Database", "Table", "Column")
+ENTITY_TYPES = TYPE_ORDER[:4]
+
+# Each query returns (id, name, lob, subject, database) for one entity type
+_LINEAGE_JOINS = """
+    JOIN logical_databases d ON t.database_id = d.id
+    JOIN subject_area_logical_database sald ON d.id = sald.logical_database_id
+    JOIN subject_areas s ON sald.subject_area_id = s.id
+    JOIN lobs l ON s.lob_id = l.id
+"""
+_ENTITY_SQL = {
+    "LOB": ("""
+        SELECT l.id, l.name, NULL, NULL, NULL
+        FROM lobs l
+    """, "l.id"),
+    "Subject Area": ("""
+        SELECT s.id, s.name, l.name, NULL, NULL
+        FROM subject_areas s
+        JOIN lobs l ON s.lob_id = l.id
+    """, "s.id"),
+    "Database": ("""
+        SELECT d.id, d.name, l.name, s.name, NULL
+        FROM logical_databases d
+        JOIN subject_area_logical_database sald ON d.id = sald.logical_database_id
+        JOIN subject_areas s ON sald.subject_area_id = s.id
+        JOIN lobs l ON s.lob_id = l.id
+    """, "d.id"),
+    "Table": ("""
+        SELECT t.id, t.name, l.name, s.name, d.name
+        FROM tables_metadata t
+    """ + _LINEAGE_JOINS, "t.id"),
+}
+
+_TOKEN_SPLIT = re.compile(r'[^0-9A-Z]+')
+
+
+def _trigrams(text):
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+def _tokens(text):
+    tokens = {token for token in _TOKEN_SPLIT.split(text) if token}
+    tokens.add(text)
+    return tokens
+
+
+class SearchIndex:
+    """Trigram + token-prefix index over documents, with add/remove by entity"""
+
+    def __init__(self):
+        self.docs = {}
+        self.by_entity = {}
+        self.postings = {}
+        self.tokens = []  # sorted (token, doc_id)
+        self.next_id = 0
+
+    def add(self, entity_type, entity_id, name, lob=None, subject=None, database=None, keep_sorted=True, **fields):
+        if not name:
+            return
+        doc_id = self.next_id
+        self.next_id += 1
+        key = name.upper()
+        doc = {"type": entity_type, "id": entity_id, "name": name, "lob": lob, "subject": subject, "database": database}
+        doc.update(fields)
+        self.docs[doc_id] = (key, doc)
+        self.by_entity.setdefault((entity_type, entity_id), set()).add(doc_id)
+        for gram in _trigrams(key):
+            self.postings.setdefault(gram, set()).add(doc_id)
+        for token in _tokens(key):
+            if keep_sorted:
+                bisect.insort(self.tokens, (token, doc_id))
+            else:
+                self.tokens.append((token, doc_id))
+
+    def remove(self, entity_type, entity_id):
+        for doc_id in self.by_entity.pop((entity_type, entity_id), ()):
+            key, _ = self.docs.pop(doc_id)
+            for gram in _trigrams(key):
+                posting = self.postings.get(gram)
+                if posting is not None:
+                    posting.discard(doc_id)
+                    if not posting:
+                        del self.postings[gram]
+            for token in _tokens(key):
+                i = bisect.bisect_left(self.tokens, (token, doc_id))
+                if i < len(self.tokens) and self.tokens[i] == (token, doc_id):
+                    del self.tokens[i]
+
+    def _candidates(self, query):
+        if len(query) >= 3:
+            postings = sorted((self.postings.get(gram, set()) for gram in _trigrams(query)), key=len)
+            candidates = set(postings[0])
+            for posting in postings[1:]:
+                candidates &= posting
+                if not candidates:
+                    break
+            return candidates
+
+        # Too short for trigrams: prefix match on names and their tokens
+        candidates = set()
+        i = bisect.bisect_left(self.tokens, (query, -1))
+        while i < len(self.tokens) and self.tokens[i][0].startswith(query):
+            candidates.add(self.tokens[i][1])
+            i += 1
+        return candidates
+
+    def ranked(self, query, types=ENTITY_TYPES, limit=SEARCH_DEFAULT_LIMIT, where=None):
+        """The best limit matches as (rank, doc) pairs; where(doc) can filter further"""
+        query = query.upper()
+        ranked = []
+        for doc_id in self._candidates(query):
+            key, doc = self.docs[doc_id]
+            if doc["type"] not in types or (where is not None and not where(doc)):
+                continue
+            if key == query:
+                match = 0
+            elif key.startswith(query):
+                match = 1
+            elif any(token.startswith(query) for token in _TOKEN_SPLIT.split(key)):
+                match = 2
+            elif query in key:
+                match = 3
+            else:
+                continue
+            ranked.append(((match, TYPE_ORDER.index(doc["type"]), len(key), key, doc_id), doc))
+        return heapq.nsmallest(limit, ranked, key=itemgetter(0))
+
+    def search(self, query, types=ENTITY_TYPES, limit=SEARCH_DEFAULT_LIMIT, where=None):
+        return [doc for _, doc in self.ranked(query, types, limit, where)]
+
+
+_lock = threading.Lock()
+_rebuild_lock = threading.Lock()
+_index = None
+_built_at = None
+_generation = 0
+
+
+def _rows(conn, entity_type, entity_id=None):
+    sql, id_column = _ENTITY_SQL[entity_type]
+    if entity_id is None:
+        return db.query_all(sql, conn=conn)
+    return db.query_all(f"{sql} WHERE {id_column} = :1", [entity_id], conn=conn)
+
+
+def _build():
+    """Build a fresh index from the catalog and swap it in (caller holds _rebuild_lock)"""
+    global _index, _built_at
+    start = time.monotonic()
+    started_generation = _generation
+    index = SearchIndex()
+    with db.connection() as conn:
+        for entity_type in ENTITY_TYPES:
+            for row in _rows(conn, entity_type):
+                index.add(entity_type, *row, keep_sorted=False)
+    index.tokens.sort()
+
+    with _lock:
+        unchanged = _generation == started_generation
+        # If writes landed mid-build, the old index (kept current by refresh_entity) is
+        # safer to keep; either way the next search schedules another rebuild
+        if unchanged or _index is None:
+            _index = index
+        _built_at = time.monotonic() if unchanged else None
+    logger.info(f"Built search index over {len(index.docs)} names in {time.monotonic() - start:.2f}s")
+
+
+def rebuild():
+    with _rebuild_lock:
+        _build()
+
+
+def _rebuild_in_background():
+    if _rebuild_lock.locked():
+        return
+    def run():
+        try:
+            rebuild()
+        except Exception as e:
+            logger.error(f"Search index rebuild failed: {e}")
+    threading.Thread(target=run, name="search-index-rebuild", daemon=True).start()
+
+
+def warm():
+    """Build the index ahead of the first search"""
+    _rebuild_in_background()
+
+
+def refresh_entity(entity_type, entity_id, conn=None):
+    """Re-read one entity after a write (and a table's columns); drops it if it is gone"""
+    global _generation
+    if entity_type == "Table":
+        # Picks up the table's columns by its LAST_DDL_TIME, off the request thread
+        column_index.refresh_in_background(refresh_snapshot=True)
+    with _lock:
+        _generation += 1
+        if _index is None:
+            return
+    try:
+        if conn is None:
+            with db.connection() as conn:
+                return refresh_entity(entity_type, entity_id, conn)
+        rows = _rows(conn, entity_type, entity_id)
+        with _lock:
+            _index.remove(entity_type, entity_id)
+            for row in rows:
+                _index.add(entity_type, *row)
+    except Exception as e:
+        # The periodic rebuild will catch up; a failed refresh must not fail the write
+        logger.warning(f"Could not refresh search index for {entity_type} {entity_id}: {e}")
+
+
+def search(query, types=ENTITY_TYPES, limit=SEARCH_DEFAULT_LIMIT):
+    """Ranked matches for query, building the index first if there is none yet"""
+    if _index is None:
+        with _rebuild_lock:
+            if _index is None:
+                _build()
+    elif _built_at is None or time.monotonic() - _built_at > SEARCH_INDEX_REBUILD_SECONDS:
+        _rebuild_in_background()
+    limit = min(limit, SEARCH_MAX_LIMIT)
+    with _lock:
+        ranked = _index.ranked(query, types, limit)
+    if "Column" in types:
+        ranked += column_index.ranked(query, limit=limit)
+    return [doc for _, doc in heapq.nsmallest(limit, ranked, key=itemgetter(0))]
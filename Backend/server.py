@@ -5,19 +5,34 @@ import oracledb
 from flask_cors import CORS
 from dotenv import load_dotenv
 from flask import Flask, request, jsonify, send_file, Response
-import pandas as pd
-from ydata_profiling import ProfileReport
-import tempfile
-import json
-from datetime import datetime, timedelta
-import time
+from datetime import timedelta
 import logging
-import hashlib
 import sys
+import threading
 from apscheduler.schedulers.background import BackgroundScheduler
 from apscheduler.triggers.cron import CronTrigger
 
-output_dir = tempfile.mkdtemp()
+import catalog_indexes
+import catalog_lists
+import change_detection
+import column_index
+import db
+import er_graph
+import er_import
+import er_layout
+import fk_discovery
+import hierarchy_cache
+import json_stream
+import profile_cache
+import profile_jobs
+import profile_scheduler
+import relationship_inference
+import schema_snapshot
+import search_index
+import stats_refresh
+import table_export
+import table_metadata
+from db import DB_HOST, DB_PORT, DB_SERVICE, DB_USER
 
 load_dotenv()
 logging.basicConfig(level=logging.INFO)
@@ -27,300 +42,264 @@ app = Flask(__name__)
 CORS(app)
 
 
-# --- Database Configuration ---
-DB_HOST = os.environ.get('DB_HOST')
-DB_PORT = int(os.environ.get('DB_PORT', '1521'))  # Convert to integer
-DB_SERVICE = os.environ.get('DB_SERVICE')
-DB_USER = os.environ.get('DB_USER')
-DB_PASSWORD = os.environ.get('DB_PASSWORD')
-
-
 # --- Database Connection ---
 
 def get_db_connection():
+    """Borrow a session from the shared pool; close() hands it back"""
     try:
-        # Create connection string (TNS style)
-        dsn = f"{DB_HOST}:{DB_PORT}/{DB_SERVICE}"
-        
-        # Create the connection
-        return oracledb.connect(
-            user=DB_USER,
-            password=DB_PASSWORD,
-            dsn=dsn
-        )
+        return db.acquire()
     except Exception as e:
         logger.error(f"Database connection failed: {e}")
         return None
 
 def execute_query(query, params=None, fetch_one=False, fetch_all=False):
-    db_conn = get_db_connection()
-    if not db_conn:
-        return {'error': 'Database connection failed', 'status': 500}
-    
     try:
-        with db_conn.cursor() as cur:
-            cur.execute(query, params or [])
-            if fetch_one:
-                return cur.fetchone()
-            if fetch_all:
-                return cur.fetchall()
-            db_conn.commit()
-            return None
-    except oracledb.Error as e:  # Changed from cx_Oracle.Error
-        db_conn.rollback()
-        logger.error(f"Query execution failed: {e}")
-        return {'error': str(e), 'status': 400}
-    finally:
-        db_conn.close()
+        with db.connection() as db_conn:
+            try:
+                if fetch_one:
+                    return db.query_one(query, params, conn=db_conn)
+                if fetch_all:
+                    return db.query_all(query, params, conn=db_conn)
+                with db_conn.cursor() as cur:
+                    cur.execute(query, params or [])
+                db_conn.commit()
+                return None
+            except oracledb.Error as e:  # Changed from cx_Oracle.Error
+                db_conn.rollback()
+                logger.error(f"Query execution failed: {e}")
+                return {'error': str(e), 'status': 400}
+    except oracledb.Error as e:
+        logger.error(f"Database connection failed: {e}")
+        return {'error': 'Database connection failed', 'status': 500}
 
 class AutoProfiler:
     def __init__(self):
         self.setup_profiling_tables()
         
     def setup_profiling_tables(self):
-        """Create tables to store profiling results and table metadata"""
-        db_conn = get_db_connection()
-        if not db_conn:
-            return
-            
+        """Create the table that tracks which tables to profile; reports live in the profile cache"""
         try:
-            with db_conn.cursor() as cur:
-                # Table to store profiling results
-                create_profiling_table = """
-                CREATE TABLE IF NOT EXISTS ydata_profiling_results (
-                    id SERIAL PRIMARY KEY,
-                    schema_name VARCHAR(255) NOT NULL,
-                    table_name VARCHAR(255) NOT NULL,
-                    profiling_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    profile_html TEXT,
-                    profile_json TEXT,
-                    row_count INTEGER,
-                    column_count INTEGER,
-                    data_hash VARCHAR(255),
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    UNIQUE(schema_name, table_name, profiling_date)
-                );
-                """
-                
-                # Table to track which tables to profile
-                create_tracking_table = """
-                CREATE TABLE IF NOT EXISTS profiling_table_registry (
-                    id SERIAL PRIMARY KEY,
-                    schema_name VARCHAR(255) NOT NULL,
-                    table_name VARCHAR(255) NOT NULL,
-                    is_active BOOLEAN DEFAULT TRUE,
-                    last_profiled TIMESTAMP,
-                    profiling_frequency_days INTEGER DEFAULT 7,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    UNIQUE(schema_name, table_name)
-                );
-                """
+            with db.connection() as db_conn:
+                with db_conn.cursor() as cur:
+                    # Table to track which tables to profile
+                    create_tracking_table = """
+                    CREATE TABLE profiling_table_registry (
+                        id NUMBER GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY,
+                        schema_name VARCHAR2(255) NOT NULL,
+                        table_name VARCHAR2(255) NOT NULL,
+                        is_active NUMBER(1) DEFAULT 1 NOT NULL,
+                        priority NUMBER DEFAULT 0 NOT NULL,
+                        last_profiled TIMESTAMP,
+                        last_status VARCHAR2(20),
+                        last_error VARCHAR2(4000),
+                        profiling_frequency_days NUMBER DEFAULT 7 NOT NULL,
+                        created_at TIMESTAMP DEFAULT SYSTIMESTAMP,
+                        UNIQUE (schema_name, table_name)
+                    )
+                    """
                 
-                cur.execute(create_profiling_table)
-                cur.execute(create_tracking_table)
-                db_conn.commit()
-                logger.info("Profiling tables created successfully")
+                    try:
+                        cur.execute(create_tracking_table)
+                    except oracledb.DatabaseError as e:
+                        error, = e.args
+                        # ORA-00955: name is already used by an existing object
+                        if error.code != 955:
+                            raise
+                    logger.info("Profiling tables created successfully")
                 
         except Exception as e:
             logger.error(f"Error creating profiling tables: {e}")
-            db_conn.rollback()
-        finally:
-            db_conn.close()
     
     def discover_tables(self):
         """Discover all tables in the database and add them to registry"""
-        db_conn = get_db_connection()
-        if not db_conn:
-            return []
-            
         try:
-            with db_conn.cursor() as cur:
-                # Get all user tables (excluding system tables)
-                query = """
-                SELECT table_schema, table_name 
-                FROM information_schema.tables 
-                WHERE table_type = 'BASE TABLE' 
-                AND table_schema NOT IN ('information_schema', 'pg_catalog', 'pg_toast')
-                ORDER BY table_schema, table_name;
-                """
+            with db.connection() as db_conn:
+                with db.cursor(db_conn, db.FETCH_BULK) as cur:
+                    # Catalog tables that exist in this schema
+                    query = """
+                    SELECT :1, UPPER(t.name)
+                    FROM tables_metadata t
+                    JOIN user_tables u ON u.table_name = UPPER(t.name)
+                    ORDER BY 2
+                    """
                 
-                cur.execute(query)
-                tables = cur.fetchall()
+                    cur.execute(query, [DB_USER.upper()])
+                    tables = cur.fetchall()
                 
-                # Add discovered tables to registry if not already present
-                for schema, table in tables:
-                    insert_query = """
-                    INSERT INTO profiling_table_registry (schema_name, table_name)
-                    VALUES (%s, %s)
-                    ON CONFLICT (schema_name, table_name) DO NOTHING;
-                    """
-                    cur.execute(insert_query, (schema, table))
+                    # Add discovered tables to registry if not already present
+                    cur.execute("""
+                    MERGE INTO profiling_table_registry r
+                    USING (
+                        SELECT DISTINCT UPPER(t.name) AS table_name
+                        FROM tables_metadata t
+                        JOIN user_tables u ON u.table_name = UPPER(t.name)
+                    ) d
+                    ON (r.schema_name = :schema_name AND r.table_name = d.table_name)
+                    WHEN NOT MATCHED THEN
+                        INSERT (schema_name, table_name) VALUES (:schema_name, d.table_name)
+                    """, {"schema_name": DB_USER.upper()})
                 
-                db_conn.commit()
-                logger.info(f"Discovered and registered {len(tables)} tables")
-                return tables
+                    db_conn.commit()
+                    logger.info(f"Discovered and registered {len(tables)} tables")
+                    return tables
                 
         except Exception as e:
             logger.error(f"Error discovering tables: {e}")
             return []
-        finally:
-            db_conn.close()
     
     def get_tables_to_profile(self):
-        """Get tables that need profiling based on schedule"""
-        db_conn = get_db_connection()
-        if not db_conn:
-            return []
-            
+        """
+        Get tables that need profiling based on schedule.
+
+        Highest priority first, then never-profiled tables, then the most
+        overdue relative to their profiling frequency.
+        """
         try:
-            with db_conn.cursor() as cur:
-                query = """
-                SELECT schema_name, table_name, profiling_frequency_days
-                FROM profiling_table_registry
-                WHERE is_active = TRUE
-                AND (
-                    last_profiled IS NULL 
-                    OR last_profiled < NOW() - INTERVAL '1 day' * profiling_frequency_days
-                );
-                """
+            with db.connection() as db_conn:
+                with db.cursor(db_conn, db.FETCH_BULK) as cur:
+                    query = """
+                    SELECT schema_name, table_name, profiling_frequency_days
+                    FROM profiling_table_registry
+                    WHERE is_active = 1
+                    AND (
+                        last_profiled IS NULL 
+                        OR last_profiled < SYSTIMESTAMP - NUMTODSINTERVAL(profiling_frequency_days, 'DAY')
+                    )
+                    ORDER BY priority DESC,
+                             CASE WHEN last_profiled IS NULL THEN 0 ELSE 1 END,
+                             (CAST(SYSTIMESTAMP AS DATE) - CAST(last_profiled AS DATE))
+                                 / GREATEST(profiling_frequency_days, 1) DESC
+                    """
                 
-                cur.execute(query)
-                return cur.fetchall()
+                    cur.execute(query)
+                    return cur.fetchall()
                 
         except Exception as e:
             logger.error(f"Error getting tables to profile: {e}")
             return []
-        finally:
-            db_conn.close()
     
-    def generate_data_hash(self, df):
-        """Generate a hash of the data for change detection"""
+    def plan_scheduled_tables(self):
+        """Register new tables, then list the due ones in the order they should be profiled"""
+        self.discover_tables()
+        return [(schema, table) for schema, table, frequency in self.get_tables_to_profile()]
+    
+    def record_result(self, schema, table, result, error):
+        """Checkpoint one table's outcome in the registry"""
         try:
-            # Create a hash based on shape, dtypes, and sample of data
-            shape_str = str(df.shape)
-            dtypes_str = df.dtypes.to_string()
-            
-            # Use a sample of the data to create hash (first 100 rows)
-            sample_data = df.head(100).to_string()
-            
-            # Combine all info
-            data_info = f"{shape_str}_{dtypes_str}_{sample_data}"
-            
-            # Use SHA256 for consistent hashing
-            return hashlib.sha256(data_info.encode()).hexdigest()[:32]
+            with db.connection() as db_conn:
+                with db_conn.cursor() as cur:
+                    if error is None:
+                        cur.execute("""
+                        UPDATE profiling_table_registry
+                        SET last_profiled = SYSTIMESTAMP,
+                            last_status = :1,
+                            last_error = NULL
+                        WHERE schema_name = :2 AND table_name = :3
+                        """, ["unchanged" if result.get("cache") == "hit" else "profiled", schema, table])
+                    else:
+                        cur.execute("""
+                        UPDATE profiling_table_registry
+                        SET last_status = 'failed',
+                            last_error = SUBSTR(:1, 1, 4000)
+                        WHERE schema_name = :2 AND table_name = :3
+                        """, [error, schema, table])
+                db_conn.commit()
         except Exception as e:
-            logger.warning(f"Error generating data hash: {e}")
-            return str(hash(str(df.shape)))
+            logger.error(f"Error recording profiling result for {schema}.{table}: {e}")
     
-    def profile_table(self, schema, table):
-        """Profile a specific table and store results"""
-        db_conn = get_db_connection()
-        if not db_conn:
-            return False
-            
+    def profile_table(self, schema, table, mode="auto"):
+        """
+        Profile a specific table and store results.
+
+        The table's change fingerprint is checked first, so an unchanged table
+        costs one dictionary query and is never read.
+        """
         try:
             logger.info(f"Starting profiling for {schema}.{table}")
-            
-            # Fetch data from table
-            query = f'SELECT * FROM "{schema}"."{table}"'
-            df = pd.read_sql(query, con=db_conn)
-            
-            if df.empty:
-                logger.warning(f"Table {schema}.{table} is empty")
-                return False
-            
-            # Generate data hash
-            data_hash = self.generate_data_hash(df)
-            
-            # Check if we already have recent profiling with same hash
-            with db_conn.cursor() as cur:
-                check_query = """
-                SELECT id FROM ydata_profiling_results 
-                WHERE schema_name = %s AND table_name = %s 
-                AND data_hash = %s AND profiling_date > NOW() - INTERVAL '1 day'
-                """
-                cur.execute(check_query, (schema, table, data_hash))
-                
-                if cur.fetchone():
-                    logger.info(f"Data unchanged for {schema}.{table}, skipping profiling")
-                    return True
-                
-                # Generate profile
-                profile = ProfileReport(
-                    df, 
-                    title=f"YData Profile - {schema}.{table}",
-                    explorative=True,
-                    minimal=False
-                )
-                
-                profile_html = profile.to_html()
-                profile_json = json.dumps(profile.to_json())
-                
-                # Store results
-                insert_query = """
-                INSERT INTO ydata_profiling_results 
-                (schema_name, table_name, profile_html, profile_json, row_count, column_count, data_hash)
-                VALUES (%s, %s, %s, %s, %s, %s, %s)
-                """
-                
-                cur.execute(insert_query, (
-                    schema, table, profile_html, profile_json,
-                    len(df), len(df.columns), data_hash
-                ))
-                
-                # Update last profiled timestamp
-                update_query = """
-                UPDATE profiling_table_registry 
-                SET last_profiled = CURRENT_TIMESTAMP
-                WHERE schema_name = %s AND table_name = %s
-                """
-                cur.execute(update_query, (schema, table))
-                
-                db_conn.commit()
+            result = profile_jobs.refresh_profile(schema, table, mode)
+            self.record_result(schema, table, result, None)
+            if result["cache"] == "hit":
+                logger.info(f"Data unchanged for {schema}.{table}, skipping profiling")
+            else:
                 logger.info(f"Profiling completed for {schema}.{table}")
-                return True
+            return True
                 
         except Exception as e:
             logger.error(f"Error profiling table {schema}.{table}: {e}")
-            db_conn.rollback()
+            self.record_result(schema, table, None, str(e))
             return False
-        finally:
-            db_conn.close()
     
     def run_scheduled_profiling(self):
-        """Run profiling for all tables that need it"""
+        """Run profiling for all tables that need it, several at a time"""
         logger.info("Starting scheduled profiling job")
-        
-        # Discover new tables
-        self.discover_tables()
-        
-        # Get tables that need profiling
-        tables_to_profile = self.get_tables_to_profile()
-        
-        if not tables_to_profile:
-            logger.info("No tables need profiling at this time")
-            return
-        
-        logger.info(f"Found {len(tables_to_profile)} tables to profile")
-        
-        # Profile each table
-        for schema, table, frequency in tables_to_profile:
-            try:
-                self.profile_table(schema, table)
-                # Add small delay between tables to avoid overwhelming the database
-                time.sleep(2)
-            except Exception as e:
-                logger.error(f"Failed to profile {schema}.{table}: {e}")
-                continue
-        
+        result = profile_scheduler.run_pass(self.plan_scheduled_tables, self.record_result)
         logger.info("Scheduled profiling job completed")
+        return result
+
+# Created on first use, not at import: spawn-started profiling workers
+# re-import this module and must not repeat the setup DDL
+_auto_profiler = None
+_auto_profiler_lock = threading.Lock()
+
+
+def get_auto_profiler():
+    """The process-wide AutoProfiler, setting up its tables on first call"""
+    global _auto_profiler
+    with _auto_profiler_lock:
+        if _auto_profiler is None:
+            _auto_profiler = AutoProfiler()
+        return _auto_profiler
+
+def sampling_note(sample_plan):
+    """Report header line describing how a sampled profile's rows were drawn"""
+    if not sample_plan:
+        return ""
+    if not sample_plan["random"]:
+        return (
+            f'<p style="margin: 0;"><strong>Sample:</strong> first {sample_plan["sample_rows"]:,} rows '
+            f'(no table statistics to size a random sample)</p>'
+        )
+    fraction = sample_plan["fraction"]
+    # Reports cached before "error" was recorded only have the requested target
+    error = sample_plan.get("error", sample_plan["target_error"])
+    method = f'{sample_plan["method"]} sampling, seed {sample_plan["seed"]}' if sample_plan["method"] else "full table"
+    return (
+        f'<p style="margin: 0;"><strong>Sample:</strong> {sample_plan["sample_rows"]:,} of '
+        f'~{sample_plan["population_rows"]:,} rows ({fraction:.4%}, {method}) | '
+        f'<strong>Accuracy:</strong> &plusmn;{error:.2%} at '
+        f'{sample_plan["confidence"]:.0%} confidence</p>'
+    )
+
+
+def with_header(html_content, header):
+    """Insert a metadata banner at the top of a rendered report"""
+    if '<body>' in html_content:
+        return html_content.replace('<body>', f'<body>{header}', 1)
+    return header + html_content
+
+
+def cached_profile_response(content, meta, schema, table, fmt):
+    """Serve a report straight from the profile cache"""
+    if fmt == "json":
+        response = Response(content, mimetype='application/json')
+    else:
+        metadata_header = f"""
+        <div style="background: #f8f9fa; padding: 15px; margin-bottom: 20px; border-radius: 5px; border-left: 4px solid #007bff;">
+            <h3 style="margin: 0 0 10px 0;">Cached {meta["report_label"]}</h3>
+            <p style="margin: 0;"><strong>Table:</strong> {schema}.{table}</p>
+            <p style="margin: 0;"><strong>Generated:</strong> {meta["generated_at"]}</p>
+            <p style="margin: 0;"><strong>Rows:</strong> {meta["row_count"]:,} | <strong>Columns:</strong> {meta["column_count"]}</p>
+            {sampling_note(meta.get("sample_plan"))}
+        </div>
+        """
+        response = Response(with_header(content, metadata_header), mimetype='text/html')
+    response.headers["X-Profile-Cache"] = "hit"
+    return response
 
-# Initialize auto profiler
-auto_profiler = AutoProfiler()
 
 @app.route("/api/profile", methods=["POST"])
 def profile_table():
-    """Get profiling results from database (cached) or generate new if not available"""
+    """Serve a cached profile while the table is unchanged, otherwise generate and cache a new one"""
     try:
         # Handle different content types
         if request.is_json:
@@ -342,74 +321,45 @@ def profile_table():
         if not schema or not table:
             return jsonify({"error": "Both 'schema' and 'table' parameters are required"}), 400
 
-        db_conn = get_db_connection()
-        if db_conn:
-            # try:
-            #     with db_conn.cursor() as cur:
-            #         query = """
-            #             SELECT profile_html, profiling_date, row_count, column_count
-            #             FROM ydata_profiling_results
-            #             WHERE schema_name = :1 AND table_name = :2
-            #             ORDER BY profiling_date DESC
-            #             FETCH FIRST 1 ROWS ONLY
-            #         """
-            #         cur.execute(query, (schema, table))
-            #         result = cur.fetchone()
-            #         print(f"result: {result}")
-            #         if result:
-            #             profile_html, profiling_date, row_count, column_count = result
-
-            #             metadata_header = f"""
-            #             <div style="background: #f8f9fa; padding: 15px; margin-bottom: 20px; border-radius: 5px; border-left: 4px solid #007bff;">
-            #                 <h3 style="margin: 0 0 10px 0;">Cached Profiling Report</h3>
-            #                 <p style="margin: 0;"><strong>Table:</strong> {schema}.{table}</p>
-            #                 <p style="margin: 0;"><strong>Generated:</strong> {profiling_date}</p>
-            #                 <p style="margin: 0;"><strong>Rows:</strong> {row_count:,} | <strong>Columns:</strong> {column_count}</p>
-            #             </div>
-            #             """
-            #             if '<body>' in profile_html:
-            #                 profile_html = profile_html.replace('<body>', f'<body>{metadata_header}')
-            #             else:
-            #                 profile_html = metadata_header + profile_html
-
-            #             return Response(profile_html, mimetype='text/html')
-            # finally:
-            #     db_conn.close()
-
-            # # If no cached result, generate real-time profile
-            # logger.info(f"No cached profile found for {schema}.{table}, generating new one")
-
-            db_conn = get_db_connection()
-            if not db_conn:
-                return jsonify({"error": "Database connection failed"}), 500
-
-            try:
-                query = f'SELECT * FROM {table}'  # No quotes unless table/schema is mixed/lowercase
-                df = pd.read_sql(query, con=db_conn)
-
-                if df.empty:
-                    return jsonify({"error": "Table is empty"}), 400
-
-                profile = ProfileReport(df, title=f"YData Profile - {schema}.{table}", explorative=True)
-                html_content = profile.to_html()
-
-                realtime_header = f"""
-                <div style="background: #fff3cd; padding: 15px; margin-bottom: 20px; border-radius: 5px; border-left: 4px solid #ffc107;">
-                    <h3 style="margin: 0 0 10px 0;">Real-time Profiling Report</h3>
-                    <p style="margin: 0;"><strong>Table:</strong> {schema}.{table}</p>
-                    <p style="margin: 0;"><strong>Generated:</strong> {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}</p>
-                    <p style="margin: 0;"><strong>Note:</strong> This is a real-time generated report. Cached version will be available after next scheduled profiling.</p>
-                </div>
-                """
-                if '<body>' in html_content:
-                    html_content = html_content.replace('<body>', f'<body>{realtime_header}')
-                else:
-                    html_content = realtime_header + html_content
+        mode = data.get("mode", "auto")
+        try:
+            options = profile_jobs.parse_options(mode, data)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        fmt = "json" if data.get("format") == "json" else "html"
+        refresh = str(data.get("refresh", False)).lower() == "true"
+
+        with db.connection() as db_conn:
+            fingerprint = change_detection.fingerprint(db_conn, table)
+        if fingerprint is None:
+            return jsonify({"error": f"Table '{table}' not found"}), 404
+
+        key = profile_cache.cache_key(table, mode, options)
+        cached = None if refresh else profile_cache.get(key, fingerprint, fmt)
+        if cached:
+            content, meta = cached
+            return cached_profile_response(content, meta, schema, table, fmt)
 
-                return Response(html_content, mimetype='text/html')
+        try:
+            html_content, json_content, meta = profile_jobs.build_profile(schema, table, mode, options, key, fingerprint)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
 
-            finally:
-                db_conn.close()
+        if fmt == "json":
+            response = Response(json_content, mimetype='application/json')
+        else:
+            realtime_header = f"""
+        <div style="background: #fff3cd; padding: 15px; margin-bottom: 20px; border-radius: 5px; border-left: 4px solid #ffc107;">
+            <h3 style="margin: 0 0 10px 0;">{meta["report_label"]}</h3>
+            <p style="margin: 0;"><strong>Table:</strong> {schema}.{table}</p>
+            <p style="margin: 0;"><strong>Generated:</strong> {meta["generated_at"]}</p>
+            {sampling_note(meta["sample_plan"])}
+            <p style="margin: 0;"><strong>Note:</strong> This is a real-time generated report. It will be served from cache until the table changes.</p>
+        </div>
+        """
+            response = Response(with_header(html_content, realtime_header), mimetype='text/html')
+        response.headers["X-Profile-Cache"] = "miss"
+        return response
 
     except Exception as e:
         logger.error(f"Error in profile_table: {e}")
@@ -422,12 +372,137 @@ def profile_table():
 
 
 
+
+def read_profile_request():
+    """Request data for the profiling endpoints, JSON or form encoded"""
+    if request.is_json:
+        return request.get_json()
+    if request.content_type == 'application/x-www-form-urlencoded':
+        return request.form.to_dict()
+    return request.get_json(force=True, silent=True)
+
+
+@app.route("/api/profile-jobs", methods=["POST"])
+def submit_profile_job():
+    """Queue a profiling run in the background and return its job id right away"""
+    try:
+        data = read_profile_request()
+        if not data:
+            return jsonify({"error": "No data provided"}), 400
+
+        schema = "SCHEMABROWSER"  # Oracle schemas are typically uppercase
+        table = data.get("table")
+        if not table:
+            return jsonify({"error": "'table' parameter is required"}), 400
+
+        mode = data.get("mode", "auto")
+        try:
+            options = profile_jobs.parse_options(mode, data)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        refresh = str(data.get("refresh", False)).lower() == "true"
+
+        job, created = profile_jobs.submit(schema, table, mode, options, refresh)
+        if job is None:
+            return jsonify({"error": "Too many profiling jobs queued, try again later"}), 503
+        return jsonify({"job": job, "deduplicated": not created}), 202 if created else 200
+
+    except Exception as e:
+        logger.error(f"Error submitting profiling job: {e}")
+        return jsonify({"error": str(e)}), 500
+
+
+@app.route("/api/profile-jobs", methods=["GET"])
+def list_profile_jobs():
+    """Queued, running and recently finished profiling jobs, newest first"""
+    return jsonify(profile_jobs.list_jobs()), 200
+
+
+@app.route("/api/profile-jobs/<job_id>", methods=["GET"])
+def get_profile_job(job_id):
+    """Status and progress (0.0 - 1.0) of one profiling job"""
+    job = profile_jobs.get_job(job_id)
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+    return jsonify(job), 200
+
+
+@app.route("/api/profile-jobs/<job_id>/result", methods=["GET"])
+def get_profile_job_result(job_id):
+    """The finished report of a profiling job, as HTML or ?format=json"""
+    job = profile_jobs.get_job(job_id)
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+    if job["status"] == "failed":
+        return jsonify({"error": job["error"], "job": job}), 500
+    if job["status"] != "done":
+        return jsonify({"message": "Profiling still in progress", "job": job}), 409
+
+    fmt = "json" if request.args.get("format") == "json" else "html"
+    result = profile_jobs.get_result(job_id, fmt)
+    if result is None:
+        return jsonify({"error": "Report is no longer cached, submit the job again"}), 410
+    content, meta = result
+    return cached_profile_response(content, meta, "SCHEMABROWSER", job["table"], fmt)
+
+
+@app.route("/api/profiling-schedule", methods=["GET"])
+def get_profiling_schedule_status():
+    """State of the scheduled profiling pass: current progress, throttle and last result"""
+    try:
+        return jsonify(profile_scheduler.status()), 200
+    except Exception as e:
+        logger.error(f"Error reading profiling schedule status: {e}")
+        return jsonify({"error": str(e)}), 500
+
+
+@app.route("/api/profiling-schedule", methods=["POST"])
+def start_profiling_pass():
+    """Start (or resume) a scheduled profiling pass now"""
+    if profile_scheduler.status()["running"]:
+        return jsonify({"message": "Profiling pass already running"}), 409
+    threading.Thread(
+        target=get_auto_profiler().run_scheduled_profiling,
+        name="profiling-pass",
+        daemon=True
+    ).start()
+    return jsonify({"message": "Profiling pass started"}), 202
+
+
+@app.route("/api/profile-cache", methods=["GET"])
+def get_profile_cache_status():
+    """Profile cache size, limits and hit/miss counters"""
+    try:
+        return jsonify(profile_cache.status()), 200
+    except Exception as e:
+        logger.error(f"Error reading profile cache status: {e}")
+        return jsonify({"error": str(e)}), 500
+
+
+@app.route("/api/profile-cache", methods=["DELETE"])
+def clear_profile_cache():
+    """Drop cached profiles, all of them or only those of ?table=NAME"""
+    try:
+        dropped = profile_cache.invalidate(request.args.get("table"))
+        return jsonify({"message": "Profile cache cleared", "dropped": dropped}), 200
+    except Exception as e:
+        logger.error(f"Error clearing profile cache: {e}")
+        return jsonify({"error": str(e)}), 500
+
+
+@app.route("/api/pool-stats", methods=["GET"])
+def get_pool_stats():
+    """Session pool occupancy and acquire wait times, for sizing DB_POOL_MIN/MAX"""
+    try:
+        return jsonify(db.pool_stats()), 200
+    except Exception as e:
+        logger.error(f"Error reading pool stats: {e}")
+        return jsonify({"error": str(e)}), 500
+
     
 # ------------------- 1. Create LOB -------------------
 @app.route("/api/lobs", methods=["POST"])
 def create_lob():
-    conn = None
-    cursor = None
     try:
         data = request.json
         name = data.get("name")
@@ -435,124 +510,106 @@ def create_lob():
         if not name:
             return jsonify({"error": "LOB name is required"}), 400
 
-        conn = get_db_connection()
-        cursor = conn.cursor()
+        with db.connection() as conn, db.cursor(conn, db.FETCH_SINGLE) as cursor:
         
-        # Check for existing LOB
-        cursor.execute(
-            "SELECT id FROM lobs WHERE name = :1",
-            [name]
-        )
-        if cursor.fetchone():
-            return jsonify({"error": "LOB with this name already exists"}), 409
+            # Check for existing LOB
+            cursor.execute(
+                "SELECT id FROM lobs WHERE name = :1",
+                [name]
+            )
+            if cursor.fetchone():
+                return jsonify({"error": "LOB with this name already exists"}), 409
 
-        # Create output variable for the ID
-        lob_id_var = cursor.var(oracledb.NUMBER)
+            # Create output variable for the ID
+            lob_id_var = cursor.var(oracledb.NUMBER)
 
-        # Insert new LOB with RETURNING clause
-        cursor.execute("""
-            INSERT INTO lobs (name, created_at) 
-            VALUES (:1, SYSTIMESTAMP)
-            RETURNING id INTO :2
-        """, [name, lob_id_var])
+            # Insert new LOB with RETURNING clause
+            cursor.execute("""
+                INSERT INTO lobs (name, created_at) 
+                VALUES (:1, SYSTIMESTAMP)
+                RETURNING id INTO :2
+            """, [name, lob_id_var])
         
-        # Get the returned ID value
-        lob_id = lob_id_var.getvalue()[0]
-        conn.commit()
+            # Get the returned ID value
+            lob_id = lob_id_var.getvalue()[0]
+            conn.commit()
+            hierarchy_cache.invalidate()
+            search_index.refresh_entity("LOB", lob_id, conn)
 
-        return jsonify({
-            "message": "LOB created successfully",
-            "id": lob_id,
-            "name": name
-        }), 201
+            return jsonify({
+                "message": "LOB created successfully",
+                "id": lob_id,
+                "name": name
+            }), 201
 
     except oracledb.IntegrityError:
-        if conn:
-            conn.rollback()
         return jsonify({
             "error": "Database constraint failed: LOB name must be unique"
         }), 409
     except Exception as e:
-        if conn:
-            conn.rollback()
         logger.error(f"Error creating LOB: {str(e)}")
         return jsonify({"error": str(e)}), 500
-    finally:
-        if cursor:
-            cursor.close()
-        if conn:
-            conn.close()
 
 # ------------------- 2. Create Subject Area -------------------
 @app.route("/api/subject-areas", methods=["POST"])
 def create_subject_area():
-    conn = None
-    cursor = None
     try:
         data = request.json
         name = data['name']
         lob_name = data['lob_name']
         
-        conn = get_db_connection()
-        cursor = conn.cursor()
+        with db.connection() as conn, db.cursor(conn, db.FETCH_SINGLE) as cursor:
 
-        # First verify if LOB exists
-        cursor.execute("""
-            SELECT id FROM lobs
-            WHERE name = :1
-        """, [lob_name])
+            # First verify if LOB exists
+            cursor.execute("""
+                SELECT id FROM lobs
+                WHERE name = :1
+            """, [lob_name])
         
-        lob_row = cursor.fetchone()
-        if not lob_row:
-            return jsonify({
-                "error": f"LOB '{lob_name}' not found"
-            }), 404
+            lob_row = cursor.fetchone()
+            if not lob_row:
+                return jsonify({
+                    "error": f"LOB '{lob_name}' not found"
+                }), 404
 
-        lob_id = lob_row[0]
+            lob_id = lob_row[0]
 
-        # Check if subject area already exists
-        cursor.execute("""
-            SELECT COUNT(*) FROM subject_areas 
-            WHERE name = :1 AND lob_id = :2
-        """, [name, lob_id])
+            # Check if subject area already exists
+            cursor.execute("""
+                SELECT COUNT(*) FROM subject_areas 
+                WHERE name = :1 AND lob_id = :2
+            """, [name, lob_id])
         
-        if cursor.fetchone()[0] > 0:
-            return jsonify({
-                "error": f"Subject Area '{name}' already exists in this LOB"
-            }), 409
+            if cursor.fetchone()[0] > 0:
+                return jsonify({
+                    "error": f"Subject Area '{name}' already exists in this LOB"
+                }), 409
 
-        # Create new subject area
-        subject_id = cursor.var(oracledb.NUMBER)  # Create an output variable
-        cursor.execute("""
-            INSERT INTO subject_areas (name, lob_id, created_at)
-            VALUES (:1, :2, SYSTIMESTAMP)
-            RETURNING id INTO :3
-        """, [name, lob_id, subject_id])
+            # Create new subject area
+            subject_id = cursor.var(oracledb.NUMBER)  # Create an output variable
+            cursor.execute("""
+                INSERT INTO subject_areas (name, lob_id, created_at)
+                VALUES (:1, :2, SYSTIMESTAMP)
+                RETURNING id INTO :3
+            """, [name, lob_id, subject_id])
         
-        conn.commit()
+            conn.commit()
+            hierarchy_cache.invalidate()
+            search_index.refresh_entity("Subject Area", subject_id.getvalue()[0], conn)
 
-        return jsonify({
-            "message": "Subject Area created successfully",
-            "id": subject_id.getvalue()[0],  # Get the first value from the output variable
-            "name": name,
-            "lob_name": lob_name
-        }), 201
+            return jsonify({
+                "message": "Subject Area created successfully",
+                "id": subject_id.getvalue()[0],  # Get the first value from the output variable
+                "name": name,
+                "lob_name": lob_name
+            }), 201
 
     except Exception as e:
-        if conn:
-            conn.rollback()
         logger.error(f"Error creating subject area: {str(e)}")
         return jsonify({"error": str(e)}), 500
-    finally:
-        if cursor:
-            cursor.close()
-        if conn:
-            conn.close()
 @app.route("/api/logical-databases", methods=["POST"])
 def create_logical_db():
     """Create a new logical database and associate it with a subject area"""
-    conn = None
-    cursor = None
     try:
         data = request.json
         lob_name = data.get("lob_name")
@@ -564,119 +621,108 @@ def create_logical_db():
                 "error": "Missing required fields"
             }), 400
 
-        conn = get_db_connection()
-        cursor = conn.cursor()
+        with db.connection() as conn, db.cursor(conn, db.FETCH_SINGLE) as cursor:
 
-        # Get subject_area_id from lob_name + subject_name
-        cursor.execute("""
-            SELECT sa.id 
-            FROM subject_areas sa
-            JOIN lobs l ON sa.lob_id = l.id
-            WHERE sa.name = :1 AND l.name = :2
-        """, [subject_name, lob_name])
-        
-        result = cursor.fetchone()
-        if not result:
-            return jsonify({
-                "error": f"Subject Area '{subject_name}' not found in LOB '{lob_name}'"
-            }), 404
+            # Get subject_area_id from lob_name + subject_name
+            cursor.execute("""
+                SELECT sa.id 
+                FROM subject_areas sa
+                JOIN lobs l ON sa.lob_id = l.id
+                WHERE sa.name = :1 AND l.name = :2
+            """, [subject_name, lob_name])
+        
+            result = cursor.fetchone()
+            if not result:
+                return jsonify({
+                    "error": f"Subject Area '{subject_name}' not found in LOB '{lob_name}'"
+                }), 404
         
-        subject_area_id = result[0]
+            subject_area_id = result[0]
 
-        # Check if database name already exists
-        cursor.execute("""
-            SELECT id FROM logical_databases 
-            WHERE name = :1
-        """, [db_name])
+            # Check if database name already exists
+            cursor.execute("""
+                SELECT id FROM logical_databases 
+                WHERE name = :1
+            """, [db_name])
         
-        if cursor.fetchone():
-            return jsonify({
-                "error": f"Database '{db_name}' already exists"
-            }), 409
+            if cursor.fetchone():
+                return jsonify({
+                    "error": f"Database '{db_name}' already exists"
+                }), 409
 
-        # Create new logical database
-        db_id_var = cursor.var(oracledb.NUMBER)
-        cursor.execute("""
-            INSERT INTO logical_databases (name, created_at) 
-            VALUES (:1, SYSTIMESTAMP)
-            RETURNING id INTO :2
-        """, [db_name, db_id_var])
+            # Create new logical database
+            db_id_var = cursor.var(oracledb.NUMBER)
+            cursor.execute("""
+                INSERT INTO logical_databases (name, created_at) 
+                VALUES (:1, SYSTIMESTAMP)
+                RETURNING id INTO :2
+            """, [db_name, db_id_var])
         
-        new_db_id = db_id_var.getvalue()[0]
+            new_db_id = db_id_var.getvalue()[0]
 
-        # Create mapping in subject_area_logical_database
-        cursor.execute("""
-            INSERT INTO subject_area_logical_database 
-            (subject_area_id, logical_database_id) 
-            VALUES (:1, :2)
-        """, [subject_area_id, new_db_id])
+            # Create mapping in subject_area_logical_database
+            cursor.execute("""
+                INSERT INTO subject_area_logical_database 
+                (subject_area_id, logical_database_id) 
+                VALUES (:1, :2)
+            """, [subject_area_id, new_db_id])
 
-        conn.commit()
+            conn.commit()
+            hierarchy_cache.invalidate()
+            search_index.refresh_entity("Database", new_db_id, conn)
 
-        return jsonify({
-            "success": True,
-            "message": "Logical Database created successfully", 
-            "id": new_db_id,
-            "name": db_name,
-            "lob_name": lob_name,
-            "subject_name": subject_name
-        }), 201
+            return jsonify({
+                "success": True,
+                "message": "Logical Database created successfully", 
+                "id": new_db_id,
+                "name": db_name,
+                "lob_name": lob_name,
+                "subject_name": subject_name
+            }), 201
 
     except oracledb.IntegrityError as e:
-        if conn:
-            conn.rollback()
         logger.error(f"Database integrity error: {e}")
         return jsonify({
             "success": False,
             "error": f"Database constraint violated: {str(e)}"
         }), 409
     except Exception as e:
-        if conn:
-            conn.rollback()
         logger.error(f"Error creating logical database: {e}")
         return jsonify({
             "success": False,
             "error": f"Failed to create Logical Database: {str(e)}"
         }), 500
-    finally:
-        if cursor:
-            cursor.close()
-        if conn:
-            conn.close()
 @app.route('/api/logical-databases/<string:database_name>', methods=['GET'])
 def get_database_by_name(database_name):
     """Get logical database details by name."""
-    conn = None
-    cursor = None
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        print(f"Fetching database details for: {database_name}")
-        cursor.execute("""
-            SELECT 
-                db.id, 
-                db.name, 
-                l.name AS lob_name, 
-                sa.name AS subject_area_name
-            FROM logical_databases db
-            JOIN subject_area_logical_database sald ON db.id = sald.logical_database_id
-            JOIN subject_areas sa ON sald.subject_area_id = sa.id
-            JOIN lobs l ON sa.lob_id = l.id
-            WHERE UPPER(db.name) = UPPER(:1)
-        """, [database_name])
-        
-        row = cursor.fetchone()
-        if row:
-            return jsonify({
-                "id": row[0],
-                "name": row[1],
-                "lob_name": row[2],
-                "subject_area_name": row[3]
-            }), 200
-        else:
-            return jsonify({
-                "error": f"Database '{database_name}' not found"
-            }), 404
+        with db.connection() as conn, db.cursor(conn, db.FETCH_SINGLE) as cursor:
+            print(f"Fetching database details for: {database_name}")
+            cursor.execute("""
+                SELECT 
+                    db.id, 
+                    db.name, 
+                    l.name AS lob_name, 
+                    sa.name AS subject_area_name
+                FROM logical_databases db
+                JOIN subject_area_logical_database sald ON db.id = sald.logical_database_id
+                JOIN subject_areas sa ON sald.subject_area_id = sa.id
+                JOIN lobs l ON sa.lob_id = l.id
+                WHERE UPPER(db.name) = UPPER(:1)
+            """, [database_name])
+        
+            row = cursor.fetchone()
+            if row:
+                return jsonify({
+                    "id": row[0],
+                    "name": row[1],
+                    "lob_name": row[2],
+                    "subject_area_name": row[3]
+                }), 200
+            else:
+                return jsonify({
+                    "error": f"Database '{database_name}' not found"
+                }), 404
             
     except oracledb.Error as e:
         logger.error(f"Database error in get_database_by_name: {e}")
@@ -688,51 +734,67 @@ def get_database_by_name(database_name):
         return jsonify({
             "error": str(e)
         }), 500
-    finally:
-        if cursor:
-            cursor.close()
-        if conn:
-            conn.close()
 
 # ------------------- 4. Create Table -------------------
-@app.route("/api/tables", methods=["GET"])
-def get_tables():
-    conn = None
-    cursor = None
+def json_list_response(sql, params=None, row=None):
+    """
+    Stream a query's rows as a JSON array of dicts, or as NDJSON if the client asks for it.
+
+    The query runs before the response is returned, so database errors still
+    reach the caller's except blocks.
+    """
+    ndjson = json_stream.wants_ndjson(request)
+    batches = json_stream.query(sql, params, row)
+    return Response(
+        json_stream.iter_json(batches, ndjson),
+        mimetype=json_stream.NDJSON_MIMETYPE if ndjson else json_stream.JSON_MIMETYPE,
+        # Let proxies pass batches through as they are produced
+        headers={"X-Accel-Buffering": "no"},
+    )
+
+
+def catalog_list_response(name, spec, row=None):
+    """
+    Answer a list endpoint from catalog_lists: every matching row as a streamed
+    array, or one keyset page as {"items", "next_cursor"} when ?limit= or ?after= is given.
+    """
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute("""
-            SELECT t.id, t.name, t.schema_name, d.name AS database_name
-            FROM tables_metadata t
-            JOIN logical_databases d ON t.database_id = d.id
-            ORDER BY t.id
-        """)
-        columns = [desc[0].lower() for desc in cursor.description]
-        rows = cursor.fetchall()
-        tables = [dict(zip(columns, row)) for row in rows]
-        return jsonify(tables)
+        sql, params, paged = catalog_lists.query(spec, request.args)
+        if paged is None:
+            return json_list_response(sql, params, row)
+        limit, field = paged
+        return Response(
+            json_stream.dumps(catalog_lists.page(sql, params, limit, field, row)),
+            mimetype=json_stream.JSON_MIMETYPE
+        )
+
+    except ValueError as e:
+        return jsonify({"error": f"Invalid list parameters: {e}"}), 400
     except oracledb.Error as e:
-        logger.error(f"Database error in get_tables: {e}")
+        logger.error(f"Database error listing {name}: {e}")
         return jsonify({"error": str(e)}), 500
     except Exception as e:
-        logger.error(f"Unexpected error in get_tables: {e}")
+        logger.error(f"Unexpected error listing {name}: {e}")
         return jsonify({"error": str(e)}), 500
-    finally:
-        if cursor:
-            cursor.close()
-        if conn:
-            conn.close()
+
+
+@app.route("/api/tables", methods=["GET"])
+def get_tables():
+    """
+    List tables, filtered by ?database=, ?database_id=, ?schema= and ?name= (prefix).
+
+    ?sort= id (default), name, schema or database, '-' prefixed for
+    descending. With ?limit= and ?after=<next_cursor> the list comes back in
+    keyset pages; without them every matching row is streamed.
+    """
+    return catalog_list_response("tables", catalog_lists.TABLES)
+
+
 @app.route("/api/tables/<string:database_name>", methods=["GET"])
 def get_tables_inDB(database_name):
     """Get all tables for a specific database"""
-    conn = None
-    cursor = None
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        cursor.execute("""
+        return json_list_response("""
             SELECT t.id, t.name, t.schema_name, d.name AS database_name
             FROM tables_metadata t
             JOIN logical_databases d ON t.database_id = d.id
@@ -740,137 +802,109 @@ def get_tables_inDB(database_name):
             ORDER BY t.id
         """, [database_name])
         
-        columns = [desc[0].lower() for desc in cursor.description]
-        rows = cursor.fetchall()
-        tables = [dict(zip(columns, row)) for row in rows]
-        
-        return jsonify(tables)
-        
     except oracledb.Error as e:
         logger.error(f"Database error getting tables for {database_name}: {e}")
         return jsonify({"error": str(e)}), 500
     except Exception as e:
         logger.error(f"Unexpected error getting tables for {database_name}: {e}")
         return jsonify({"error": str(e)}), 500
-    finally:
-        if cursor:
-            cursor.close()
-        if conn:
-            conn.close()
 
 def get_lob_id_by_name(conn, lob_name):
     """Get LOB ID by name"""
-    cursor = conn.cursor()
     try:
-        cursor.execute(
+        result = db.query_one(
             "SELECT id FROM lobs WHERE name = :1",
-            [lob_name]
+            [lob_name],
+            conn=conn
         )
-        result = cursor.fetchone()
         return result[0] if result else None
     except oracledb.Error as e:
         logger.error(f"Error getting LOB ID for {lob_name}: {e}")
         return None
-    finally:
-        cursor.close()
 
 def get_or_create_er_entity(conn, er_diagram_name, lob_id):
     """Get existing ER entity or create a new one"""
-    cursor = conn.cursor()
     try:
-        # Check if entity already exists
-        cursor.execute("""
-            SELECT id FROM er_entities 
-            WHERE name = :1 AND lob_id = :2
-        """, [er_diagram_name, lob_id])
+        with db.cursor(conn, db.FETCH_SINGLE) as cursor:
+            # Check if entity already exists
+            cursor.execute("""
+                SELECT id FROM er_entities 
+                WHERE name = :1 AND lob_id = :2
+            """, [er_diagram_name, lob_id])
             
-        result = cursor.fetchone()
-        if result:
-            return result[0]
+            result = cursor.fetchone()
+            if result:
+                return result[0]
             
-        # Create new entity with both created_at and updated_at
-        entity_id_var = cursor.var(oracledb.NUMBER)
-        cursor.execute("""
-            INSERT INTO er_entities 
-            (name, lob_id, created_at, updated_at) 
-            VALUES (:1, :2, SYSTIMESTAMP, SYSTIMESTAMP)
-            RETURNING id INTO :3
-        """, [er_diagram_name, lob_id, entity_id_var])
-        
-        entity_id = entity_id_var.getvalue()
-        conn.commit()
-        return entity_id
+            # Create new entity with both created_at and updated_at
+            entity_id_var = cursor.var(oracledb.NUMBER)
+            cursor.execute("""
+                INSERT INTO er_entities 
+                (name, lob_id, created_at, updated_at) 
+                VALUES (:1, :2, SYSTIMESTAMP, SYSTIMESTAMP)
+                RETURNING id INTO :3
+            """, [er_diagram_name, lob_id, entity_id_var])
+        
+            entity_id = entity_id_var.getvalue()
+            conn.commit()
+            return entity_id
             
     except oracledb.Error as e:
         logger.error(f"Error in get_or_create_er_entity: {e}")
         raise
-    finally:
-        cursor.close()
 
 
 @app.route("/api/delete_er_diagram/<int:entityId>", methods=['DELETE'])
 def deleteERdiagram(entityId):
     """Deletes an ER Diagram entity and its relationships."""
-    conn = None
-    cursor = None
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
+        with db.connection() as conn, db.cursor(conn) as cursor:
 
-        # Delete relationships first
-        cursor.execute("""
-            DELETE FROM er_relationships 
-            WHERE er_entity_id = :1
-        """, [entityId])
-        relationships_deleted = cursor.rowcount
-        logger.info(f"Deleted {relationships_deleted} relationships for ER diagram {entityId}")
-        
-        # Delete the entity
-        cursor.execute("""
-            DELETE FROM er_entities 
-            WHERE id = :1
-        """, [entityId])
-        entity_deleted = cursor.rowcount
+            # Delete relationships first
+            cursor.execute("""
+                DELETE FROM er_relationships 
+                WHERE er_entity_id = :1
+            """, [entityId])
+            relationships_deleted = cursor.rowcount
+            logger.info(f"Deleted {relationships_deleted} relationships for ER diagram {entityId}")
         
-        if entity_deleted > 0:
-            conn.commit()
-            logger.info(f"Successfully deleted ER diagram {entityId}")
-            return jsonify({
-                "message": f"ER Diagram with ID {entityId} deleted successfully.",
-                "relationships_deleted": relationships_deleted
-            }), 200
-        else:
-            logger.warning(f"ER diagram {entityId} not found")
-            return jsonify({
-                "message": f"ER Diagram with ID {entityId} not found or already deleted."
-            }), 404
+            # Delete the entity
+            cursor.execute("""
+                DELETE FROM er_entities 
+                WHERE id = :1
+            """, [entityId])
+            entity_deleted = cursor.rowcount
+        
+            if entity_deleted > 0:
+                er_layout.forget(conn, entityId)
+                conn.commit()
+                er_graph.refresh_entity(entityId, conn)
+                logger.info(f"Successfully deleted ER diagram {entityId}")
+                return jsonify({
+                    "message": f"ER Diagram with ID {entityId} deleted successfully.",
+                    "relationships_deleted": relationships_deleted
+                }), 200
+            else:
+                logger.warning(f"ER diagram {entityId} not found")
+                return jsonify({
+                    "message": f"ER Diagram with ID {entityId} not found or already deleted."
+                }), 404
 
     except oracledb.Error as e:
-        if conn:
-            conn.rollback()
         logger.error(f"Database error deleting ER Diagram {entityId}: {e}")
         return jsonify({
             "error": "Database error occurred during deletion."
         }), 500
     except Exception as e:
-        if conn:
-            conn.rollback()
         logger.error(f"Unexpected error deleting ER Diagram {entityId}: {e}")
         return jsonify({
             "error": "An internal server error occurred during deletion."
         }), 500
-    finally:
-        if cursor:
-            cursor.close()
-        if conn:
-            conn.close()
 
 # @app.route('/api/create_er_diagram', methods=['POST'])
 @app.route('/api/create_er_diagram', methods=['POST'])
 def create_er_relationship():
     """Create a new ER diagram relationship"""
-    conn = None
-    cursor = None
 
     try:
         data = request.get_json()
@@ -894,103 +928,90 @@ def create_er_relationship():
         cardinality = data['cardinality']
         relationship_type = data['relationshipType']
 
-        conn = get_db_connection()
-        cursor = conn.cursor()
+        with db.connection() as conn, db.cursor(conn, db.FETCH_SINGLE) as cursor:
 
-        # Get LOB ID
-        lob_id = get_lob_id_by_name(conn, lob_name)
-        if not lob_id:
-            return jsonify({'success': False, 'error': f'LOB not found: {lob_name}'}), 400
+            # Get LOB ID
+            lob_id = get_lob_id_by_name(conn, lob_name)
+            if not lob_id:
+                return jsonify({'success': False, 'error': f'LOB not found: {lob_name}'}), 400
 
-        # Get or create ER Entity
-        er_entity_id_result = get_or_create_er_entity(conn, er_diagram_name, lob_id)
+            # Get or create ER Entity
+            er_entity_id_result = get_or_create_er_entity(conn, er_diagram_name, lob_id)
         
-        # Handle the case where the function returns a list or a single value
-        if isinstance(er_entity_id_result, (list, tuple)) and len(er_entity_id_result) > 0:
-            er_entity_id = er_entity_id_result[0]
-        else:
-            er_entity_id = er_entity_id_result
+            # Handle the case where the function returns a list or a single value
+            if isinstance(er_entity_id_result, (list, tuple)) and len(er_entity_id_result) > 0:
+                er_entity_id = er_entity_id_result[0]
+            else:
+                er_entity_id = er_entity_id_result
             
-        logger.info(f"ER Entity ID: {er_entity_id}")
-        
-        # Create the relationship
-        relationship_id_var = cursor.var(oracledb.NUMBER)
-        created_at_var = cursor.var(oracledb.TIMESTAMP)
+            logger.info(f"ER Entity ID: {er_entity_id}")
         
-        cursor.execute("""
-            INSERT INTO er_relationships 
-            (from_table_id, from_column, to_table_id, to_column, 
-            cardinality, relationship_type, created_at, er_entity_id)
-            VALUES (:from_table_id, :from_column, :to_table_id, :to_column, 
-                    :cardinality, :relationship_type, SYSTIMESTAMP, :er_entity_id)
-            RETURNING id, created_at INTO :relationship_id, :created_at
-        """, {
-            'from_table_id': from_table_id,
-            'from_column': from_column,
-            'to_table_id': to_table_id,
-            'to_column': to_column,
-            'cardinality': cardinality,
-            'relationship_type': relationship_type,
-            'er_entity_id': er_entity_id,
-            'relationship_id': relationship_id_var,
-            'created_at': created_at_var
-        })
-
-        # Now get the actual values from the Oracle variables
-        relationship_id = relationship_id_var.getvalue()
-
-        # Commit transaction
-        conn.commit()
-        logger.info(f"Created ER relationship with ID: {relationship_id}")
+            # Create the relationship
+            relationship_id_var = cursor.var(oracledb.NUMBER)
+            created_at_var = cursor.var(oracledb.TIMESTAMP)
         
-        # Return success response
-        return jsonify({
-            'success': True,
-            'message': 'ER relationship created successfully',
-            'data': {
-                'id': relationship_id,
-                'er_entity_id': er_entity_id,
+            cursor.execute("""
+                INSERT INTO er_relationships 
+                (from_table_id, from_column, to_table_id, to_column, 
+                cardinality, relationship_type, created_at, er_entity_id)
+                VALUES (:from_table_id, :from_column, :to_table_id, :to_column, 
+                        :cardinality, :relationship_type, SYSTIMESTAMP, :er_entity_id)
+                RETURNING id, created_at INTO :relationship_id, :created_at
+            """, {
                 'from_table_id': from_table_id,
                 'from_column': from_column,
                 'to_table_id': to_table_id,
                 'to_column': to_column,
                 'cardinality': cardinality,
                 'relationship_type': relationship_type,
-                "name": er_diagram_name,
-                "lob_name": lob_name,
+                'er_entity_id': er_entity_id,
+                'relationship_id': relationship_id_var,
+                'created_at': created_at_var
+            })
 
-            }
-        }), 201
+            # Now get the actual values from the Oracle variables
+            relationship_id = relationship_id_var.getvalue()
+
+            # Commit transaction
+            conn.commit()
+            er_graph.refresh_relationship(relationship_id, conn)
+            logger.info(f"Created ER relationship with ID: {relationship_id}")
+        
+            # Return success response
+            return jsonify({
+                'success': True,
+                'message': 'ER relationship created successfully',
+                'data': {
+                    'id': relationship_id,
+                    'er_entity_id': er_entity_id,
+                    'from_table_id': from_table_id,
+                    'from_column': from_column,
+                    'to_table_id': to_table_id,
+                    'to_column': to_column,
+                    'cardinality': cardinality,
+                    'relationship_type': relationship_type,
+                    "name": er_diagram_name,
+                    "lob_name": lob_name,
+
+                }
+            }), 201
         
     except oracledb.IntegrityError as e:
-        if conn:
-            conn.rollback()
         logger.error(f"Database integrity error: {e}")
         return jsonify({'success': False, 'error': 'Database integrity constraint violated'}), 409
 
     except oracledb.Error as e:
-        if conn:
-            conn.rollback()
         logger.error(f"Database error: {e}")
         return jsonify({'success': False, 'error': 'Database error occurred'}), 500
 
     except Exception as e:
-        if conn:
-            conn.rollback()
         logger.error(f"Unexpected error: {e}")
         return jsonify({'success': False, 'error': 'An unexpected error occurred'}), 500
 
-    finally:
-        if cursor:
-            cursor.close()
-        if conn:
-            conn.close()
 
 @app.route("/api/createER", methods=["POST"])
 def createER():
     """Create a new ER relationship with existing entity ID"""
-    conn = None
-    cursor = None
     
     try:
         data = request.get_json()
@@ -1018,73 +1039,71 @@ def createER():
         relationship_type = data['relationshipType']
         
         # Get database connection
-        conn = get_db_connection() 
-        cursor = conn.cursor()
+        with db.connection() as conn, db.cursor(conn, db.FETCH_SINGLE) as cursor:
         
-        # Check if relationship already exists
-        cursor.execute("""
-            SELECT id FROM er_relationships 
-            WHERE from_table_id = :1 AND from_column = :2
-            AND to_table_id = :3 AND to_column = :4 
-            AND er_entity_id = :5
-        """, [from_table_id, from_column, to_table_id, to_column, er_entity_id])
-        
-        existing_relationship = cursor.fetchone()
-        if existing_relationship:
-            return jsonify({
-                'success': False,
-                'error': 'Relationship already exists between these tables and columns'
-            }), 409
+            # Check if relationship already exists
+            cursor.execute("""
+                SELECT id FROM er_relationships 
+                WHERE from_table_id = :1 AND from_column = :2
+                AND to_table_id = :3 AND to_column = :4 
+                AND er_entity_id = :5
+            """, [from_table_id, from_column, to_table_id, to_column, er_entity_id])
+        
+            existing_relationship = cursor.fetchone()
+            if existing_relationship:
+                return jsonify({
+                    'success': False,
+                    'error': 'Relationship already exists between these tables and columns'
+                }), 409
         
-        # Create the relationship
-        relationship_id_var = cursor.var(oracledb.NUMBER)
-        created_at_var = cursor.var(oracledb.TIMESTAMP)
+            # Create the relationship
+            relationship_id_var = cursor.var(oracledb.NUMBER)
+            created_at_var = cursor.var(oracledb.TIMESTAMP)
         
-        cursor.execute("""
-            INSERT INTO er_relationships 
-            (from_table_id, from_column, to_table_id, to_column,
-            cardinality, relationship_type, created_at, er_entity_id)
-            VALUES (:1, :2, :3, :4, :5, :6, SYSTIMESTAMP, :7)
-            RETURNING id, created_at INTO :8, :9
-        """, [
-            from_table_id,
-            from_column,
-            to_table_id,
-            to_column,
-            cardinality,
-            relationship_type,
-            er_entity_id,
-            relationship_id_var,
-            created_at_var
-        ])
-        
-        relationship_id = relationship_id_var.getvalue()
-        created_at = created_at_var.getvalue()
-        
-        # Commit transaction
-        conn.commit()
-        logger.info(f"Created ER relationship with ID: {relationship_id}")
-        
-        # Return success response
-        return jsonify({
-            'success': True,
-            'message': 'ER relationship created successfully',
-            'data': {
-                'id': relationship_id,
-                'er_entity_id': er_entity_id,
-                'from_table_id': from_table_id,
-                'from_column': from_column,
-                'to_table_id': to_table_id,
-                'to_column': to_column,
-                'cardinality': cardinality,
-                'relationship_type': relationship_type,
-                # 'created_at': created_at.isoformat() if created_at else None
-            }
-        }), 201
+            cursor.execute("""
+                INSERT INTO er_relationships 
+                (from_table_id, from_column, to_table_id, to_column,
+                cardinality, relationship_type, created_at, er_entity_id)
+                VALUES (:1, :2, :3, :4, :5, :6, SYSTIMESTAMP, :7)
+                RETURNING id, created_at INTO :8, :9
+            """, [
+                from_table_id,
+                from_column,
+                to_table_id,
+                to_column,
+                cardinality,
+                relationship_type,
+                er_entity_id,
+                relationship_id_var,
+                created_at_var
+            ])
+        
+            relationship_id = relationship_id_var.getvalue()
+            created_at = created_at_var.getvalue()
+        
+            # Commit transaction
+            conn.commit()
+            er_graph.refresh_relationship(relationship_id, conn)
+            logger.info(f"Created ER relationship with ID: {relationship_id}")
+        
+            # Return success response
+            return jsonify({
+                'success': True,
+                'message': 'ER relationship created successfully',
+                'data': {
+                    'id': relationship_id,
+                    'er_entity_id': er_entity_id,
+                    'from_table_id': from_table_id,
+                    'from_column': from_column,
+                    'to_table_id': to_table_id,
+                    'to_column': to_column,
+                    'cardinality': cardinality,
+                    'relationship_type': relationship_type,
+                    # 'created_at': created_at.isoformat() if created_at else None
+                }
+            }), 201
         
     except oracledb.IntegrityError as e:
-        if conn:
-            conn.rollback()
         logger.error(f"Database integrity error: {e}")
         return jsonify({
             'success': False,
@@ -1092,8 +1111,6 @@ def createER():
         }), 409
         
     except oracledb.Error as e:
-        if conn:
-            conn.rollback()
         logger.error(f"Database error: {e}")
         return jsonify({
             'success': False,
@@ -1101,89 +1118,79 @@ def createER():
         }), 500
         
     except Exception as e:
-        if conn:
-            conn.rollback()
         logger.error(f"Unexpected error: {e}")
         return jsonify({
             'success': False,
             'error': 'An unexpected error occurred'
         }), 500
         
-    finally:
-        if cursor:
-            cursor.close()
-        if conn:
-            conn.close()
 
 # get er entities
 @app.route('/api/get_er_entities/<string:lob_name>', methods=["GET"])
 def getERentity(lob_name):
     """Get all ER entities for a specific LOB"""
-    conn = None
-    cursor = None
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
+        with db.connection() as conn, db.cursor(conn, db.FETCH_BULK) as cursor:
 
-        # Query to get ER entities for a specific LOB
-        cursor.execute("""
-            SELECT 
-                ee.id,
-                ee.name,
-                ee.created_at,
-                ee.updated_at,
-                l.name as lob_name,
-                COUNT(er.id) as relationship_count
-            FROM er_entities ee
-            JOIN lobs l ON ee.lob_id = l.id
-            LEFT JOIN er_relationships er ON ee.id = er.er_entity_id
-            WHERE UPPER(l.name) = UPPER(:1)
-            GROUP BY ee.id, ee.name, ee.created_at, ee.updated_at, l.name
-            ORDER BY ee.name
-        """, [lob_name])
-        
-        results = cursor.fetchall()
-        
-        # Check if LOB exists if no results found
-        if not results:
+            # Query to get ER entities for a specific LOB
             cursor.execute("""
-                SELECT id FROM lobs 
-                WHERE UPPER(name) = UPPER(:1)
+                SELECT 
+                    ee.id,
+                    ee.name,
+                    ee.created_at,
+                    ee.updated_at,
+                    l.name as lob_name,
+                    COUNT(er.id) as relationship_count
+                FROM er_entities ee
+                JOIN lobs l ON ee.lob_id = l.id
+                LEFT JOIN er_relationships er ON ee.id = er.er_entity_id
+                WHERE UPPER(l.name) = UPPER(:1)
+                GROUP BY ee.id, ee.name, ee.created_at, ee.updated_at, l.name
+                ORDER BY ee.name
             """, [lob_name])
+        
+            results = cursor.fetchall()
+        
+            # Check if LOB exists if no results found
+            if not results:
+                cursor.execute("""
+                    SELECT id FROM lobs 
+                    WHERE UPPER(name) = UPPER(:1)
+                """, [lob_name])
             
-            lob_exists = cursor.fetchone()
+                lob_exists = cursor.fetchone()
             
-            if not lob_exists:
-                return jsonify({
-                    "success": False,
-                    "error": f"LOB '{lob_name}' not found",
-                    "data": []
-                }), 404
-            else:
-                return jsonify({
-                    "success": True,
-                    "message": f"No ER entities found for LOB '{lob_name}'",
-                    "data": []
-                }), 200
-        
-        # Format results
-        er_entities = []
-        for row in results:
-            er_entities.append({
-                "id": row[0],
-                "name": row[1],
-                "created_at": row[2].isoformat() if row[2] else None,
-                "updated_at": row[3].isoformat() if row[3] else None,
-                "lob_name": row[4],
-                "relationship_count": row[5]
-            })
+                if not lob_exists:
+                    return jsonify({
+                        "success": False,
+                        "error": f"LOB '{lob_name}' not found",
+                        "data": []
+                    }), 404
+                else:
+                    return jsonify({
+                        "success": True,
+                        "message": f"No ER entities found for LOB '{lob_name}'",
+                        "data": []
+                    }), 200
+        
+            # Format results
+            er_entities = []
+            for row in results:
+                er_entities.append({
+                    "id": row[0],
+                    "name": row[1],
+                    "created_at": row[2].isoformat() if row[2] else None,
+                    "updated_at": row[3].isoformat() if row[3] else None,
+                    "lob_name": row[4],
+                    "relationship_count": row[5]
+                })
         
-        return jsonify({
-            "success": True,
-            "lob_name": lob_name,
-            "total_entities": len(er_entities),
-            "data": er_entities
-        }), 200
+            return jsonify({
+                "success": True,
+                "lob_name": lob_name,
+                "total_entities": len(er_entities),
+                "data": er_entities
+            }), 200
         
     except oracledb.Error as e:
         logger.error(f"Database error in getERentity: {e}")
@@ -1199,86 +1206,67 @@ def getERentity(lob_name):
             "error": str(e),
             "data": []
         }), 500
-    finally:
-        if cursor:
-            cursor.close()
-        if conn:
-            conn.close()
 @app.route("/api/addTM", methods=["POST"])
 def add_table():
     """Add a table to the metadata repository"""
-    conn = None
-    cursor = None
     try:
         data = request.json
         table_name = data['table_name']
         schema_name = data['schema_name']
 
-        conn = get_db_connection()
-        cursor = conn.cursor()
+        with db.connection() as conn, db.cursor(conn, db.FETCH_SINGLE) as cursor:
 
-        # Get database_id from logical_databases
-        cursor.execute("""
-            SELECT id FROM logical_databases 
-            WHERE name = :1
-        """, [schema_name])
+            # Get database_id from logical_databases
+            cursor.execute("""
+                SELECT id FROM logical_databases 
+                WHERE name = :1
+            """, [schema_name])
         
-        result = cursor.fetchone()
-        if not result:
-            return jsonify({
-                "error": f"No database found for schema '{schema_name}'"
-            }), 404
+            result = cursor.fetchone()
+            if not result:
+                return jsonify({
+                    "error": f"No database found for schema '{schema_name}'"
+                }), 404
             
-        database_id = result[0]
+            database_id = result[0]
 
-        # Insert metadata with RETURNING clause
-        table_id_var = cursor.var(oracledb.NUMBER)
-        cursor.execute("""
-            INSERT INTO tables_metadata 
-            (name, schema_name, database_id, created_at) 
-            VALUES (:1, :2, :3, SYSTIMESTAMP)
-            RETURNING id INTO :4
-        """, [table_name, schema_name, database_id, table_id_var])
+            # Insert metadata with RETURNING clause
+            table_id_var = cursor.var(oracledb.NUMBER)
+            cursor.execute("""
+                INSERT INTO tables_metadata 
+                (name, schema_name, database_id, created_at) 
+                VALUES (:1, :2, :3, SYSTIMESTAMP)
+                RETURNING id INTO :4
+            """, [table_name, schema_name, database_id, table_id_var])
 
-        table_id = table_id_var.getvalue()
-        conn.commit()
+            table_id = table_id_var.getvalue()
+            conn.commit()
+            hierarchy_cache.invalidate()
+            search_index.refresh_entity("Table", table_id[0], conn)
 
-        return jsonify({
-            "message": f"Table {table_name} imported successfully.",
-            "id": table_id
-        }), 201
+            return jsonify({
+                "message": f"Table {table_name} imported successfully.",
+                "id": table_id
+            }), 201
 
     except oracledb.IntegrityError as e:
-        if conn:
-            conn.rollback()
         logger.error(f"Database integrity error: {e}")
         return jsonify({
             "error": f"Database constraint violated: {str(e)}"
         }), 409
     except oracledb.Error as e:
-        if conn:
-            conn.rollback()
         logger.error(f"Database error: {e}")
         return jsonify({
             "error": f"Database error: {str(e)}"
         }), 500
     except Exception as e:
-        if conn:
-            conn.rollback()
         logger.error(f"Unexpected error: {e}")
         return jsonify({
             "error": str(e)
         }), 500
-    finally:
-        if cursor:
-            cursor.close()
-        if conn:
-            conn.close()
 @app.route("/api/tables", methods=["POST"])
 def create_table():
     """Create a new table and register it in metadata"""
-    conn = None
-    cursor = None
     try:
         data = request.json
         table_name = data['table_name']
@@ -1286,171 +1274,145 @@ def create_table():
         database_id = data['database_id']
         schema_name = data['schema_name']
         
-        conn = get_db_connection()
-        cursor = conn.cursor()
+        with db.connection() as conn, db.cursor(conn, db.FETCH_SINGLE) as cursor:
 
-        # Check if table already exists in Oracle
-        cursor.execute("""
-            SELECT COUNT(*) 
-            FROM all_tables 
-            WHERE table_name = :1
-        """, [table_name.upper()])
+            # Check if table already exists in Oracle
+            cursor.execute("""
+                SELECT COUNT(*) 
+                FROM all_tables 
+                WHERE table_name = :1
+            """, [table_name.upper()])
         
-        if cursor.fetchone()[0] > 0:
-            return jsonify({
-                "error": f"Table {table_name} already exists"
-            }), 409
+            if cursor.fetchone()[0] > 0:
+                return jsonify({
+                    "error": f"Table {table_name} already exists"
+                }), 409
 
-        # Validate database_id exists in logical_databases
-        cursor.execute("""
-            SELECT name FROM logical_databases 
-            WHERE id = :1
-        """, [database_id])
+            # Validate database_id exists in logical_databases
+            cursor.execute("""
+                SELECT name FROM logical_databases 
+                WHERE id = :1
+            """, [database_id])
         
-        if not cursor.fetchone():
-            return jsonify({
-                "error": f"Database ID {database_id} not found"
-            }), 404
+            if not cursor.fetchone():
+                return jsonify({
+                    "error": f"Database ID {database_id} not found"
+                }), 404
 
-        # Create table SQL
-        col_defs = []
-        pk_cols = []
+            # Create table SQL
+            col_defs = []
+            pk_cols = []
 
-        for col in columns:
-            # Build column definition
-            col_def = f"{col['name']} {col['type']}"
+            for col in columns:
+                # Build column definition
+                col_def = f"{col['name']} {col['type']}"
             
-            # Add NOT NULL if required
-            if col.get('required'):
-                col_def += " NOT NULL"
+                # Add NOT NULL if required
+                if col.get('required'):
+                    col_def += " NOT NULL"
                 
-            # Add default value if specified
-            if col.get('default'):
-                col_def += f" DEFAULT {col['default']}"
+                # Add default value if specified
+                if col.get('default'):
+                    col_def += f" DEFAULT {col['default']}"
                 
-            col_defs.append(col_def)
+                col_defs.append(col_def)
             
-            # Track primary key columns
-            if col.get('primary'):
-                pk_cols.append(col['name'])
-
-        # Add primary key constraint if specified
-        if pk_cols:
-            pk_constraint = f"CONSTRAINT {table_name}_PK PRIMARY KEY ({', '.join(pk_cols)})"
-            col_defs.append(pk_constraint)
-
-        # Add created_at column
-        col_defs.append("created_at TIMESTAMP DEFAULT SYSTIMESTAMP")
-
-        # Create table without schema name
-        create_sql = f"""
-            CREATE TABLE {table_name} (
-                {', '.join(col_defs)}
-            )
-        """
+                # Track primary key columns
+                if col.get('primary'):
+                    pk_cols.append(col['name'])
+
+            # Add primary key constraint if specified
+            if pk_cols:
+                pk_constraint = f"CONSTRAINT {table_name}_PK PRIMARY KEY ({', '.join(pk_cols)})"
+                col_defs.append(pk_constraint)
+
+            # Add created_at column
+            col_defs.append("created_at TIMESTAMP DEFAULT SYSTIMESTAMP")
+
+            # Create table without schema name
+            create_sql = f"""
+                CREATE TABLE {table_name} (
+                    {', '.join(col_defs)}
+                )
+            """
         
-        cursor.execute(create_sql)
+            cursor.execute(create_sql)
 
-        # Register in metadata
-        metadata_id_var = cursor.var(oracledb.NUMBER)
-        cursor.execute("""
-            INSERT INTO tables_metadata 
-            (name, schema_name, database_id, created_at)
-            VALUES (:1, :2, :3, SYSTIMESTAMP)
-            RETURNING id INTO :4
-        """, [table_name, schema_name, database_id, metadata_id_var])
+            # Register in metadata
+            metadata_id_var = cursor.var(oracledb.NUMBER)
+            cursor.execute("""
+                INSERT INTO tables_metadata 
+                (name, schema_name, database_id, created_at)
+                VALUES (:1, :2, :3, SYSTIMESTAMP)
+                RETURNING id INTO :4
+            """, [table_name, schema_name, database_id, metadata_id_var])
 
-        table_id = metadata_id_var.getvalue()
-        conn.commit()
+            table_id = metadata_id_var.getvalue()
+            conn.commit()
+            hierarchy_cache.invalidate()
+            schema_snapshot.mark_stale(table_name)
+            search_index.refresh_entity("Table", table_id[0], conn)
 
-        return jsonify({
-            "message": f"Table {table_name} created successfully",
-            "id": table_id,
-            "name": table_name,
-            "schema_name": schema_name,
-            "database_id": database_id
-        }), 201
+            return jsonify({
+                "message": f"Table {table_name} created successfully",
+                "id": table_id,
+                "name": table_name,
+                "schema_name": schema_name,
+                "database_id": database_id
+            }), 201
 
     except oracledb.DatabaseError as e:
-        if conn:
-            conn.rollback()
         error, = e.args
         logger.error(f"Database error creating table: {error.message}")
         return jsonify({
             "error": f"Database error: {error.message}"
         }), 500
     except Exception as e:
-        if conn:
-            conn.rollback()
         logger.error(f"Error creating table: {e}")
         return jsonify({
             "error": str(e)
         }), 500
-    finally:
-        if cursor:
-            cursor.close()
-        if conn:
-            conn.close()
 @app.route('/api/tables/<int:table_id>/attributes', methods=['GET'])
 def get_table_attributes(table_id):
 
-    conn = None
-    cursor = None
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        # Get table name and schema from metadata
-        cursor.execute("""
-            SELECT name, schema_name
-            FROM tables_metadata
-            WHERE id = :id
-        """, {"id": table_id})
-        row = cursor.fetchone()
+        with db.connection() as conn, db.cursor(conn, db.FETCH_SINGLE) as cursor:
+            # Get table name and schema from metadata
+            cursor.execute("""
+                SELECT name, schema_name
+                FROM tables_metadata
+                WHERE id = :id
+            """, {"id": table_id})
+            row = cursor.fetchone()
         
-        if not row:
-            return jsonify({"error": "Table not found in metadata"}), 404
+            if not row:
+                return jsonify({"error": "Table not found in metadata"}), 404
 
-        table_name, schema_name = row
-        print(f"Fetching columns for {schema_name}.{table_name}")
+            table_name, schema_name = row
 
-        # Fetch column names from ALL_TAB_COLUMNS
-        cursor.execute("""
-            SELECT column_name
-            FROM all_tab_columns
-            WHERE  table_name = :table_name
-            ORDER BY column_id
-        """, {
-            "table_name": table_name.upper()
-        })
+            # Column names come from the schema snapshot, not ALL_TAB_COLUMNS
+            columns = table_metadata.column_names(table_name, conn)
 
-        columns = [r[0] for r in cursor.fetchall()]
-        print(f"Attribute names: {columns}")
+            if not columns:
+                return jsonify({
+                    "error": f"No columns found for table '{table_name}' in schema '{schema_name}'"
+                }), 404
 
-        if not columns:
             return jsonify({
-                "error": f"No columns found for table '{table_name}' in schema '{schema_name}'"
-            }), 404
-
-        return jsonify({
-            "table_id": table_id,
-            "schema_name": schema_name,
-            "table_name": table_name,
-            "attributes": columns
-        }), 200
+                "table_id": table_id,
+                "schema_name": schema_name,
+                "table_name": table_name,
+                "attributes": columns
+            }), 200
 
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 
 # # ------------------- 5. View Hierarchy -------------------
-@app.route("/api/hierarchy", methods=["GET"])
-def get_hierarchy():
-    """Get complete hierarchy of LOBs, Subject Areas, Databases, and Tables"""
-    conn = None
-    cursor = None
-    try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
+def build_hierarchy_json():
+    """Query the complete hierarchy and serialize it the way jsonify would"""
+    with db.connection() as conn, db.cursor(conn, db.FETCH_BULK) as cursor:
 
         cursor.execute("""
             SELECT 
@@ -1471,38 +1433,54 @@ def get_hierarchy():
         """)
 
         rows = cursor.fetchall()
-        hierarchy = {}
 
-        for row in rows:
-            lob_id, lob_name, sa_id, sa_name, db_id, db_name, table_id, table_name = row
+    hierarchy = {}
 
-            # Initialize LOB if not exists
-            if lob_id not in hierarchy:
-                hierarchy[lob_id] = {
-                    "name": lob_name,
-                    "subject_areas": {}
-                }
+    for row in rows:
+        lob_id, lob_name, sa_id, sa_name, db_id, db_name, table_id, table_name = row
 
-            # Initialize Subject Area if exists and not already added
-            if sa_id and sa_id not in hierarchy[lob_id]["subject_areas"]:
-                hierarchy[lob_id]["subject_areas"][sa_id] = {
-                    "name": sa_name,
-                    "databases": {}
-                }
+        # Initialize LOB if not exists
+        if lob_id not in hierarchy:
+            hierarchy[lob_id] = {
+                "name": lob_name,
+                "subject_areas": {}
+            }
+
+        # Initialize Subject Area if exists and not already added
+        if sa_id and sa_id not in hierarchy[lob_id]["subject_areas"]:
+            hierarchy[lob_id]["subject_areas"][sa_id] = {
+                "name": sa_name,
+                "databases": {}
+            }
+
+        # Initialize Database if exists and not already added
+        if sa_id and db_id and db_id not in hierarchy[lob_id]["subject_areas"][sa_id]["databases"]:
+            hierarchy[lob_id]["subject_areas"][sa_id]["databases"][db_id] = {
+                "name": db_name,
+                "tables": {}
+            }
+
+        # Add table if exists
+        if sa_id and db_id and table_id:
+            hierarchy[lob_id]["subject_areas"][sa_id]["databases"][db_id]["tables"][table_id] = table_name
+
+    logger.info(f"Retrieved hierarchy with {len(hierarchy)} LOBs")
+    return app.json.dumps(hierarchy)
 
-            # Initialize Database if exists and not already added
-            if sa_id and db_id and db_id not in hierarchy[lob_id]["subject_areas"][sa_id]["databases"]:
-                hierarchy[lob_id]["subject_areas"][sa_id]["databases"][db_id] = {
-                    "name": db_name,
-                    "tables": {}
-                }
 
-            # Add table if exists
-            if sa_id and db_id and table_id:
-                hierarchy[lob_id]["subject_areas"][sa_id]["databases"][db_id]["tables"][table_id] = table_name
+@app.route("/api/hierarchy", methods=["GET"])
+def get_hierarchy():
+    """Get complete hierarchy of LOBs, Subject Areas, Databases, and Tables"""
+    try:
+        body, etag, version = hierarchy_cache.get(build_hierarchy_json)
 
-        logger.info(f"Retrieved hierarchy with {len(hierarchy)} LOBs")
-        return jsonify(hierarchy)
+        response = Response(body, mimetype='application/json')
+        response.set_etag(etag)
+        response.headers["X-Hierarchy-Version"] = str(version)
+        # Let browsers keep the tree but always revalidate it with If-None-Match
+        response.headers["Cache-Control"] = "no-cache"
+        # Answers 304 Not Modified when the client's If-None-Match still matches
+        return response.make_conditional(request)
 
     except oracledb.Error as e:
         logger.error(f"Database error in get_hierarchy: {e}")
@@ -1514,18 +1492,131 @@ def get_hierarchy():
         return jsonify({
             "error": f"An error occurred: {str(e)}"
         }), 500
-    finally:
-        if cursor:
-            cursor.close()
-        if conn:
-            conn.close()
+
+# --- Lazy Hierarchy ---
+# Children per page when expanding one hierarchy node
+HIERARCHY_PAGE_SIZE = int(os.environ.get('HIERARCHY_PAGE_SIZE', '100'))
+HIERARCHY_MAX_PAGE_SIZE = int(os.environ.get('HIERARCHY_MAX_PAGE_SIZE', '1000'))
+
+
+def page_params():
+    """(after, limit) keyset paging parameters from the query string; raises ValueError"""
+    after = int(request.args.get("after", 0))
+    limit = int(request.args.get("limit", HIERARCHY_PAGE_SIZE))
+    if after < 0 or limit < 1:
+        raise ValueError("'after' must be >= 0 and 'limit' >= 1")
+    return after, min(limit, HIERARCHY_MAX_PAGE_SIZE)
+
+
+def hierarchy_page(sql, params, parent_sql=None, parent_id=None):
+    """
+    Run a keyset page query and wrap it as {"items", "next_cursor", "version"}.
+
+    The query must filter on id > :after, order by id and stop after
+    :limit_plus_one rows; the extra row only tells us whether there is a
+    next page. Returns None if parent_sql finds no parent on the first page.
+    """
+    after, limit = page_params()
+    params = dict(params, after=after, limit_plus_one=limit + 1)
+    with db.connection() as conn:
+        items = db.query_dicts(sql, params, conn=conn)
+        if not items and after == 0 and parent_sql:
+            if db.query_one(parent_sql, [parent_id], conn=conn) is None:
+                return None
+
+    has_more = len(items) > limit
+    items = items[:limit]
+    return {
+        "items": items,
+        "next_cursor": items[-1]["id"] if has_more else None,
+        # Same version /api/hierarchy reports; a change means expanded nodes may be stale
+        "version": hierarchy_cache.version(),
+    }
+
+
+def lazy_hierarchy_response(name, sql, params=None, parent_sql=None, parent_id=None):
+    try:
+        page = hierarchy_page(sql, params or {}, parent_sql, parent_id)
+        if page is None:
+            return jsonify({"error": f"{name} {parent_id} not found"}), 404
+        return jsonify(page), 200
+
+    except ValueError as e:
+        return jsonify({"error": f"Invalid paging parameters: {e}"}), 400
+    except oracledb.Error as e:
+        logger.error(f"Database error expanding {name} {parent_id}: {e}")
+        return jsonify({"error": f"Database error: {str(e)}"}), 500
+    except Exception as e:
+        logger.error(f"Unexpected error expanding {name} {parent_id}: {e}")
+        return jsonify({"error": f"An error occurred: {str(e)}"}), 500
+
+
+@app.route("/api/hierarchy/lobs", methods=["GET"])
+def get_hierarchy_lobs():
+    """Top level of the hierarchy: one page of LOBs with their subject area counts"""
+    return lazy_hierarchy_response("Hierarchy", """
+        SELECT l.id,
+               l.name,
+               (SELECT COUNT(*) FROM subject_areas sa WHERE sa.lob_id = l.id) AS subject_area_count
+        FROM lobs l
+        WHERE l.id > :after
+        ORDER BY l.id
+        FETCH FIRST :limit_plus_one ROWS ONLY
+    """)
+
+
+@app.route("/api/hierarchy/lobs/<int:lob_id>/subject-areas", methods=["GET"])
+def get_hierarchy_subject_areas(lob_id):
+    """One page of a LOB's subject areas with their database counts"""
+    return lazy_hierarchy_response("LOB", """
+        SELECT sa.id,
+               sa.name,
+               (SELECT COUNT(*)
+                FROM subject_area_logical_database sald
+                WHERE sald.subject_area_id = sa.id) AS database_count
+        FROM subject_areas sa
+        WHERE sa.lob_id = :parent_id
+        AND sa.id > :after
+        ORDER BY sa.id
+        FETCH FIRST :limit_plus_one ROWS ONLY
+    """, {"parent_id": lob_id}, "SELECT 1 FROM lobs WHERE id = :1", lob_id)
+
+
+@app.route("/api/hierarchy/subject-areas/<int:subject_area_id>/databases", methods=["GET"])
+def get_hierarchy_databases(subject_area_id):
+    """One page of a subject area's logical databases with their table counts"""
+    return lazy_hierarchy_response("Subject Area", """
+        SELECT ldb.id,
+               ldb.name,
+               (SELECT COUNT(*) FROM tables_metadata t WHERE t.database_id = ldb.id) AS table_count
+        FROM subject_area_logical_database sald
+        JOIN logical_databases ldb ON ldb.id = sald.logical_database_id
+        WHERE sald.subject_area_id = :parent_id
+        AND ldb.id > :after
+        ORDER BY ldb.id
+        FETCH FIRST :limit_plus_one ROWS ONLY
+    """, {"parent_id": subject_area_id}, "SELECT 1 FROM subject_areas WHERE id = :1", subject_area_id)
+
+
+@app.route("/api/hierarchy/databases/<int:database_id>/tables", methods=["GET"])
+def get_hierarchy_tables(database_id):
+    """One page of a logical database's tables"""
+    return lazy_hierarchy_response("Database", """
+        SELECT t.id,
+               t.name,
+               t.schema_name
+        FROM tables_metadata t
+        WHERE t.database_id = :parent_id
+        AND t.id > :after
+        ORDER BY t.id
+        FETCH FIRST :limit_plus_one ROWS ONLY
+    """, {"parent_id": database_id}, "SELECT 1 FROM logical_databases WHERE id = :1", database_id)
+
 
 # ER Relationships
 @app.route('/api/er_relationships', methods=['POST'])
 def add_er_relationship():
     """Adds a new ER Relationship."""
-    conn = None
-    cursor = None
     try:
         data = request.get_json()
         from_table_id = data.get('from_table_id')
@@ -1542,130 +1633,214 @@ def add_er_relationship():
         if cardinality not in ['one-to-one', 'one-to-many', 'many-to-one']:
             return jsonify({'error': 'Invalid cardinality'}), 400
 
-        conn = get_db_connection()
-        cursor = conn.cursor()
+        with db.connection() as conn, db.cursor(conn) as cursor:
         
-        relationship_id_var = cursor.var(oracledb.NUMBER)
-        cursor.execute("""
-            INSERT INTO er_relationships 
-            (from_table_id, from_column, to_table_id, to_column, cardinality, relationship_type, created_at)
-            VALUES (:1, :2, :3, :4, :5, :6, SYSTIMESTAMP)
-            RETURNING id INTO :7
-        """, [from_table_id, from_column, to_table_id, to_column, cardinality, relationship_type, relationship_id_var])
+            relationship_id_var = cursor.var(oracledb.NUMBER)
+            cursor.execute("""
+                INSERT INTO er_relationships 
+                (from_table_id, from_column, to_table_id, to_column, cardinality, relationship_type, created_at)
+                VALUES (:1, :2, :3, :4, :5, :6, SYSTIMESTAMP)
+                RETURNING id INTO :7
+            """, [from_table_id, from_column, to_table_id, to_column, cardinality, relationship_type, relationship_id_var])
         
-        relationship_id = relationship_id_var.getvalue()
-        conn.commit()
+            relationship_id = relationship_id_var.getvalue()
+            conn.commit()
+            er_graph.refresh_relationship(relationship_id, conn)
         
-        return jsonify({
-            'message': 'ER Relationship added successfully', 
-            'id': relationship_id
-        }), 201
+            return jsonify({
+                'message': 'ER Relationship added successfully', 
+                'id': relationship_id
+            }), 201
 
     except Exception as e:
-        if conn:
-            conn.rollback()
         logger.error(f"Error adding ER relationship: {e}")
         return jsonify({'error': str(e)}), 500
-    finally:
-        if cursor:
-            cursor.close()
-        if conn:
-            conn.close()
 
-@app.route('/api/er_relationships', methods=['GET'])
-def get_all_er_relationships():
-    """Retrieves all ER Relationships."""
-    conn = None
-    cursor = None
+@app.route('/api/er_relationships/bulk', methods=['POST'])
+def bulk_import_er_relationships():
+    """
+    Import many ER relationships into one ER entity in a single transaction.
+
+    Body: {"er_entity_id": ...} (or "erDiagramName" and "lob" to get or create
+    the entity) and "relationships": a list of rows with the same fields as
+    /api/createER. Duplicates of existing or earlier rows are skipped, rows the
+    database rejects are reported, the rest are committed together. Returns a
+    result per row in input order.
+    """
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute("""
-            SELECT id, from_table_id, from_column, to_table_id, to_column, 
-                   cardinality, relationship_type, created_at 
-            FROM er_relationships 
-            ORDER BY id
-        """)
-        
-        columns = [desc[0].lower() for desc in cursor.description]
-        rows = cursor.fetchall()
-        relationships = []
-        
-        for row in rows:
-            relationship = dict(zip(columns, row))
-            if relationship['created_at']:
-                relationship['created_at'] = relationship['created_at'].isoformat()
-            relationships.append(relationship)
-            
-        return jsonify(relationships), 200
+        data = request.get_json(silent=True) or {}
+        items = data.get('relationships')
+        if not isinstance(items, list) or not items:
+            return jsonify({'success': False, 'error': "'relationships' must be a non-empty list"}), 400
+        if len(items) > er_import.ER_IMPORT_MAX_ROWS:
+            return jsonify({
+                'success': False,
+                'error': f"At most {er_import.ER_IMPORT_MAX_ROWS} relationships per request"
+            }), 400
 
+        with db.connection() as conn:
+            er_entity_id = data.get('er_entity_id')
+            if er_entity_id is not None:
+                if not db.query_one("SELECT id FROM er_entities WHERE id = :1", [er_entity_id], conn=conn):
+                    return jsonify({'success': False, 'error': f'ER entity {er_entity_id} not found'}), 404
+            elif data.get('erDiagramName') and data.get('lob'):
+                lob_id = get_lob_id_by_name(conn, data['lob'])
+                if not lob_id:
+                    return jsonify({'success': False, 'error': f"LOB not found: {data['lob']}"}), 400
+                er_entity_id = get_or_create_er_entity(conn, data['erDiagramName'], lob_id)
+                # RETURNING INTO hands back a list for a newly created entity
+                if isinstance(er_entity_id, (list, tuple)):
+                    er_entity_id = er_entity_id[0]
+            else:
+                return jsonify({
+                    'success': False,
+                    'error': "Either 'er_entity_id' or 'erDiagramName' and 'lob' are required"
+                }), 400
+
+            results = er_import.import_relationships(conn, er_entity_id, items)
+            er_graph.refresh_entity(er_entity_id, conn)
+
+        return jsonify({
+            'success': True,
+            'er_entity_id': er_entity_id,
+            'summary': er_import.summarize(results),
+            'results': results
+        }), 200
+
+    except oracledb.Error as e:
+        logger.error(f"Database error importing ER relationships: {e}")
+        return jsonify({'success': False, 'error': f'Database error: {str(e)}'}), 500
     except Exception as e:
-        logger.error(f"Error getting ER relationships: {e}")
-        return jsonify({'error': str(e)}), 500
-    finally:
-        if cursor:
-            cursor.close()
-        if conn:
-            conn.close()
+        logger.error(f"Unexpected error importing ER relationships: {e}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
+@app.route('/api/er_relationships/<int:er_entity_id>/discover-fks', methods=['POST'])
+def discover_fk_relationships(er_entity_id):
+    """
+    Populate an ER entity from the schema's declared foreign keys.
+
+    Every FK is mapped to tables_metadata ids within the entity's LOB (or the
+    logical database in the optional "database" body field), and only edges
+    the entity does not have yet are inserted. "dry_run": true just reports them.
+    """
+    try:
+        data = request.get_json(silent=True) or {}
+        with db.connection() as conn:
+            if not db.query_one("SELECT id FROM er_entities WHERE id = :1", [er_entity_id], conn=conn):
+                return jsonify({'success': False, 'error': f'ER entity {er_entity_id} not found'}), 404
+            summary = fk_discovery.discover(conn, er_entity_id, data.get('database'), bool(data.get('dry_run')))
+            if summary["new"] and not data.get('dry_run'):
+                er_graph.refresh_entity(er_entity_id, conn)
+        return jsonify(dict(summary, success=True)), 200
+
+    except oracledb.Error as e:
+        logger.error(f"Database error discovering FKs for ER entity {er_entity_id}: {e}")
+        return jsonify({'success': False, 'error': f'Database error: {str(e)}'}), 500
+    except Exception as e:
+        logger.error(f"Unexpected error discovering FKs for ER entity {er_entity_id}: {e}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
+@app.route('/api/er_relationships/inferred/<string:database_name>', methods=['GET'])
+def get_inferred_er_relationships(database_name):
+    """
+    Ranked relationship suggestions for a logical database without declared FKs.
+
+    Candidates are matched on column names and types, then checked on sampled
+    values. ?er_entity_id= leaves out edges that entity already has,
+    ?verify=false skips the value check and ?limit= caps the list.
+    """
+    try:
+        er_entity_id = request.args.get('er_entity_id', type=int)
+        limit = request.args.get('limit', type=int)
+        verify = request.args.get('verify', 'true').lower() != 'false'
+        with db.connection() as conn:
+            suggestions = relationship_inference.suggest(conn, database_name, er_entity_id, verify, limit)
+        if suggestions is None:
+            return jsonify({"success": False, "error": f"Database '{database_name}' not found"}), 404
+        return jsonify({
+            "success": True,
+            "database": database_name,
+            "verified": verify,
+            "total": len(suggestions),
+            "suggestions": suggestions
+        }), 200
+
+    except oracledb.Error as e:
+        logger.error(f"Database error inferring relationships for {database_name}: {e}")
+        return jsonify({"success": False, "error": f"Database error: {str(e)}"}), 500
+    except Exception as e:
+        logger.error(f"Unexpected error inferring relationships for {database_name}: {e}")
+        return jsonify({"success": False, "error": str(e)}), 500
+
+
+def with_display(relationship):
+    """Add the "FROM_TABLE.col → TO_TABLE.col" label the ER screens show for a relationship"""
+    # The unfiltered list outer-joins tables_metadata; fall back to the id of a table that is gone
+    from_table = relationship['from_table_name'] or relationship['from_table_id']
+    to_table = relationship['to_table_name'] or relationship['to_table_id']
+    relationship['display'] = f"{from_table}.{relationship['from_column']} → {to_table}.{relationship['to_column']}"
+    return relationship
+
+
+@app.route('/api/er_relationships', methods=['GET'])
+def get_all_er_relationships():
+    """
+    List ER Relationships, filtered by ?relationship_type=, ?cardinality=,
+    ?er_entity_id=, ?table_id=, ?database=, ?schema= and ?name= (table name prefix).
+
+    ?sort= id (default), created_at, relationship_type, cardinality,
+    from_table or to_table, '-' prefixed for descending. With ?limit= and
+    ?after=<next_cursor> the list comes back in keyset pages; without them
+    every matching row is streamed.
+    """
+    return catalog_list_response("ER relationships", catalog_lists.RELATIONSHIPS, with_display)
 
 @app.route('/api/er_relationships/<int:er_entity_id>', methods=['GET'])
 def get_all_er_relationships_inERdiag(er_entity_id):
-    """Retrieves all ER Relationships for a specific er_diagram entity."""
-    conn = None
-    cursor = None
+    """
+    Retrieves all ER Relationships for a specific er_diagram entity.
+
+    With ?layout=true the response is {"relationships", "layout"}, where
+    layout holds the stored node positions of the diagram (see er_layout).
+    """
+    sql = """
+        SELECT 
+            r.id, r.from_table_id, ft.name AS from_table_name,
+            r.from_column, r.to_table_id, tt.name AS to_table_name,
+            r.to_column, r.cardinality, r.relationship_type, 
+            r.created_at, r.er_entity_id
+        FROM er_relationships r
+        JOIN tables_metadata ft ON r.from_table_id = ft.id
+        JOIN tables_metadata tt ON r.to_table_id = tt.id
+        WHERE r.er_entity_id = :1
+        ORDER BY r.id
+    """
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute("""
-            SELECT 
-                r.id, r.from_table_id, ft.name AS from_table_name,
-                r.from_column, r.to_table_id, tt.name AS to_table_name,
-                r.to_column, r.cardinality, r.relationship_type, 
-                r.created_at, r.er_entity_id
-            FROM er_relationships r
-            JOIN tables_metadata ft ON r.from_table_id = ft.id
-            JOIN tables_metadata tt ON r.to_table_id = tt.id
-            WHERE r.er_entity_id = :1
-            ORDER BY r.id
-        """, [er_entity_id])
-        
-        columns = [desc[0].lower() for desc in cursor.description]
-        rows = cursor.fetchall()
-        relationships = []
-        
-        for row in rows:
-            relationship = dict(zip(columns, row))
-            if relationship['created_at']:
-                relationship['created_at'] = relationship['created_at'].isoformat()
-            relationship['display'] = f"{relationship['from_table_name']}.{relationship['from_column']} → {relationship['to_table_name']}.{relationship['to_column']}"
-            relationships.append(relationship)
-            
-        return jsonify(relationships), 200
+        if request.args.get('layout', '').lower() != 'true':
+            return json_list_response(sql, [er_entity_id], row=with_display)
+
+        with db.connection() as conn:
+            relationships = [with_display(r) for r in db.query_dicts(sql, [er_entity_id], conn=conn)]
+            pairs = {(r["from_table_id"], r["to_table_id"]) for r in relationships}
+            return jsonify({
+                "relationships": relationships,
+                "layout": er_layout.layout(conn, er_entity_id, pairs),
+            }), 200
 
     except Exception as e:
         logger.error(f"Error getting ER relationships for entity {er_entity_id}: {e}")
         return jsonify({'error': str(e)}), 500
-    finally:
-        if cursor:
-            cursor.close()
-        if conn:
-            conn.close()
 @app.route('/api/er_relationships/<string:database_name>', methods=['GET'])
 def get_all_er_relationships_inDB(database_name):
     """Retrieves all ER Relationships for a specific database."""
-    conn = None
-    cursor = None
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-
         # First verify if database exists
-        cursor.execute("""
+        if not db.query_one("""
             SELECT id FROM logical_databases 
             WHERE UPPER(name) = UPPER(:1)
-        """, [database_name])
-        
-        if not cursor.fetchone():
+        """, [database_name]):
             return jsonify({
                 "success": False,
                 "error": f"Database '{database_name}' not found",
@@ -1673,7 +1848,7 @@ def get_all_er_relationships_inDB(database_name):
             }), 404
 
         # Get relationships with table names
-        cursor.execute("""
+        return json_list_response("""
             SELECT 
                 er.id, 
                 er.from_table_id, 
@@ -1691,20 +1866,7 @@ def get_all_er_relationships_inDB(database_name):
             JOIN tables_metadata tt ON er.to_table_id = tt.id
             JOIN logical_databases db ON (ft.database_id = db.id OR tt.database_id = db.id)
             WHERE UPPER(db.name) = UPPER(:1)
-        """, [database_name])
-        
-        columns = [desc[0].lower() for desc in cursor.description]
-        rows = cursor.fetchall()
-        relationships = []
-        
-        for row in rows:
-            relationship = dict(zip(columns, row))
-            if relationship['created_at']:
-                relationship['created_at'] = relationship['created_at'].isoformat()
-            relationship['display'] = f"{relationship['from_table_name']}.{relationship['from_column']} → {relationship['to_table_name']}.{relationship['to_column']}"
-            relationships.append(relationship)
-            
-        return jsonify(relationships), 200
+        """, [database_name], row=with_display)
 
     except oracledb.Error as e:
         logger.error(f"Database error getting relationships for {database_name}: {e}")
@@ -1720,94 +1882,58 @@ def get_all_er_relationships_inDB(database_name):
             "error": str(e),
             "relationships": []
         }), 500
-    finally:
-        if cursor:
-            cursor.close()
-        if conn:
-            conn.close()
-
-@app.route('/api/tables/<table_name>/primary-key', methods=['GET'])
-def get_table_primary_key_columns(table_name):
-    """
-    Get only the primary key columns with detailed metadata for a specific table
-    
-    Parameters:
-    - table_name: Name of the table
-    
-    Returns:
-    - JSON object with primary key columns and their detailed metadata
-    """
-    try:
-        table_name_upper = table_name.upper()
-        
-        with get_db_connection() as conn:
-            cursor = conn.cursor()
-            
-            # Check if table exists
-            cursor.execute("""
-                SELECT TABLE_NAME FROM USER_TABLES WHERE TABLE_NAME = :1
-            """, [table_name_upper])
-            
-            if not cursor.fetchone():
-                return jsonify({
-                    'success': False,
-                    'error': f'Table {table_name} not found'
-                }), 404
-            
-            # Get primary key columns with detailed metadata
-            cursor.execute("""
-                SELECT 
-                    c.COLUMN_NAME,
-                    c.DATA_TYPE,
-                    c.DATA_LENGTH,
-                    c.DATA_PRECISION,
-                    c.DATA_SCALE,
-                    c.NULLABLE,
-                    c.COLUMN_ID,
-                    c.DATA_DEFAULT,
-                    cc.POSITION as PK_POSITION,
-                    cons.CONSTRAINT_NAME
-                FROM USER_TAB_COLUMNS c
-                JOIN USER_CONS_COLUMNS cc ON c.TABLE_NAME = cc.TABLE_NAME 
-                    AND c.COLUMN_NAME = cc.COLUMN_NAME
-                JOIN USER_CONSTRAINTS cons ON cc.CONSTRAINT_NAME = cons.CONSTRAINT_NAME
-                WHERE c.TABLE_NAME = :1 
-                    AND cons.CONSTRAINT_TYPE = 'P'
-                ORDER BY cc.POSITION
-            """, [table_name_upper])
-
-            results = cursor.fetchall()
-            
-            if not results:
-                return jsonify({
-                    'success': False,
-                    'error': f'Table {table_name} has no primary key'
-                }), 404
 
-            columns = []
-            constraint_name = results[0][9]  # All rows will have same constraint name
-            
-            for col in results:
-                columns.append({
-                    "name": col[0],
-                    "data_type": col[1],
-                    "length": col[2],
-                    "precision": col[3],
-                    "scale": col[4],
-                    "nullable": col[5],
-                    "position": col[6],
-                    "default": col[7] if col[7] else None,
-                    "pk_position": col[8]
-                })
+@app.route('/api/tables/<table_name>/primary-key', methods=['GET'])
+def get_table_primary_key_columns(table_name):
+    """
+    Get only the primary key columns with detailed metadata for a specific table
+    
+    Parameters:
+    - table_name: Name of the table
+    
+    Returns:
+    - JSON object with primary key columns and their detailed metadata
+    """
+    try:
+        table_name_upper = table_name.upper()
 
+        # Served from the schema snapshot rather than USER_CONSTRAINTS / USER_CONS_COLUMNS
+        primary_key = table_metadata.primary_key(table_name_upper)
+        if primary_key is None:
             return jsonify({
-                "success": True,
-                "table_name": table_name_upper,
-                "constraint_name": constraint_name,
-                "primary_key_columns": columns,
-                "count": len(columns)
+                'success': False,
+                'error': f'Table {table_name} not found'
+            }), 404
+
+        constraint_name, pk_columns = primary_key
+        if not pk_columns:
+            return jsonify({
+                'success': False,
+                'error': f'Table {table_name} has no primary key'
+            }), 404
+
+        columns = []
+        for col in pk_columns:
+            columns.append({
+                "name": col["name"],
+                "data_type": col["data_type"],
+                "length": col["length"],
+                "precision": col["precision"],
+                "scale": col["scale"],
+                "nullable": col["nullable"],
+                "position": col["position"],
+                "default": col["default"],
+                "pk_position": col["pk_position"]
             })
-            
+
+        return jsonify({
+            "success": True,
+            "table_name": table_name_upper,
+            "constraint_name": constraint_name,
+            "primary_key_columns": columns,
+            "count": len(columns)
+        })
+
     except Exception as e:
         return jsonify({
             'success': False,
@@ -1817,13 +1943,8 @@ def get_table_primary_key_columns(table_name):
 @app.route('/api/er_relationships/<string:database_name>/<int:table_id>', methods=['GET'])
 def get_all_er_relationships_inDB_tableid(database_name, table_id):
     """Get all ER relationships for a specific table in a database"""
-    conn = None
-    cursor = None
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        cursor.execute("""
+        return json_list_response("""
             SELECT
                 r.id,
                 r.from_table_id,
@@ -1840,75 +1961,47 @@ def get_all_er_relationships_inDB_tableid(database_name, table_id):
             JOIN tables_metadata tt ON r.to_table_id = tt.id
             WHERE (r.from_table_id = :1 OR r.to_table_id = :2)
             ORDER BY r.id
-        """, [table_id, table_id])
-        
-        columns = [desc[0].lower() for desc in cursor.description]
-        rows = cursor.fetchall()
-        relationships = []
-        
-        for row in rows:
-            relationship = dict(zip(columns, row))
-            if relationship['created_at']:
-                relationship['created_at'] = relationship['created_at'].isoformat()
-            relationship['display'] = f"{relationship['from_table_name']}.{relationship['from_column']} → {relationship['to_table_name']}.{relationship['to_column']}"
-            relationships.append(relationship)
-            
-        return jsonify(relationships), 200
+        """, [table_id, table_id], row=with_display)
 
     except Exception as e:
         logger.error(f"Error getting ER relationships for table {table_id}: {e}")
         return jsonify({'error': str(e)}), 500
-    finally:
-        if cursor:
-            cursor.close()
-        if conn:
-            conn.close()
 
 @app.route('/api/er_relationships/<int:rel_id>', methods=['GET'])
 def get_er_relationship_by_id(rel_id):
     """Retrieves an ER Relationship by ID."""
-    conn = None
-    cursor = None
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
+        with db.connection() as conn, db.cursor(conn, db.FETCH_SINGLE) as cursor:
         
-        cursor.execute("""
-            SELECT id, from_table_id, from_column, to_table_id, to_column, 
-                   cardinality, relationship_type, created_at 
-            FROM er_relationships 
-            WHERE id = :1
-        """, [rel_id])
-        
-        result = cursor.fetchone()
-        if not result:
-            return jsonify({'error': f'ER Relationship with ID {rel_id} not found'}), 404
+            cursor.execute("""
+                SELECT id, from_table_id, from_column, to_table_id, to_column, 
+                       cardinality, relationship_type, created_at 
+                FROM er_relationships 
+                WHERE id = :1
+            """, [rel_id])
+        
+            result = cursor.fetchone()
+            if not result:
+                return jsonify({'error': f'ER Relationship with ID {rel_id} not found'}), 404
             
-        return jsonify({
-            'id': result[0],
-            'from_table_id': result[1],
-            'from_column': result[2],
-            'to_table_id': result[3],
-            'to_column': result[4],
-            'cardinality': result[5],
-            'relationship_type': result[6],
-            'created_at': result[7].isoformat() if result[7] else None
-        }), 200
+            return jsonify({
+                'id': result[0],
+                'from_table_id': result[1],
+                'from_column': result[2],
+                'to_table_id': result[3],
+                'to_column': result[4],
+                'cardinality': result[5],
+                'relationship_type': result[6],
+                'created_at': result[7].isoformat() if result[7] else None
+            }), 200
 
     except Exception as e:
         logger.error(f"Error getting ER relationship {rel_id}: {e}")
         return jsonify({'error': str(e)}), 500
-    finally:
-        if cursor:
-            cursor.close()
-        if conn:
-            conn.close()
 
 @app.route('/api/er_relationships/<int:rel_id>', methods=['PUT'])
 def update_er_relationship(rel_id):
     """Updates an existing ER Relationship."""
-    conn = None
-    cursor = None
     try:
         data = request.get_json()
         updates = []
@@ -1951,192 +2044,195 @@ def update_er_relationship(rel_id):
         if not updates:
             return jsonify({'error': 'No fields provided for update'}), 400
 
-        conn = get_db_connection()
-        cursor = conn.cursor()
+        with db.connection() as conn, db.cursor(conn) as cursor:
         
-        # Execute update with RETURNING clause
-        update_sql = f"""
-            UPDATE er_relationships 
-            SET {', '.join(updates)}
-            WHERE id = :id
-            RETURNING id INTO :return_id
-        """
+            # Execute update with RETURNING clause
+            update_sql = f"""
+                UPDATE er_relationships 
+                SET {', '.join(updates)}
+                WHERE id = :id
+                RETURNING id INTO :return_id
+            """
         
-        return_id_var = cursor.var(oracledb.NUMBER)
-        bind_values = dict(zip(bind_names, params))
-        bind_values['id'] = rel_id
-        bind_values['return_id'] = return_id_var
+            return_id_var = cursor.var(oracledb.NUMBER)
+            bind_values = dict(zip(bind_names, params))
+            bind_values['id'] = rel_id
+            bind_values['return_id'] = return_id_var
         
-        cursor.execute(update_sql, bind_values)
+            cursor.execute(update_sql, bind_values)
         
-        if return_id_var.getvalue():
-            conn.commit()
-            return jsonify({
-                'message': f'ER Relationship with ID {rel_id} updated successfully'
-            }), 200
-        else:
-            return jsonify({
-                'error': f'ER Relationship with ID {rel_id} not found'
-            }), 404
+            if return_id_var.getvalue():
+                conn.commit()
+                er_graph.refresh_relationship(rel_id, conn)
+                return jsonify({
+                    'message': f'ER Relationship with ID {rel_id} updated successfully'
+                }), 200
+            else:
+                return jsonify({
+                    'error': f'ER Relationship with ID {rel_id} not found'
+                }), 404
 
     except oracledb.IntegrityError as e:
-        if conn:
-            conn.rollback()
         logger.error(f"Database integrity error: {e}")
         return jsonify({
             'error': f"Database constraint violated: {str(e)}"
         }), 409
     except oracledb.Error as e:
-        if conn:
-            conn.rollback()
         logger.error(f"Database error: {e}")
         return jsonify({
             'error': f"Database error: {str(e)}"
         }), 500
     except Exception as e:
-        if conn:
-            conn.rollback()
         logger.error(f"Unexpected error: {e}")
         return jsonify({
             'error': str(e)
         }), 500
-    finally:
-        if cursor:
-            cursor.close()
-        if conn:
-            conn.close()
 
 @app.route('/api/er_relationships/<int:rel_id>', methods=['DELETE'])
 def delete_er_relationship(rel_id):
     """Deletes an ER Relationship by ID."""
-    conn = None
-    cursor = None
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        deleted_id_var = cursor.var(oracledb.NUMBER)
-        cursor.execute("""
-            DELETE FROM er_relationships 
-            WHERE id = :1
-            RETURNING id INTO :2
-        """, [rel_id, deleted_id_var])
+        with db.connection() as conn, db.cursor(conn) as cursor:
         
-        if deleted_id_var.getvalue():
-            conn.commit()
-            logger.info(f"Successfully deleted ER relationship with ID {rel_id}")
-            return jsonify({
-                'message': f'ER Relationship with ID {rel_id} deleted successfully'
-            }), 200
-        else:
-            logger.warning(f"ER Relationship with ID {rel_id} not found")
-            return jsonify({
-                'error': f'ER Relationship with ID {rel_id} not found'
-            }), 404
+            deleted_id_var = cursor.var(oracledb.NUMBER)
+            cursor.execute("""
+                DELETE FROM er_relationships 
+                WHERE id = :1
+                RETURNING id INTO :2
+            """, [rel_id, deleted_id_var])
+        
+            if deleted_id_var.getvalue():
+                conn.commit()
+                er_graph.refresh_relationship(rel_id, conn)
+                logger.info(f"Successfully deleted ER relationship with ID {rel_id}")
+                return jsonify({
+                    'message': f'ER Relationship with ID {rel_id} deleted successfully'
+                }), 200
+            else:
+                logger.warning(f"ER Relationship with ID {rel_id} not found")
+                return jsonify({
+                    'error': f'ER Relationship with ID {rel_id} not found'
+                }), 404
 
     except oracledb.IntegrityError as e:
-        if conn:
-            conn.rollback()
         logger.error(f"Database integrity error: {e}")
         return jsonify({
             'error': f"Database constraint violated: {str(e)}"
         }), 409
     except oracledb.Error as e:
-        if conn:
-            conn.rollback()
         logger.error(f"Database error: {e}")
         return jsonify({
             'error': f"Database error: {str(e)}"
         }), 500
     except Exception as e:
-        if conn:
-            conn.rollback()
         logger.error(f"Unexpected error: {e}")
         return jsonify({
             'error': 'Internal server error'
         }), 500
-    finally:
-        if cursor:
-            cursor.close()
-        if conn:
-            conn.close()
-# @app.route('/api/search')
-# def search():
-#     """Search across all entities (LOBs, Subject Areas, Databases, Tables) with lineage"""
-#     conn = None
-#     cursor = None
-#     query = request.args.get('q', '').strip()
-#     results = []
 
-#     if not query:
-#         return jsonify(results)
 
-#     try:
-#         conn = get_db_connection()
-#         cursor = conn.cursor()
-        
-#         # Modified query with LEFT JOINs to ensure we get results even if relationships don't exist
-#         cursor.execute("""
-#             SELECT 'LOB' AS type, l.id, l.name,
-#                    NULL AS lob, NULL AS subject, NULL AS database
-#             FROM lobs l
-#             WHERE UPPER(l.name) LIKE UPPER(:1)
-
-#             UNION ALL
-
-#             SELECT 'Subject Area', s.id, s.name,
-#                    l.name AS lob, NULL AS subject, NULL AS database
-#             FROM subject_areas s
-#             LEFT JOIN lobs l ON s.lob_id = l.id
-#             WHERE UPPER(s.name) LIKE UPPER(:2)
-
-#             UNION ALL
-
-#             SELECT 'Database', d.id, d.name,
-#                    l.name AS lob, s.name AS subject, NULL AS database
-#             FROM logical_databases d
-#             LEFT JOIN subject_area_logical_database sald ON d.id = sald.logical_database_id
-#             LEFT JOIN subject_areas s ON sald.subject_area_id = s.id
-#             LEFT JOIN lobs l ON s.lob_id = l.id
-#             WHERE UPPER(d.name) LIKE UPPER(:3)
-
-#             UNION ALL
-
-#             SELECT 'Table', t.id, t.name,
-#                    l.name AS lob, s.name AS subject, d.name AS database
-#             FROM tables_metadata t
-#             LEFT JOIN logical_databases d ON t.database_id = d.id
-#             LEFT JOIN subject_area_logical_database sald ON d.id = sald.logical_database_id
-#             LEFT JOIN subject_areas s ON sald.subject_area_id = s.id
-#             LEFT JOIN lobs l ON s.lob_id = l.id
-#             WHERE UPPER(t.name) LIKE UPPER(:4)
-#         """, [f"%{query}%", f"%{query}%", f"%{query}%", f"%{query}%"])
-        
-#         columns = ['type', 'id', 'name', 'lob', 'subject', 'database']
-#         rows = cursor.fetchall()
-        
-#         for row in rows:
-#             results.append(dict(zip(columns, row)))
-
-#         return jsonify(results)
-
-#     except oracledb.Error as e:
-#         logger.error(f"Database error in search: {e}")
-#         return jsonify({"error": str(e)}), 500
-#     except Exception as e:
-#         logger.error(f"Unexpected error in search: {e}")
-#         return jsonify({"error": str(e)}), 500
-#     finally:
-#         if cursor:
-#             cursor.close()
-#         if conn:
-#             conn.close()
+def er_graph_response(name, query):
+    """Run an er_graph query, answering 404 when it returns None for an unknown table"""
+    try:
+        result = query()
+        if result is None:
+            return jsonify({"error": f"{name} is not part of any ER relationship"}), 404
+        return jsonify(result), 200
+    except oracledb.Error as e:
+        logger.error(f"Database error building ER graph: {e}")
+        return jsonify({"error": f"Database error: {str(e)}"}), 500
+    except Exception as e:
+        logger.error(f"Unexpected error querying ER graph: {e}")
+        return jsonify({"error": str(e)}), 500
+
+
+@app.route('/api/er_graph/neighborhood/<string:table>', methods=['GET'])
+def get_er_graph_neighborhood(table):
+    """Tables within ?hops= (default 1) relationships of a table given by id or name, and the edges among them"""
+    hops = request.args.get('hops', 1, type=int)
+    er_entity_id = request.args.get('er_entity_id', type=int)
+    return er_graph_response(f"Table {table}", lambda: er_graph.neighborhood(table, max(hops, 0), er_entity_id))
+
+
+@app.route('/api/er_graph/path', methods=['GET'])
+def get_er_graph_path():
+    """Shortest chain of relationships between ?from= and ?to= tables (ids or names)"""
+    from_table, to_table = request.args.get('from'), request.args.get('to')
+    if not from_table or not to_table:
+        return jsonify({"error": "'from' and 'to' are required"}), 400
+    er_entity_id = request.args.get('er_entity_id', type=int)
+    return er_graph_response(
+        f"Table {from_table} or {to_table}",
+        lambda: er_graph.shortest_path(from_table, to_table, er_entity_id)
+    )
+
+
+@app.route('/api/er_graph/components', methods=['GET'])
+def get_er_graph_components():
+    """Groups of tables connected through relationships, largest first"""
+    er_entity_id = request.args.get('er_entity_id', type=int)
+    return er_graph_response("Graph", lambda: er_graph.components(er_entity_id))
+
+
+@app.route('/api/er_graph/impact/<string:table>', methods=['GET'])
+def get_er_graph_impact(table):
+    """Tables that reference a table directly or through other tables, up to ?max_depth= levels"""
+    max_depth = request.args.get('max_depth', er_graph.ER_GRAPH_MAX_HOPS, type=int)
+    er_entity_id = request.args.get('er_entity_id', type=int)
+    return er_graph_response(f"Table {table}", lambda: er_graph.impact(table, max(max_depth, 0), er_entity_id))
+
+
+@app.route('/api/er_graph', methods=['GET'])
+def get_er_graph_status():
+    """Size and age of the in-memory ER graph"""
+    return jsonify(er_graph.status()), 200
+
+
+@app.route('/api/er_graph', methods=['POST'])
+def start_er_graph_rebuild():
+    """Rebuild the ER graph from er_relationships, e.g. after changes made outside this server"""
+    if not er_graph.trigger():
+        return jsonify({"message": "ER graph rebuild already running"}), 409
+    return jsonify({"message": "ER graph rebuild started"}), 202
+
+
+@app.route('/api/er_layouts/<int:er_entity_id>', methods=['GET'])
+def get_er_layout(er_entity_id):
+    """Ready-to-render node positions of an ER entity's diagram, updated for relationships changed since it was stored"""
+    try:
+        with db.connection() as conn:
+            return jsonify(er_layout.layout(conn, er_entity_id)), 200
+    except oracledb.Error as e:
+        logger.error(f"Database error getting layout of ER entity {er_entity_id}: {e}")
+        return jsonify({"error": f"Database error: {str(e)}"}), 500
+    except Exception as e:
+        logger.error(f"Unexpected error getting layout of ER entity {er_entity_id}: {e}")
+        return jsonify({"error": str(e)}), 500
+
+
+@app.route('/api/er_layouts/<int:er_entity_id>', methods=['POST'])
+def relayout_er_diagram(er_entity_id):
+    """Discard an ER entity's stored layout and lay the whole diagram out again"""
+    try:
+        with db.connection() as conn:
+            return jsonify(er_layout.layout(conn, er_entity_id, relayout=True)), 200
+    except oracledb.Error as e:
+        logger.error(f"Database error laying out ER entity {er_entity_id}: {e}")
+        return jsonify({"error": f"Database error: {str(e)}"}), 500
+    except Exception as e:
+        logger.error(f"Unexpected error laying out ER entity {er_entity_id}: {e}")
+        return jsonify({"error": str(e)}), 500
+
 
 @app.route('/api/search')
 def search():
-    """Search across all entities (LOBs, Subject Areas, Databases, Tables) with lineage"""
-    conn = None
-    cursor = None
+    """
+    Search across all entities (LOBs, Subject Areas, Databases, Tables) with lineage.
+
+    Served from the in-process search index, ranked and capped at ?limit=.
+    ?types= takes a comma-separated list of entity types, including Column,
+    or "all".
+    """
     query = request.args.get('q', '').strip()
     results = []
 
@@ -2144,64 +2240,66 @@ def search():
         return jsonify(results)
 
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        cursor.execute("""
-            SELECT 'LOB' AS type, l.id, l.name,
-                   NULL AS lob, NULL AS subject, NULL AS database
-            FROM lobs l
-            WHERE UPPER(l.name) LIKE UPPER(:1)
+        limit = int(request.args.get('limit', search_index.SEARCH_DEFAULT_LIMIT))
+    except ValueError:
+        return jsonify({"error": "'limit' must be an integer"}), 400
+
+    types = request.args.get('types')
+    if not types:
+        types = search_index.ENTITY_TYPES
+    elif types == "all":
+        types = search_index.TYPE_ORDER
+    else:
+        types = tuple(t.strip() for t in types.split(","))
+        unknown = [t for t in types if t not in search_index.TYPE_ORDER]
+        if unknown:
+            return jsonify({"error": f"Unknown types: {', '.join(unknown)}"}), 400
 
-            UNION ALL
+    try:
+        results = search_index.search(query, types, max(limit, 1))
+        return jsonify(results)
 
-            SELECT 'Subject Area', s.id, s.name,
-                   l.name AS lob, NULL AS subject, NULL AS database
-            FROM subject_areas s
-            JOIN lobs l ON s.lob_id = l.id
-            WHERE UPPER(s.name) LIKE UPPER(:2)
+    except oracledb.Error as e:
+        logger.error(f"Database error in search: {e}")
+        return jsonify({"error": str(e)}), 500
+    except Exception as e:
+        logger.error(f"Unexpected error in search: {e}")
+        return jsonify({"error": str(e)}), 500
 
-            UNION ALL
 
-            SELECT 'Database', d.id, d.name,
-                   l.name AS lob, s.name AS subject, NULL AS database
-            FROM logical_databases d
-            JOIN subject_area_logical_database sald ON d.id = sald.logical_database_id
-            JOIN subject_areas s ON sald.subject_area_id = s.id
-            JOIN lobs l ON s.lob_id = l.id
-            WHERE UPPER(d.name) LIKE UPPER(:3)
+@app.route('/api/search/columns', methods=['GET'])
+def search_columns():
+    """
+    Find columns by name across all catalog tables, e.g. every table with a CUSTOMER_ID.
 
-            UNION ALL
+    Served from the precomputed column index, never the dictionary views.
+    ?table= limits matches to one table and ?data_type= to a data type prefix
+    (e.g. NUMBER, VARCHAR2, TIMESTAMP).
+    """
+    query = request.args.get('q', '').strip()
+    if not query:
+        return jsonify([])
 
-            SELECT 'Table', t.id, t.name,
-                   l.name AS lob, s.name AS subject, d.name AS database
-            FROM tables_metadata t
-            JOIN logical_databases d ON t.database_id = d.id
-            JOIN subject_area_logical_database sald ON d.id = sald.logical_database_id
-            JOIN subject_areas s ON sald.subject_area_id = s.id
-            JOIN lobs l ON s.lob_id = l.id
-            WHERE UPPER(t.name) LIKE UPPER(:4)
-        """, [f"%{query}%", f"%{query}%", f"%{query}%", f"%{query}%"])
-        
-        columns = ['type', 'id', 'name', 'lob', 'subject', 'database']
-        rows = cursor.fetchall()
-        
-        for row in rows:
-            results.append(dict(zip(columns, row)))
+    try:
+        limit = int(request.args.get('limit', search_index.SEARCH_DEFAULT_LIMIT))
+    except ValueError:
+        return jsonify({"error": "'limit' must be an integer"}), 400
 
+    try:
+        results = column_index.search(
+            query,
+            table=request.args.get('table'),
+            data_type=request.args.get('data_type'),
+            limit=max(limit, 1)
+        )
         return jsonify(results)
 
     except oracledb.Error as e:
-        logger.error(f"Database error in search: {e}")
+        logger.error(f"Database error in column search: {e}")
         return jsonify({"error": str(e)}), 500
     except Exception as e:
-        logger.error(f"Unexpected error in search: {e}")
+        logger.error(f"Unexpected error in column search: {e}")
         return jsonify({"error": str(e)}), 500
-    finally:
-        if cursor:
-            cursor.close()
-        if conn:
-            conn.close()
 # @app.route("/api/profile", methods=["POST"])
 # def profile_table():
 #     try:
@@ -2228,78 +2326,70 @@ def search():
 @app.route("/api/tables/<int:table_id>", methods=["DELETE"])
 def delete_table(table_id):
     """Delete a table, its metadata, and all associated ER relationships."""
-    conn = None
-    cursor = None
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
+        with db.connection() as conn, db.cursor(conn, db.FETCH_SINGLE) as cursor:
 
-        # Step 1: Get table metadata
-        cursor.execute("""
-            SELECT name, schema_name 
-            FROM tables_metadata 
-            WHERE id = :1
-        """, [table_id])
-        table_row = cursor.fetchone()
-        if not table_row:
-            return jsonify({"error": "Table not found in metadata"}), 404
-
-        table_name = table_row[0]
-        schema_name = table_row[1]
-
-        # Step 2: Delete all ER relationships involving this table
-        cursor.execute("""
-            DELETE FROM er_relationships 
-            WHERE from_table_id = :1 OR to_table_id = :2
-        """, [table_id, table_id])
-        relationships_deleted = cursor.rowcount
+            # Step 1: Get table metadata
+            cursor.execute("""
+                SELECT name, schema_name 
+                FROM tables_metadata 
+                WHERE id = :1
+            """, [table_id])
+            table_row = cursor.fetchone()
+            if not table_row:
+                return jsonify({"error": "Table not found in metadata"}), 404
+
+            table_name = table_row[0]
+            schema_name = table_row[1]
+
+            # Step 2: Delete all ER relationships involving this table
+            cursor.execute("""
+                DELETE FROM er_relationships 
+                WHERE from_table_id = :1 OR to_table_id = :2
+            """, [table_id, table_id])
+            relationships_deleted = cursor.rowcount
 
-        # Step 3: Drop the actual table from Oracle
-        try:
-            drop_sql = f'DROP TABLE "{table_name}" CASCADE CONSTRAINTS'
-            cursor.execute(drop_sql)
-        except oracledb.DatabaseError as e:
-            conn.rollback()
-            logger.error(f"Failed to drop table: {e}")
-            return jsonify({
-                "error": f"Failed to drop table from database: {str(e)}"
-            }), 500
+            # Step 3: Drop the actual table from Oracle
+            try:
+                drop_sql = f'DROP TABLE "{table_name}" CASCADE CONSTRAINTS'
+                cursor.execute(drop_sql)
+            except oracledb.DatabaseError as e:
+                conn.rollback()
+                logger.error(f"Failed to drop table: {e}")
+                return jsonify({
+                    "error": f"Failed to drop table from database: {str(e)}"
+                }), 500
 
-        # Step 4: Remove table metadata
-        cursor.execute("""
-            DELETE FROM tables_metadata 
-            WHERE name = :1
-        """, [table_name])
-        if cursor.rowcount == 0:
-            conn.rollback()
-            return jsonify({"error": "Failed to delete table metadata"}), 500
-
-        conn.commit()
-        return jsonify({
-            "message": f"Table {table_name} deleted successfully",
-            "table_id": table_id,
-            "relationships_deleted": relationships_deleted
-        }), 200
+            # Step 4: Remove table metadata
+            cursor.execute("""
+                DELETE FROM tables_metadata 
+                WHERE name = :1
+            """, [table_name])
+            if cursor.rowcount == 0:
+                conn.rollback()
+                return jsonify({"error": "Failed to delete table metadata"}), 500
+
+            conn.commit()
+            hierarchy_cache.invalidate()
+            schema_snapshot.mark_stale(table_name)
+            search_index.refresh_entity("Table", table_id, conn)
+            er_graph.remove_table(table_id)
+            return jsonify({
+                "message": f"Table {table_name} deleted successfully",
+                "table_id": table_id,
+                "relationships_deleted": relationships_deleted
+            }), 200
 
     except oracledb.DatabaseError as e:
-        if conn:
-            conn.rollback()
         logger.error(f"Database error deleting table: {e}")
         return jsonify({
             "error": f"Database error: {str(e)}"
         }), 500
     except Exception as e:
-        if conn:
-            conn.rollback()
         logger.error(f"Unexpected error deleting table: {e}")
         return jsonify({
             "error": f"Failed to delete table: {str(e)}"
         }), 500
-    finally:
-        if cursor:
-            cursor.close()
-        if conn:
-            conn.close()
 
 # @app.route("/api/table-overview/<string:table_name>", methods=["GET"])
 # def table_overview(table_name):
@@ -2571,438 +2661,192 @@ def delete_table(table_id):
 #         return jsonify({"error": str(e)}), 500
 @app.route("/api/table-overview/<string:table_name>", methods=["GET"])
 def table_overview(table_name):
-    conn = None
-    cursor = None
-    try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        table_name_upper = table_name.upper()
-
-        # ✅ Step 1: Gather fresh statistics to get accurate NUM_ROWS
-        try:
-            cursor.callproc("DBMS_STATS.GATHER_TABLE_STATS", [conn.username.upper(), table_name_upper])
-            conn.commit()  # optional, ensures stats persist
-        except oracledb.DatabaseError as stats_err:
-            logger.warning(f"Could not gather stats for {table_name_upper}: {stats_err}")
+    """
+    Columns, constraints, indexes, size, triggers and comments for one table.
 
-        # ✅ Step 2: Get basic table metadata
-        cursor.execute("""
-            SELECT TABLE_NAME, NUM_ROWS, TABLESPACE_NAME, 
-                   BLOCKS, EMPTY_BLOCKS, LAST_ANALYZED
-            FROM USER_TABLES 
-            WHERE TABLE_NAME = :1
-        """, [table_name_upper])
-        
-        table_info = cursor.fetchone()
-        if not table_info:
+    Served from the schema snapshot; only a table that is missing from it or
+    marked stale is harvested from the dictionary. Statistics are kept fresh
+    by the stats_refresh scheduler, so only report how old they are.
+    """
+    try:
+        overview = table_metadata.overview(table_name)
+        if overview is None:
             return jsonify({"error": f"Table '{table_name}' not found"}), 404
 
-        table_data = {
-            "table_name": table_info[0],
-            "num_rows": table_info[1],
-            "tablespace": table_info[2],
-            "blocks": table_info[3],
-            "empty_blocks": table_info[4],
-            "last_analyzed": str(table_info[5]) if table_info[5] else None
-        }
-
-        # ✅ Step 3: Primary key columns
-        cursor.execute("""
-            SELECT cols.column_name
-            FROM user_constraints cons
-            JOIN user_cons_columns cols ON cons.constraint_name = cols.constraint_name
-            WHERE cons.table_name = :1
-            AND cons.constraint_type = 'P'
-        """, [table_name_upper])
-        pk_columns = {row[0] for row in cursor.fetchall()}
-
-        # ✅ Step 4: Foreign key columns
-        cursor.execute("""
-            SELECT cols.column_name
-            FROM user_constraints cons
-            JOIN user_cons_columns cols ON cons.constraint_name = cols.constraint_name
-            WHERE cons.table_name = :1
-            AND cons.constraint_type = 'R'
-        """, [table_name_upper])
-        fk_columns = {row[0] for row in cursor.fetchall()}
-
-        # ✅ Step 5: Detailed column metadata
-        cursor.execute("""
-            SELECT 
-                c.COLUMN_NAME,
-                c.DATA_TYPE,
-                c.DATA_LENGTH,
-                c.DATA_PRECISION,
-                c.DATA_SCALE,
-                c.NULLABLE,
-                c.COLUMN_ID,
-                c.DATA_DEFAULT
-            FROM USER_TAB_COLUMNS c
-            WHERE c.TABLE_NAME = :1
-            ORDER BY c.COLUMN_ID
-        """, [table_name_upper])
-
-        columns = []
-        for col in cursor.fetchall():
-            columns.append({
-                "name": col[0],
-                "data_type": col[1],
-                "length": col[2],
-                "precision": col[3],
-                "scale": col[4],
-                "nullable": col[5],
-                "position": col[6],
-                "default": col[7] if col[7] else None,
-                "primary_key": "Y" if col[0] in pk_columns else "N",
-                "foreign_key": "Y" if col[0] in fk_columns else "N"
-            })
-
-        return jsonify({
-            "table": table_data,
-            "columns": columns
-        })
+        table_data = overview["table"]
+        last_analyzed = table_data["last_analyzed"]
+        table_data["last_analyzed"] = str(last_analyzed) if last_analyzed else None
+        table_data["stats_age_seconds"] = stats_refresh.stats_age_seconds(last_analyzed)
+        return jsonify(overview)
 
     except Exception as e:
         logger.error(f"Error in table_overview: {str(e)}")
         return jsonify({"error": str(e)}), 500
-    finally:
-        if cursor:
-            cursor.close()
-        if conn:
-            conn.close()
-    """Get comprehensive table overview including metadata, columns, constraints, etc."""
-    conn = None
-    cursor = None
-    try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        table_name_upper = table_name.upper()
-
-        # 1. Table Metadata with Comments
-        cursor.execute("""
-            SELECT t.TABLE_NAME, t.NUM_ROWS, t.TABLESPACE_NAME, 
-                   t.BLOCKS, t.EMPTY_BLOCKS, t.LAST_ANALYZED,
-                   c.COMMENTS AS table_comment
-            FROM USER_TABLES t
-            LEFT JOIN USER_TAB_COMMENTS c ON t.table_name = c.table_name
-            WHERE t.TABLE_NAME = :1
-        """, (table_name_upper,))
-        table_info = cursor.fetchone()
-
-        if not table_info:
-            return jsonify({"error": f"Table '{table_name}' not found"}), 404
-
-        table_data = {
-            "table_name": table_info[0],
-            "num_rows": table_info[1],
-            "tablespace": table_info[2],
-            "blocks": table_info[3],
-            "empty_blocks": table_info[4],
-            "last_analyzed": str(table_info[5]) if table_info[5] else None,
-            "comment": table_info[6]
-        }
-
-        # 2. Enhanced Column Metadata with Comments
-                # 2. Column-level metadata (with comments)
-        cursor.execute("""
-            SELECT
-                c.column_name,
-                c.data_type,
-                c.data_length,
-                c.data_precision,
-                c.data_scale,
-                c.nullable,
-                c.column_id,
-                c.data_default,
-                cm.comments
-            FROM user_tab_columns c
-            LEFT JOIN user_col_comments cm
-                ON c.table_name = cm.table_name AND c.column_name = cm.column_name
-            WHERE c.table_name = :1
-            ORDER BY c.column_id
-        """, (table_name_upper,))
-        
-        columns = [
-            {
-                "name": col[0],
-                "data_type": col[1],
-                "length": col[2],
-                "precision": col[3],
-                "scale": col[4],
-                "nullable": col[5],
-                "position": col[6],
-                "default": col[7],
-                "virtual_column": col[8],
-                "comment": col[9],
-                "char_length": col[10],
-                "char_used": col[11]
-            }
-            for col in cursor.fetchall()
-        ]
 
-        # 3. Constraints
-        cursor.execute("""
-            SELECT c.CONSTRAINT_NAME, c.CONSTRAINT_TYPE, 
-                   col.COLUMN_NAME, c.STATUS, c.VALIDATED,
-                   c.SEARCH_CONDITION
-            FROM USER_CONSTRAINTS c
-            JOIN USER_CONS_COLUMNS col ON c.CONSTRAINT_NAME = col.CONSTRAINT_NAME
-            WHERE c.TABLE_NAME = :1
-        """, (table_name_upper,))
-        constraints = [
-            {
-                "name": row[0],
-                "type": row[1],
-                "column": row[2],
-                "status": row[3],
-                "validated": row[4],
-                "condition": row[5]
-            }
-            for row in cursor.fetchall()
-        ]
-
-        # 4. Indexes with Column Details
-        cursor.execute("""
-            SELECT INDEX_NAME, UNIQUENESS, INDEX_TYPE, COMPRESSION
-            FROM USER_INDEXES
-            WHERE TABLE_NAME = :1
-        """, (table_name_upper,))
-        indexes = []
-        for idx in cursor.fetchall():
-            index_name, uniqueness, index_type, compression = idx
-            cursor.execute("""
-                SELECT COLUMN_NAME, COLUMN_POSITION, DESCEND, COLUMN_EXPRESSION
-                FROM USER_IND_COLUMNS
-                WHERE INDEX_NAME = :1
-                ORDER BY COLUMN_POSITION
-            """, (index_name,))
-            columns = cursor.fetchall()
-            indexes.append({
-                "index_name": index_name,
-                "uniqueness": uniqueness,
-                "type": index_type,
-                "compression": compression,
-                "columns": [
-                    {
-                        "column_name": c[0],
-                        "position": c[1],
-                        "descend": c[2],
-                        "expression": c[3]
-                    }
-                    for c in columns
-                ]
-            })
+def table_export_response(schema, table, fmt, compress=False):
+    """Streaming download of a table in one of table_export.EXPORT_FORMATS"""
+    try:
+        query = table_export.export_query(table)
+    except Exception as e:
+        logger.error(f"Error preparing {fmt} export of {schema}.{table}: {e}")
+        return jsonify({"error": f"Failed to export table: {str(e)}"}), 500
+    if query is None:
+        return jsonify({"error": f"Table {schema}.{table} not found"}), 404
+
+    mimetype, extension = table_export.EXPORT_FORMATS[fmt]
+    if compress:
+        mimetype, extension = "application/gzip", f"{extension}.gz"
+    return Response(
+        table_export.iter_export(query, fmt, compress),
+        mimetype=mimetype,
+        headers={
+            "Content-Disposition": f"attachment; filename={table}.{extension}",
+            # Let proxies pass batches through as they are produced
+            "X-Accel-Buffering": "no",
+        },
+    )
+
+
+@app.route("/api/table-csv/<string:schema>/<string:table>", methods=["GET"])
+def download_table_csv(schema, table):
+    """
+    Stream a table's rows as CSV.
 
-        # 5. Size Info
-        cursor.execute("""
-            SELECT BYTES/1024 AS SIZE_KB, BLOCKS, INITIAL_EXTENT, NEXT_EXTENT
-            FROM USER_SEGMENTS
-            WHERE SEGMENT_NAME = :1
-        """, (table_name_upper,))
-        size_row = cursor.fetchone()
-        size_info = {
-            "size_kb": size_row[0] if size_row else None,
-            "blocks": size_row[1] if size_row else None,
-            "initial_extent": size_row[2] if size_row else None,
-            "next_extent": size_row[3] if size_row else None
-        }
+    Rows are fetched and written in batches, so memory stays flat for any
+    table size and the download starts immediately. ?compress=gzip sends a
+    gzipped .csv.gz instead.
+    """
+    compress = request.args.get("compress", "").lower() == "gzip"
+    return table_export_response(schema, table, "csv", compress)
 
-        # 6. Triggers
-        cursor.execute("""
-            SELECT TRIGGER_NAME, TRIGGER_TYPE, TRIGGERING_EVENT, 
-                   STATUS, TRIGGER_BODY, DESCRIPTION
-            FROM USER_TRIGGERS
-            WHERE TABLE_NAME = :1
-        """, (table_name_upper,))
-        triggers = [
-            {
-                "trigger_name": row[0],
-                "trigger_type": row[1],
-                "event": row[2],
-                "status": row[3],
-                "body": row[4],
-                "description": row[5]
-            }
-            for row in cursor.fetchall()
-        ]
 
-        # 7. Object Info
-        cursor.execute("""
-            SELECT OBJECT_NAME, OBJECT_TYPE, STATUS, 
-                   CREATED, LAST_DDL_TIME, TIMESTAMP
-            FROM USER_OBJECTS
-            WHERE OBJECT_NAME = :1
-        """, (table_name_upper,))
-        object_row = cursor.fetchone()
-        object_info = {
-            "name": object_row[0],
-            "type": object_row[1],
-            "status": object_row[2],
-            "created": str(object_row[3]) if object_row[3] else None,
-            "last_ddl_time": str(object_row[4]) if object_row[4] else None,
-            "timestamp": str(object_row[5]) if object_row[5] else None
-        } if object_row else {}
+@app.route("/api/table-export/<string:schema>/<string:table>", methods=["GET"])
+def download_table_export(schema, table):
+    """
+    Stream a table's rows as ?format=parquet (default), arrow (IPC stream) or csv.
 
+    Fetch batches are converted straight to Arrow record batches and written
+    as Parquet row groups or Arrow stream batches as they arrive.
+    """
+    fmt = request.args.get("format", "parquet").lower()
+    if fmt not in table_export.EXPORT_FORMATS:
         return jsonify({
-            "table": table_data,
-            "columns": columns,
-            "constraints": constraints,
-            "indexes": indexes,
-            "size_info": size_info,
-            "triggers": triggers,
-            "object_info": object_info
-        })
+            "error": f"Unknown format '{fmt}'; expected one of {', '.join(table_export.EXPORT_FORMATS)}"
+        }), 400
+    compress = fmt == "csv" and request.args.get("compress", "").lower() == "gzip"
+    return table_export_response(schema, table, fmt, compress)
+
 
-    except Exception as e:
-        logger.error(f"Error getting table overview: {str(e)}")
-        return jsonify({"error": str(e)}), 500
-    finally:
-        if cursor:
-            cursor.close()
-        if conn:
-            conn.close()
-
-# @app.route("/api/table-csv/<string:schema>/<string:table>", methods=["GET"])
-# def download_table_csv(schema, table):
-#     """Download table data as CSV."""
-#     try:
-#         # First check if table exists
-#         cursor.execute("""
-#             SELECT EXISTS (
-#                 SELECT FROM information_schema.tables 
-#                 WHERE table_schema = %s AND table_name = %s
-#             );
-#         """, (schema, table))
-#         exists = cursor.fetchone()[0]
-#         if not exists:
-#             return jsonify({"error": f"Table {schema}.{table} not found"}), 404
-
-#         # Use pandas with chunks for large tables
-#         with conn.cursor() as cur:
-#             cur.execute(
-#                 sql.SQL("SELECT * FROM {}.{}").format(
-#                     sql.Identifier(schema), sql.Identifier(table)
-#                 )
-#             )
-#             # Fetch column names
-#             columns = [desc[0] for desc in cur.description]
-            
-#             # Fetch all data
-#             data = cur.fetchall()
-            
-#             # Create DataFrame
-#             df = pd.DataFrame(data, columns=columns)
-#             csv_data = df.to_csv(index=False)
-
-#             return Response(
-#                 csv_data,
-#                 mimetype='text/csv',
-#                 headers={
-#                     'Content-Disposition': f'attachment; filename={table}.csv',
-#                     'Content-Type': 'text/csv; charset=utf-8'
-#                 }
-#             )
-#     except Exception as e:
-#         print(f"Error downloading CSV: {str(e)}")  # For debugging
-#         return jsonify({"error": f"Failed to generate CSV: {str(e)}"}), 500
 @app.route("/api/schema-overview/<string:database_name>", methods=["GET"])
 def schema_overview(database_name):
-    conn = None
-    cursor = None
-    try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
+    """
+    Row counts and segment sizes for every table in a logical database.
 
-        # Step 1: Get the logical database ID
-        cursor.execute("""
-            SELECT id FROM logical_databases WHERE name = :1
-        """, [database_name])
-        db_row = cursor.fetchone()
-        if not db_row:
+    Statistics and sizes come from the schema snapshot, so only the catalog
+    tables are queried. Pass ?refresh_stats=true to queue a background
+    DBMS_STATS gather for the database's tables; the GET itself never gathers.
+    """
+    refresh_stats = request.args.get("refresh_stats", "false").lower() == "true"
+    try:
+        with db.connection() as conn, db.cursor(conn, db.FETCH_BULK) as cursor:
+            # LEFT JOIN from logical_databases so an empty database still
+            # returns one row and can be told apart from a missing one
+            cursor.execute("""
+                SELECT t.name
+                FROM logical_databases ldb
+                LEFT JOIN tables_metadata t ON t.database_id = ldb.id
+                WHERE ldb.name = :1
+                ORDER BY t.name
+            """, [database_name])
+            rows = cursor.fetchall()
+            snapshot = schema_snapshot.tables(conn)
+
+        if not rows:
             return jsonify({"error": f"Logical database '{database_name}' not found"}), 404
-        database_id = db_row[0]
-
-        # Step 2: Get all tables associated with this logical DB
-        cursor.execute("""
-            SELECT id, name
-            FROM tables_metadata
-            WHERE database_id = :1
-            ORDER BY name
-        """, [database_id])
-        table_rows = cursor.fetchall()
 
         tables = []
         total_size = 0
 
-        for table_id, table_name in table_rows:
-            table_name_upper = table_name.upper()
-
-            # Step 3a: Trigger fresh stats collection
-            try:
-                cursor.callproc("DBMS_STATS.GATHER_TABLE_STATS", [DB_USER, table_name_upper])
-            except Exception as e:
-                logger.warning(f"Could not gather stats for {table_name_upper}: {e}")
-
-            # Step 3b: Try to get NUM_ROWS from USER_TABLES
-            try:
-                cursor.execute("""
-                    SELECT NUM_ROWS
-                    FROM USER_TABLES
-                    WHERE TABLE_NAME = :1
-                """, [table_name_upper])
-                row = cursor.fetchone()
-                row_count = row[0] if row and row[0] is not None else None
-            except Exception as e:
-                logger.warning(f"Failed to get NUM_ROWS for {table_name_upper}: {e}")
-                row_count = None
-
-            # Step 3c: Fallback to actual COUNT(*)
-            if row_count is None:
-                try:
-                    cursor.execute(f'SELECT COUNT(*) FROM "{table_name}"')
-                    row_count = cursor.fetchone()[0]
-                except Exception as e:
-                    logger.error(f"Error executing COUNT(*) for {table_name}: {e}")
-                    row_count = None
-
-            # Step 4: Get table size in bytes
-            try:
-                cursor.execute("""
-                    SELECT NVL(SUM(bytes), 0)
-                    FROM user_segments
-                    WHERE segment_type = 'TABLE'
-                    AND segment_name = :1
-                """, [table_name_upper])
-                size_bytes = cursor.fetchone()[0]
-            except Exception:
-                size_bytes = 0
-
-            # Step 5: Get owner
-            owner = DB_USER
+        for table_name, in rows:
+            if table_name is None:
+                continue
 
+            entry = snapshot.get(table_name.upper()) or {}
+            segment = entry.get("segment") or {}
+            size_bytes = segment.get("bytes") or 0
+            last_analyzed = table_metadata.parse_time(entry.get("last_analyzed"))
             total_size += size_bytes
             tables.append({
                 "table": table_name,
-                "row_count": row_count,
+                "row_count": entry.get("num_rows"),
                 "size_bytes": size_bytes,
-                "owner": owner
+                "owner": DB_USER,
+                "last_analyzed": last_analyzed.isoformat() if last_analyzed else None,
+                "stats_age_seconds": stats_refresh.stats_age_seconds(last_analyzed)
             })
 
-        return jsonify({
+        result = {
             "database": database_name,
             "table_count": len(tables),
             "tables": tables,
             "database_size_bytes": total_size
-        })
+        }
+        if refresh_stats:
+            result["stats_refresh_queued"] = stats_refresh.submit([t["table"] for t in tables])
+        return jsonify(result)
 
     except Exception as e:
         logger.error(f"Error in schema_overview: {str(e)}")
         return jsonify({"error": str(e)}), 500
-    finally:
-        if cursor:
-            cursor.close()
-        if conn:
-            conn.close()
+
+
+@app.route("/api/stats-refresh", methods=["GET"])
+def get_stats_refresh_status():
+    """State of the background statistics refresh: last cycle, pending and in-flight tables"""
+    return jsonify(stats_refresh.status()), 200
+
+
+@app.route("/api/stats-refresh", methods=["POST"])
+def start_stats_refresh():
+    """Start a statistics refresh cycle now instead of waiting for the scheduler"""
+    if not stats_refresh.trigger():
+        return jsonify({"message": "Stats refresh already running"}), 409
+    return jsonify({"message": "Stats refresh started"}), 202
+
+
+@app.route("/api/column-index", methods=["GET"])
+def get_column_index_status():
+    """Size of the column index and what its last incremental refresh re-harvested"""
+    return jsonify(column_index.status()), 200
+
+
+@app.route("/api/column-index", methods=["POST"])
+def start_column_index_refresh():
+    """Re-harvest columns of tables whose LAST_DDL_TIME moved, without waiting for the scheduler"""
+    if column_index.status()["running"]:
+        return jsonify({"message": "Column index refresh already running"}), 409
+    column_index.refresh_in_background()
+    return jsonify({"message": "Column index refresh started"}), 202
+
+
+@app.route("/api/relationship-inference", methods=["GET"])
+def get_relationship_inference_status():
+    """Size and hit rate of the per-column sketch cache behind inferred relationships"""
+    return jsonify(relationship_inference.status()), 200
+
+
+@app.route("/api/schema-snapshot", methods=["GET"])
+def get_schema_snapshot_status():
+    """Size and age of the dictionary snapshot and what its last refresh re-harvested"""
+    return jsonify(schema_snapshot.status()), 200
+
+
+@app.route("/api/schema-snapshot", methods=["POST"])
+def start_schema_snapshot_refresh():
+    """Re-harvest tables whose LAST_DDL_TIME moved, without waiting for the scheduler"""
+    if not schema_snapshot.trigger():
+        return jsonify({"message": "Schema snapshot refresh already running"}), 409
+    return jsonify({"message": "Schema snapshot refresh started"}), 202
 
 
 #@app.route("/api/logical-databases", methods=["GET"])
@@ -3011,30 +2855,27 @@ def get_logical_databases():
     Return all logical databases with their LOB and Subject Area info.
     Used for import dropdown in frontend.
     """
-    conn = None
-    cursor = None
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        cursor.execute("""
-            SELECT 
-                db.id, 
-                db.name, 
-                l.name AS lob_name, 
-                sa.name AS subject_area_name
-            FROM logical_databases db
-            JOIN subject_area_logical_database sald ON db.id = sald.logical_database_id
-            JOIN subject_areas sa ON sald.subject_area_id = sa.id
-            JOIN lobs l ON sa.lob_id = l.id
-            ORDER BY db.id
-        """)
-        
-        columns = ['id', 'name', 'lob_name', 'subject_area_name']
-        rows = cursor.fetchall()
-        result = [dict(zip(columns, row)) for row in rows]
+        with db.connection() as conn, db.cursor(conn, db.FETCH_BULK) as cursor:
         
-        return jsonify(result), 200
+            cursor.execute("""
+                SELECT 
+                    db.id, 
+                    db.name, 
+                    l.name AS lob_name, 
+                    sa.name AS subject_area_name
+                FROM logical_databases db
+                JOIN subject_area_logical_database sald ON db.id = sald.logical_database_id
+                JOIN subject_areas sa ON sald.subject_area_id = sa.id
+                JOIN lobs l ON sa.lob_id = l.id
+                ORDER BY db.id
+            """)
+        
+            columns = ['id', 'name', 'lob_name', 'subject_area_name']
+            rows = cursor.fetchall()
+            result = [dict(zip(columns, row)) for row in rows]
+        
+            return jsonify(result), 200
         
     except oracledb.Error as e:
         logger.error(f"Database error in get_logical_databases: {e}")
@@ -3046,35 +2887,42 @@ def get_logical_databases():
         return jsonify({
             "error": str(e)
         }), 500
-    finally:
-        if cursor:
-            cursor.close()
-        if conn:
-            conn.close()
 
 
 if __name__ == "__main__":
-    app.run(debug=True)
-    # scheduler = BackgroundScheduler()
+    scheduler = BackgroundScheduler()
+
+    # Keep optimizer statistics fresh off the request path
+    stats_refresh.schedule(scheduler)
+    schema_snapshot.schedule(scheduler)
+    column_index.schedule(scheduler)
     
     # Schedule profiling job to run every week (Monday at 2 AM)
     # scheduler.add_job(
-    #     func=auto_profiler.run_scheduled_profiling,
+    #     func=get_auto_profiler().run_scheduled_profiling,
     #     trigger=CronTrigger(day_of_week='mon', hour=2, minute=0),
     #     id='weekly_profiling',
+    #     max_instances=1,
+    #     coalesce=True,
     #     replace_existing=True
     # )
     
     # # Run initial profiling immediately when server starts (after 10 seconds)
     # scheduler.add_job(
-    #     func=auto_profiler.run_scheduled_profiling,
+    #     func=get_auto_profiler().run_scheduled_profiling,
     #     trigger='date',
     #     run_date=datetime.now() + timedelta(seconds=10),
     #     id='startup_profiling'
     # )
     
-    # scheduler.start()
-    logger.info("Automated profiling scheduler started")
+    # With debug=True the reloader runs this module twice; only the child
+    # process that actually serves requests should run background jobs
+    if os.environ.get("WERKZEUG_RUN_MAIN") == "true":
+        scheduler.start()
+        logger.info("Background scheduler started")
+        search_index.warm()
+        column_index.warm()
+        er_graph.warm()
     
     try:
         # Verify database configuration
@@ -3083,6 +2931,9 @@ if __name__ == "__main__":
         if test_conn:
             test_conn.close()
             logger.info("Database connection successful")
+            catalog_indexes.ensure_indexes()
+            er_layout.ensure_table()
+            get_auto_profiler()
         else:
             logger.error("Could not establish database connection")
             sys.exit(1)
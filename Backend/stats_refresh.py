@@ -0,0 +1,220 @@
+import os
+import time
+import logging
+import threading
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+import oracledb
+
+import db
+import schema_snapshot
+
+logger = logging.getLogger(__name__)
+
+
+# --- Stats Refresh Configuration ---
+# Concurrent DBMS_STATS gathers; each one scans a whole table
+STATS_REFRESH_WORKERS = int(os.environ.get('STATS_REFRESH_WORKERS', '2'))
+# How often the scheduler looks for stale tables (minutes)
+STATS_REFRESH_INTERVAL_MINUTES = int(os.environ.get('STATS_REFRESH_INTERVAL_MINUTES', '30'))
+# No new gathers are started once a cycle has run this long (seconds)
+STATS_REFRESH_BUDGET_SECONDS = int(os.environ.get('STATS_REFRESH_BUDGET_SECONDS', '600'))
+# Tables are stale once this percentage of their rows has changed since the last gather
+STATS_STALE_PERCENT = float(os.environ.get('STATS_STALE_PERCENT', '10'))
+# ...or once their statistics are older than this, regardless of DML
+STATS_MAX_AGE_DAYS = int(os.environ.get('STATS_MAX_AGE_DAYS', '7'))
+
+_executor = ThreadPoolExecutor(max_workers=STATS_REFRESH_WORKERS, thread_name_prefix="stats-refresh")
+_in_flight = set()
+_in_flight_lock = threading.Lock()
+
+# Stale tables found by the last scan that the time budget did not reach
+_pending = []
+_last_cycle = {}
+_cycle_lock = threading.Lock()
+
+
+def stats_age_seconds(last_analyzed):
+    """Age of a LAST_ANALYZED timestamp in whole seconds, or None if never analyzed"""
+    if last_analyzed is None:
+        return None
+    return int((datetime.now() - last_analyzed).total_seconds())
+
+
+def gather_table_stats(table_name):
+    """Run DBMS_STATS.GATHER_TABLE_STATS for one of our tables on a pooled session"""
+    table_name_upper = table_name.upper()
+    try:
+        with db.connection() as conn, conn.cursor() as cursor:
+            cursor.callproc("DBMS_STATS.GATHER_TABLE_STATS", [db.DB_USER.upper(), table_name_upper])
+        logger.info(f"Gathered stats for {table_name_upper}")
+        schema_snapshot.mark_stale(table_name_upper)
+        return True
+    except oracledb.Error as e:
+        logger.warning(f"Could not gather stats for {table_name_upper}: {e}")
+        return False
+    finally:
+        with _in_flight_lock:
+            _in_flight.discard(table_name_upper)
+
+
+def _claim(table_names):
+    claimed = []
+    with _in_flight_lock:
+        for table_name in table_names:
+            table_name_upper = table_name.upper()
+            if table_name_upper in _in_flight:
+                continue
+            _in_flight.add(table_name_upper)
+            claimed.append(table_name_upper)
+    return claimed
+
+
+def submit(table_names):
+    """
+    Queue stats gathering for the given tables in the background.
+
+    Tables that already have a gather in flight are skipped. Returns the
+    names that were actually queued.
+    """
+    queued = _claim(table_names)
+    for table_name_upper in queued:
+        _executor.submit(gather_table_stats, table_name_upper)
+    return queued
+
+
+def in_flight():
+    with _in_flight_lock:
+        return sorted(_in_flight)
+
+
+def find_stale_tables(conn):
+    """
+    Catalog tables whose optimizer statistics need refreshing, most urgent first.
+
+    Never-analyzed tables come first, then tables by the share of rows touched
+    by DML since the last gather, then by how old their statistics are.
+    """
+    with db.cursor(conn) as cursor:
+        # USER_TAB_MODIFICATIONS is only flushed from memory periodically
+        try:
+            cursor.callproc("DBMS_STATS.FLUSH_DATABASE_MONITORING_INFO")
+        except oracledb.DatabaseError as e:
+            logger.debug(f"Could not flush DML monitoring info: {e}")
+
+    return db.query_all("""
+        SELECT table_name, num_rows, last_analyzed, dml_count
+        FROM (
+            SELECT ts.table_name,
+                   ts.num_rows,
+                   ts.last_analyzed,
+                   NVL(m.inserts + m.updates + m.deletes, 0) AS dml_count,
+                   NVL(m.inserts + m.updates + m.deletes, 0)
+                       / GREATEST(NVL(ts.num_rows, 0), 1) * 100 AS dml_percent,
+                   ts.stale_stats
+            FROM user_tab_statistics ts
+            LEFT JOIN user_tab_modifications m
+                ON m.table_name = ts.table_name AND m.partition_name IS NULL
+            WHERE ts.object_type = 'TABLE'
+            AND ts.table_name IN (SELECT UPPER(name) FROM tables_metadata)
+        )
+        WHERE last_analyzed IS NULL
+        OR stale_stats = 'YES'
+        OR dml_percent >= :1
+        OR last_analyzed < SYSDATE - :2
+        ORDER BY CASE WHEN last_analyzed IS NULL THEN 0 ELSE 1 END,
+                 dml_percent DESC,
+                 last_analyzed
+    """, [STATS_STALE_PERCENT, STATS_MAX_AGE_DAYS], conn=conn)
+
+
+def run_refresh_cycle():
+    """
+    Gather stats for stale tables in priority order, within the time budget.
+
+    At most STATS_REFRESH_WORKERS gathers run at once. A gather that has
+    started is allowed to finish, but none are started once the budget is
+    spent; whatever is left stays pending for the next cycle.
+    """
+    if not _cycle_lock.acquire(blocking=False):
+        logger.info("Stats refresh cycle already running, skipping")
+        return None
+
+    try:
+        started_at = datetime.now()
+        start = time.monotonic()
+        with db.connection() as conn:
+            stale = find_stale_tables(conn)
+
+        queue = [row[0] for row in stale]
+        running = set()
+        gathered = failed = 0
+
+        while queue or running:
+            out_of_budget = time.monotonic() - start >= STATS_REFRESH_BUDGET_SECONDS
+            while queue and not out_of_budget and len(running) < STATS_REFRESH_WORKERS:
+                table_name = queue.pop(0)
+                if not _claim([table_name]):
+                    continue
+                running.add(_executor.submit(gather_table_stats, table_name))
+            if not running:
+                break
+            done, running = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.result():
+                    gathered += 1
+                else:
+                    failed += 1
+
+        _pending[:] = queue
+        _last_cycle.clear()
+        _last_cycle.update({
+            "started_at": started_at.isoformat(),
+            "duration_seconds": round(time.monotonic() - start, 1),
+            "stale_tables": len(stale),
+            "gathered": gathered,
+            "failed": failed,
+            "pending": len(queue),
+        })
+        logger.info(f"Stats refresh cycle finished: {_last_cycle}")
+        return dict(_last_cycle)
+
+    except Exception as e:
+        logger.error(f"Stats refresh cycle failed: {e}")
+        return None
+    finally:
+        _cycle_lock.release()
+
+
+def trigger():
+    """Start a refresh cycle now on its own thread; False if one is already running"""
+    if _cycle_lock.locked():
+        return False
+    threading.Thread(target=run_refresh_cycle, name="stats-refresh-cycle", daemon=True).start()
+    return True
+
+
+def status():
+    return {
+        "interval_minutes": STATS_REFRESH_INTERVAL_MINUTES,
+        "budget_seconds": STATS_REFRESH_BUDGET_SECONDS,
+        "workers": STATS_REFRESH_WORKERS,
+        "running": _cycle_lock.locked(),
+        "in_flight": in_flight(),
+        "pending": list(_pending),
+        "last_cycle": dict(_last_cycle) or None,
+    }
+
+
+def schedule(scheduler):
+    """Register the periodic refresh cycle on an APScheduler scheduler"""
+    scheduler.add_job(
+        func=run_refresh_cycle,
+        trigger='interval',
+        minutes=STATS_REFRESH_INTERVAL_MINUTES,
+        id='stats_refresh',
+        max_instances=1,
+        coalesce=True,
+        replace_existing=True
+    )
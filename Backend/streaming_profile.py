@@ -0,0 +1,317 @@
+"""
+Chunked table profiling with bounded memory.
+
+Rows are fetched from Oracle in fixed-size chunks and folded into per-column
+accumulators, so peak memory is one chunk plus a few fixed-size sketches per
+column no matter how large the table is:
+
+- count, nulls, min and max are exact
+- mean and variance are merged chunk by chunk (Chan et al.)
+- distinct values are estimated with a k-minimum-values sketch
+- numeric histograms use fixed bins that double in width as the range grows
+- frequent values for non-numeric columns use Misra-Gries counters
+"""
+import os
+import html
+import time
+
+import numpy as np
+import pandas as pd
+
+import db
+
+
+# --- Streaming Profile Configuration ---
+PROFILE_CHUNK_ROWS = int(os.environ.get('PROFILE_CHUNK_ROWS', '50000'))
+# Hashes kept by the distinct-count sketch; relative error is about 1/sqrt(k)
+DISTINCT_SKETCH_SIZE = int(os.environ.get('PROFILE_DISTINCT_SKETCH_SIZE', '2048'))
+HISTOGRAM_BINS = 20  # must be even so bins can be merged pairwise
+TOP_VALUES = 10
+# Misra-Gries counters kept per column; more counters, tighter frequency bounds
+TOP_VALUE_COUNTERS = TOP_VALUES * 10
+# mode="auto" streams tables whose dictionary NUM_ROWS is at least this
+PROFILE_STREAMING_MIN_ROWS = int(os.environ.get('PROFILE_STREAMING_MIN_ROWS', '1000000'))
+
+_HASH_SPACE = float(2 ** 64)
+
+
+def _scalar(value):
+    """Turn numpy/pandas scalars into plain Python values for json"""
+    if value is None or (isinstance(value, float) and np.isnan(value)):
+        return None
+    if isinstance(value, pd.Timestamp):
+        return value.isoformat()
+    if isinstance(value, np.generic):
+        return value.item()
+    return value
+
+
+class ColumnStats:
+    """Mergeable statistics for one column, updated one chunk at a time"""
+
+    def __init__(self, name):
+        self.name = name
+        self.kind = None  # "numeric", "datetime" or "categorical", from the first non-null chunk
+        self.count = 0
+        self.nulls = 0
+        self.min = None
+        self.max = None
+
+        # Running mean / sum of squared deviations for numeric columns
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.numeric_count = 0
+
+        self.hashes = np.empty(0, dtype=np.uint64)
+
+        self.hist_lo = None
+        self.hist_width = None
+        self.hist_counts = None
+
+        self.top_counters = {}
+
+    def update(self, series):
+        self.count += len(series)
+        values = series.dropna()
+        self.nulls += len(series) - len(values)
+        if values.empty:
+            return
+
+        if self.kind is None:
+            if pd.api.types.is_bool_dtype(values):
+                self.kind = "categorical"
+            elif pd.api.types.is_numeric_dtype(values):
+                self.kind = "numeric"
+            elif pd.api.types.is_datetime64_any_dtype(values):
+                self.kind = "datetime"
+            else:
+                self.kind = "categorical"
+
+        if self.kind == "numeric":
+            values = pd.to_numeric(values, errors="coerce").dropna().astype("float64")
+            if values.empty:
+                return
+            self._update_moments(values)
+            finite = values.to_numpy()
+            finite = finite[np.isfinite(finite)]
+            if len(finite):
+                self._update_histogram(finite)
+        elif self.kind == "categorical":
+            values = values.astype(str)
+            self._update_top_values(values)
+
+        self._update_min_max(values.min(), values.max())
+        self._update_distinct(values)
+
+    def _update_min_max(self, chunk_min, chunk_max):
+        if self.min is None or chunk_min < self.min:
+            self.min = chunk_min
+        if self.max is None or chunk_max > self.max:
+            self.max = chunk_max
+
+    def _update_moments(self, values):
+        n_b = len(values)
+        mean_b = values.mean()
+        m2_b = ((values - mean_b) ** 2).sum()
+
+        n_a = self.numeric_count
+        n = n_a + n_b
+        delta = mean_b - self.mean
+        self.mean += delta * n_b / n
+        self.m2 += m2_b + delta ** 2 * n_a * n_b / n
+        self.numeric_count = n
+
+    def _update_distinct(self, values):
+        hashed = pd.util.hash_pandas_object(values, index=False).to_numpy(dtype=np.uint64)
+        merged = np.union1d(self.hashes, hashed)  # sorted and de-duplicated
+        self.hashes = merged[:DISTINCT_SKETCH_SIZE]
+
+    def _update_histogram(self, values):
+        chunk_min = values.min()
+        chunk_max = values.max()
+        if self.hist_counts is None:
+            span = chunk_max - chunk_min
+            self.hist_lo = chunk_min
+            self.hist_width = span / HISTOGRAM_BINS if span > 0 else 1.0
+            self.hist_counts = np.zeros(HISTOGRAM_BINS, dtype=np.int64)
+
+        # Double the bin width until the chunk fits, merging old bins pairwise
+        half = HISTOGRAM_BINS // 2
+        while chunk_min < self.hist_lo or chunk_max > self.hist_lo + self.hist_width * HISTOGRAM_BINS:
+            merged = self.hist_counts.reshape(half, 2).sum(axis=1)
+            counts = np.zeros(HISTOGRAM_BINS, dtype=np.int64)
+            if chunk_min < self.hist_lo:
+                self.hist_lo -= self.hist_width * HISTOGRAM_BINS
+                counts[half:] = merged
+            else:
+                counts[:half] = merged
+            self.hist_counts = counts
+            self.hist_width *= 2
+
+        bins = np.floor((values - self.hist_lo) / self.hist_width).astype(np.int64)
+        bins = np.clip(bins, 0, HISTOGRAM_BINS - 1)
+        self.hist_counts += np.bincount(bins, minlength=HISTOGRAM_BINS)
+
+    def _update_top_values(self, values):
+        for value, count in values.value_counts().items():
+            self.top_counters[value] = self.top_counters.get(value, 0) + int(count)
+        if len(self.top_counters) > TOP_VALUE_COUNTERS:
+            # Misra-Gries: subtract the (m+1)-th largest count from every counter
+            cutoff = sorted(self.top_counters.values(), reverse=True)[TOP_VALUE_COUNTERS]
+            self.top_counters = {
+                value: count - cutoff
+                for value, count in self.top_counters.items()
+                if count > cutoff
+            }
+
+    def distinct_estimate(self):
+        if len(self.hashes) < DISTINCT_SKETCH_SIZE:
+            return len(self.hashes)
+        kth = float(self.hashes[-1]) / _HASH_SPACE
+        return int((DISTINCT_SKETCH_SIZE - 1) / kth)
+
+    def to_dict(self):
+        result = {
+            "name": self.name,
+            "type": self.kind,
+            "count": self.count,
+            "non_null": self.count - self.nulls,
+            "nulls": self.nulls,
+            "null_percent": round(self.nulls / self.count * 100, 2) if self.count else 0.0,
+            "distinct_estimate": self.distinct_estimate(),
+            "min": _scalar(self.min),
+            "max": _scalar(self.max),
+        }
+        if self.kind == "numeric" and self.numeric_count:
+            variance = self.m2 / (self.numeric_count - 1) if self.numeric_count > 1 else 0.0
+            result["mean"] = float(self.mean)
+            result["variance"] = float(variance)
+            result["std"] = float(np.sqrt(variance))
+        if self.hist_counts is not None:
+            edges = self.hist_lo + self.hist_width * np.arange(HISTOGRAM_BINS + 1)
+            result["histogram"] = {
+                "edges": [float(edge) for edge in edges],
+                "counts": [int(count) for count in self.hist_counts],
+            }
+        if self.kind == "categorical":
+            top = sorted(self.top_counters.items(), key=lambda item: item[1], reverse=True)[:TOP_VALUES]
+            # Misra-Gries counts are lower bounds on the true frequencies
+            result["top_values"] = [{"value": value, "min_count": count} for value, count in top]
+        return result
+
+
+class StreamingProfile:
+    """Folds DataFrame chunks into per-column statistics"""
+
+    def __init__(self):
+        self.columns = {}
+        self.rows = 0
+        self.chunks = 0
+
+    def update(self, chunk):
+        self.rows += len(chunk)
+        self.chunks += 1
+        for name in chunk.columns:
+            if name not in self.columns:
+                self.columns[name] = ColumnStats(name)
+            self.columns[name].update(chunk[name])
+
+    def to_dict(self):
+        return {
+            "rows": self.rows,
+            "column_count": len(self.columns),
+            "chunks": self.chunks,
+            "columns": [stats.to_dict() for stats in self.columns.values()],
+        }
+
+
+def estimated_rows(conn, table_name):
+    """Dictionary NUM_ROWS for one of our tables, or None without statistics"""
+    row = db.query_one(
+        "SELECT num_rows FROM user_tables WHERE table_name = :1",
+        [table_name.upper()],
+        conn=conn
+    )
+    return row[0] if row else None
+
+
+def should_stream(conn, table_name):
+    """Whether a table is big enough, by dictionary statistics, to profile in chunks"""
+    num_rows = estimated_rows(conn, table_name)
+    return num_rows is not None and num_rows >= PROFILE_STREAMING_MIN_ROWS
+
+
+def iter_chunks(conn, query, params=None, chunk_rows=PROFILE_CHUNK_ROWS):
+    """Yield DataFrames of at most chunk_rows rows, one fetchmany() at a time"""
+    with db.cursor(conn, (chunk_rows, db.FETCH_DEFAULT[1])) as cursor:
+        cursor.execute(query, params or [])
+        columns = [desc[0] for desc in cursor.description]
+        while True:
+            rows = cursor.fetchmany(chunk_rows)
+            if not rows:
+                break
+            yield pd.DataFrame.from_records(rows, columns=columns)
+
+
+def profile_query(conn, query, params=None, chunk_rows=PROFILE_CHUNK_ROWS, on_chunk=None):
+    """
+    Profile the rows of a query without ever holding more than one chunk.
+
+    on_chunk, if given, is called with the running row count after each chunk.
+    """
+    start = time.perf_counter()
+    profile = StreamingProfile()
+    for chunk in iter_chunks(conn, query, params, chunk_rows):
+        profile.update(chunk)
+        if on_chunk:
+            on_chunk(profile.rows)
+    result = profile.to_dict()
+    result["elapsed_seconds"] = round(time.perf_counter() - start, 3)
+    return result
+
+
+def to_html(report, title):
+    """Render a streaming profile as a standalone HTML page"""
+    rows = []
+    for col in report["columns"]:
+        extra = ""
+        if "mean" in col:
+            extra = f"mean {col['mean']:.4g}, std {col['std']:.4g}"
+        elif col.get("top_values"):
+            extra = ", ".join(
+                f"{html.escape(str(top['value']))} (&ge;{top['min_count']:,})"
+                for top in col["top_values"][:5]
+            )
+        rows.append(f"""
+            <tr>
+                <td>{html.escape(str(col['name']))}</td>
+                <td>{col['type'] or ''}</td>
+                <td>{col['nulls']:,} ({col['null_percent']}%)</td>
+                <td>~{col['distinct_estimate']:,}</td>
+                <td>{html.escape(str(col['min']))}</td>
+                <td>{html.escape(str(col['max']))}</td>
+                <td>{extra}</td>
+            </tr>""")
+
+    return f"""<!DOCTYPE html>
+<html>
+<head>
+<meta charset="utf-8">
+<title>{html.escape(title)}</title>
+<style>
+    body {{ font-family: sans-serif; margin: 20px; }}
+    table {{ border-collapse: collapse; width: 100%; }}
+    th, td {{ border: 1px solid #dee2e6; padding: 6px 10px; text-align: left; font-size: 14px; }}
+    th {{ background: #f8f9fa; }}
+</style>
+</head>
+<body>
+<h2>{html.escape(title)}</h2>
+<p><strong>Rows:</strong> {report['rows']:,} | <strong>Columns:</strong> {report['column_count']}</p>
+<table>
+    <tr><th>Column</th><th>Type</th><th>Nulls</th><th>Distinct</th><th>Min</th><th>Max</th><th>Summary</th></tr>
+    {''.join(rows)}
+</table>
+</body>
+</html>
+"""
@@ -0,0 +1,340 @@
+"""
+Streaming exports of table data as CSV, Parquet or Arrow.
+
+Rows are fetched TABLE_EXPORT_FETCH_ROWS at a time and written out batch by
+batch, so memory stays flat whatever the size of the table and the client
+starts receiving bytes as soon as the first batch is fetched. The pooled
+connection is held for the lifetime of the generator and released when it
+finishes or the client goes away.
+
+For Parquet and Arrow each fetch batch becomes an Arrow record batch
+directly: through python-oracledb's DataFrame fetch (fetch_df_batches) when
+the driver has it, otherwise by building Arrow arrays from the fetched
+tuples. Parquet row groups of about TABLE_EXPORT_ROW_GROUP_ROWS rows are
+written to the response as they fill up; nothing goes through pandas.
+
+NUMBER columns keep their exact values: NUMBER(p, 0) up to 18 digits becomes
+int64, and other NUMBER(p, s) becomes decimal128(p, s), fetched as Decimal.
+Plain NUMBER has no declared scale, so it becomes decimal128(38,
+TABLE_EXPORT_NUMBER_SCALE), which holds any sequence or identity value
+exactly; digits past that scale are rounded off. Exports with decimal
+columns take the tuple path, since the DataFrame fetch returns such
+columns as float64.
+"""
+import io
+import os
+import csv
+import zlib
+import decimal
+import logging
+
+import oracledb
+import pyarrow
+import pyarrow.ipc
+import pyarrow.parquet
+
+import db
+import schema_snapshot
+
+logger = logging.getLogger(__name__)
+
+
+# --- Table Export Configuration ---
+TABLE_EXPORT_FETCH_ROWS = int(os.environ.get('TABLE_EXPORT_FETCH_ROWS', '10000'))
+TABLE_EXPORT_GZIP_LEVEL = int(os.environ.get('TABLE_EXPORT_GZIP_LEVEL', '6'))
+# Rows per Parquet row group; batches are buffered up to this many rows before a group is written
+TABLE_EXPORT_ROW_GROUP_ROWS = int(os.environ.get('TABLE_EXPORT_ROW_GROUP_ROWS', '100000'))
+TABLE_EXPORT_PARQUET_COMPRESSION = os.environ.get('TABLE_EXPORT_PARQUET_COMPRESSION', 'zstd')
+# Decimal places kept for NUMBER columns declared without precision or scale
+TABLE_EXPORT_NUMBER_SCALE = int(os.environ.get('TABLE_EXPORT_NUMBER_SCALE', '10'))
+
+# format -> (mimetype, file extension)
+EXPORT_FORMATS = {
+    "csv": ("text/csv", "csv"),
+    "parquet": ("application/vnd.apache.parquet", "parquet"),
+    "arrow": ("application/vnd.apache.arrow.stream", "arrows"),
+}
+
+_BINARY_TYPES = (oracledb.DB_TYPE_RAW, oracledb.DB_TYPE_LONG_RAW, oracledb.DB_TYPE_BLOB)
+# Oracle reports scale -127 for NUMBER without precision and scale, and for FLOAT
+_NO_SCALE = -127
+_DECIMAL_DIGITS = 38
+_ROUNDING = decimal.Context(prec=_DECIMAL_DIGITS)
+
+
+def _number_type(column):
+    """Arrow type that holds a NUMBER column's values exactly (FLOAT stays float64)"""
+    precision, scale = column.precision, column.scale
+    if scale == _NO_SCALE:
+        if precision:
+            return pyarrow.float64()
+        return pyarrow.decimal128(_DECIMAL_DIGITS, TABLE_EXPORT_NUMBER_SCALE)
+    if scale <= 0:
+        # Negative scales round to tens, hundreds, ...: still whole numbers
+        digits = precision - scale if precision else _DECIMAL_DIGITS
+        if digits <= 18:
+            return pyarrow.int64()
+        return pyarrow.decimal128(min(digits, _DECIMAL_DIGITS), 0)
+    precision = precision or _DECIMAL_DIGITS
+    return pyarrow.decimal128(max(precision, scale), scale)
+
+
+def _fetch_lobs_inline(cursor, metadata):
+    """
+    Fetch LOBs as strings/bytes in the same round trip instead of one locator
+    call per value, and decimal NUMBER columns as Decimal instead of float.
+    """
+    if metadata.type_code is oracledb.DB_TYPE_NUMBER and pyarrow.types.is_decimal(_number_type(metadata)):
+        return cursor.var(decimal.Decimal, arraysize=cursor.arraysize)
+    if metadata.type_code is oracledb.DB_TYPE_CLOB:
+        return cursor.var(oracledb.DB_TYPE_LONG, arraysize=cursor.arraysize)
+    if metadata.type_code is oracledb.DB_TYPE_NCLOB:
+        return cursor.var(oracledb.DB_TYPE_LONG_NVARCHAR, arraysize=cursor.arraysize)
+    if metadata.type_code is oracledb.DB_TYPE_BLOB:
+        return cursor.var(oracledb.DB_TYPE_LONG_RAW, arraysize=cursor.arraysize)
+    return None
+
+
+def export_query(table_name):
+    """SELECT over one of our tables' columns in column order, or None if the table does not exist"""
+    entry = schema_snapshot.table(table_name)
+    if entry is None or not entry["columns"]:
+        return None
+    # Names come from the dictionary snapshot, so quoting them is safe
+    columns = ", ".join(_select_item(column) for column in entry["columns"])
+    return f'SELECT {columns} FROM "{table_name.upper()}"'
+
+
+def _select_item(column):
+    name = f'"{column["name"]}"'
+    if "TIME ZONE" in (column["data_type"] or ""):
+        # The driver drops the offset and returns the column's wall-clock time;
+        # normalize to UTC first so the values are the instants _arrow_field tags as UTC
+        return f"FROM_TZ(SYS_EXTRACT_UTC({name}), 'UTC') AS {name}"
+    return name
+
+
+def iter_batches(query, fetch_rows=TABLE_EXPORT_FETCH_ROWS):
+    """Yield the cursor description first, then lists of up to fetch_rows rows"""
+    with db.connection() as conn, db.cursor(conn, (fetch_rows, fetch_rows)) as cursor:
+        cursor.outputtypehandler = _fetch_lobs_inline
+        cursor.execute(query)
+        yield cursor.description
+        while True:
+            rows = cursor.fetchmany()
+            if not rows:
+                break
+            yield rows
+
+
+def iter_csv(query, compress=False):
+    """CSV text for query as a stream of bytes chunks, one per fetch batch, optionally gzipped"""
+    compressor = zlib.compressobj(TABLE_EXPORT_GZIP_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS) if compress else None
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    exported = 0
+
+    def drain():
+        data = buffer.getvalue().encode("utf-8")
+        buffer.seek(0)
+        buffer.truncate()
+        return compressor.compress(data) if compressor else data
+
+    try:
+        batches = iter_batches(query)
+        description = next(batches)
+        writer.writerow([column[0] for column in description])
+        binary = [i for i, column in enumerate(description) if column.type_code in _BINARY_TYPES]
+        yield drain()
+
+        for rows in batches:
+            if binary:
+                rows = [list(row) for row in rows]
+                for row in rows:
+                    for i in binary:
+                        if row[i] is not None:
+                            row[i] = row[i].hex()
+            writer.writerows(rows)
+            exported += len(rows)
+            chunk = drain()
+            if chunk:
+                yield chunk
+
+        if compressor:
+            yield compressor.flush()
+        logger.info(f"Exported {exported} rows as CSV")
+    except Exception as e:
+        # Headers are already sent; all we can do is stop and leave a truncated file
+        logger.error(f"CSV export failed after {exported} rows: {e}")
+        raise
+
+
+def _arrow_field(column):
+    """Arrow field for a cursor description entry, matching what python-oracledb returns for it"""
+    type_code = column.type_code
+    if type_code is oracledb.DB_TYPE_NUMBER:
+        arrow_type = _number_type(column)
+    elif type_code in (oracledb.DB_TYPE_BINARY_FLOAT, oracledb.DB_TYPE_BINARY_DOUBLE):
+        arrow_type = pyarrow.float64()
+    elif type_code in (oracledb.DB_TYPE_DATE, oracledb.DB_TYPE_TIMESTAMP):
+        arrow_type = pyarrow.timestamp("us")
+    elif type_code in (oracledb.DB_TYPE_TIMESTAMP_TZ, oracledb.DB_TYPE_TIMESTAMP_LTZ):
+        arrow_type = pyarrow.timestamp("us", tz="UTC")
+    elif type_code is oracledb.DB_TYPE_INTERVAL_DS:
+        arrow_type = pyarrow.duration("us")
+    elif type_code in _BINARY_TYPES:
+        arrow_type = pyarrow.binary()
+    elif type_code is oracledb.DB_TYPE_BOOLEAN:
+        arrow_type = pyarrow.bool_()
+    else:
+        arrow_type = pyarrow.string()
+    return pyarrow.field(column.name, arrow_type)
+
+
+def _rows_to_batch(rows, schema):
+    arrays = []
+    for values, field in zip(zip(*rows), schema):
+        if pyarrow.types.is_string(field.type):
+            # Catch-all for types Arrow cannot take as-is (intervals YM, ROWID, objects)
+            values = [value if value is None or isinstance(value, str) else str(value) for value in values]
+        elif pyarrow.types.is_decimal(field.type):
+            # Plain NUMBER values can have more decimal places than the column's Arrow scale
+            exponent = decimal.Decimal(1).scaleb(-field.type.scale)
+            values = [
+                value if value is None or value.as_tuple().exponent >= -field.type.scale
+                else _ROUNDING.quantize(value, exponent)
+                for value in values
+            ]
+        arrays.append(pyarrow.array(values, type=field.type))
+    return pyarrow.RecordBatch.from_arrays(arrays, schema=schema)
+
+
+def _tuple_record_batches(query):
+    batches = iter_batches(query)
+    schema = pyarrow.schema([_arrow_field(column) for column in next(batches)])
+    yield schema
+    for rows in batches:
+        yield _rows_to_batch(rows, schema)
+
+
+def _dataframe_record_batches(conn, query):
+    for odf in conn.fetch_df_batches(statement=query, size=TABLE_EXPORT_FETCH_ROWS):
+        table = pyarrow.Table.from_arrays(
+            [pyarrow.array(column) for column in odf.column_arrays()],
+            names=odf.column_names()
+        )
+        yield from table.to_batches()
+
+
+def _has_decimal_numbers(conn, query):
+    """Whether query returns NUMBER columns that need decimal128, found by parsing it without running it"""
+    with conn.cursor() as cursor:
+        cursor.parse(query)
+        return any(
+            column.type_code is oracledb.DB_TYPE_NUMBER and pyarrow.types.is_decimal(_number_type(column))
+            for column in cursor.description
+        )
+
+
+def iter_record_batches(query):
+    """Yield the Arrow schema first, then one or more record batches per fetch batch"""
+    with db.connection() as conn:
+        if hasattr(conn, "fetch_df_batches") and not _has_decimal_numbers(conn, query):
+            batches = _dataframe_record_batches(conn, query)
+            try:
+                first = next(batches, None)
+            except oracledb.NotSupportedError as e:
+                # e.g. column types the DataFrame fetch does not handle yet
+                logger.info(f"DataFrame fetch not usable for this export, fetching tuples: {e}")
+            else:
+                if first is not None:
+                    yield first.schema
+                    yield first
+                    for batch in batches:
+                        yield batch if batch.schema == first.schema else batch.cast(first.schema)
+                    return
+                # Empty result: the tuple path still yields the schema
+
+    yield from _tuple_record_batches(query)
+
+
+class _ChunkSink(io.RawIOBase):
+    """Write-only file object that keeps what was written until drain() hands it out"""
+
+    def __init__(self):
+        super().__init__()
+        self.chunks = []
+        self.position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        data = bytes(data)
+        self.chunks.append(data)
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def drain(self):
+        data = b"".join(self.chunks)
+        self.chunks.clear()
+        return data
+
+
+def iter_parquet(query):
+    """Parquet file for query as a stream of bytes chunks, one per row group"""
+    sink = _ChunkSink()
+    exported = 0
+    try:
+        batches = iter_record_batches(query)
+        schema = next(batches)
+        with pyarrow.parquet.ParquetWriter(sink, schema, compression=TABLE_EXPORT_PARQUET_COMPRESSION) as writer:
+            pending, pending_rows = [], 0
+            for batch in batches:
+                pending.append(batch)
+                pending_rows += batch.num_rows
+                if pending_rows >= TABLE_EXPORT_ROW_GROUP_ROWS:
+                    writer.write_table(pyarrow.Table.from_batches(pending, schema), row_group_size=pending_rows)
+                    exported += pending_rows
+                    pending, pending_rows = [], 0
+                    yield sink.drain()
+            if pending:
+                writer.write_table(pyarrow.Table.from_batches(pending, schema), row_group_size=pending_rows)
+                exported += pending_rows
+        yield sink.drain()
+        logger.info(f"Exported {exported} rows as Parquet")
+    except Exception as e:
+        logger.error(f"Parquet export failed after {exported} rows: {e}")
+        raise
+
+
+def iter_arrow(query):
+    """Arrow IPC stream for query as a stream of bytes chunks, one per record batch"""
+    sink = _ChunkSink()
+    exported = 0
+    try:
+        batches = iter_record_batches(query)
+        schema = next(batches)
+        with pyarrow.ipc.new_stream(sink, schema) as writer:
+            yield sink.drain()
+            for batch in batches:
+                writer.write_batch(batch)
+                exported += batch.num_rows
+                yield sink.drain()
+        yield sink.drain()
+        logger.info(f"Exported {exported} rows as Arrow")
+    except Exception as e:
+        logger.error(f"Arrow export failed after {exported} rows: {e}")
+        raise
+
+
+def iter_export(query, fmt, compress=False):
+    """Bytes chunks of query's rows in one of EXPORT_FORMATS; compress only applies to CSV"""
+    if fmt == "parquet":
+        return iter_parquet(query)
+    if fmt == "arrow":
+        return iter_arrow(query)
+    return iter_csv(query, compress)
@@ -0,0 +1,101 @@
+"""
+Table metadata served from the schema snapshot.
+
+The overview, primary-key and attribute endpoints read a table's columns,
+constraints, indexes, size, triggers and comments from schema_snapshot
+instead of the data dictionary. A table that is missing from the snapshot,
+or was marked stale after DDL or a stats gather, is harvested on its own
+before it is returned.
+"""
+import logging
+from datetime import datetime
+
+import schema_snapshot
+
+logger = logging.getLogger(__name__)
+
+
+def parse_time(value):
+    """Snapshot timestamps are stored as 'YYYY-MM-DD HH:MM:SS' strings"""
+    return datetime.strptime(value, "%Y-%m-%d %H:%M:%S") if value else None
+
+
+def overview(table_name, conn=None):
+    """
+    Everything the table overview shows about one of our tables, or None if it does not exist.
+
+    table.last_analyzed is returned as a datetime for the caller to format.
+    """
+    entry = schema_snapshot.table(table_name, conn)
+    if entry is None:
+        return None
+    table_name_upper = table_name.upper()
+
+    pk_columns = {c["column"] for c in entry["constraints"] if c["type"] == "P"}
+    fk_columns = {c["column"] for c in entry["constraints"] if c["type"] == "R"}
+    segment = entry["segment"] or {}
+
+    return {
+        "table": {
+            "table_name": table_name_upper,
+            "num_rows": entry["num_rows"],
+            "tablespace": entry["tablespace"],
+            "blocks": entry["blocks"],
+            "empty_blocks": entry["empty_blocks"],
+            "last_analyzed": parse_time(entry["last_analyzed"]),
+            "stats_stale": entry["stats_stale"],
+            "comment": entry["comment"],
+        },
+        "columns": [
+            dict(
+                column,
+                primary_key="Y" if column["name"] in pk_columns else "N",
+                foreign_key="Y" if column["name"] in fk_columns else "N",
+            )
+            for column in entry["columns"]
+        ],
+        "constraints": entry["constraints"],
+        "indexes": entry["indexes"],
+        "size_info": {
+            "size_kb": segment["bytes"] / 1024 if segment.get("bytes") is not None else None,
+            "blocks": segment.get("blocks"),
+            "initial_extent": segment.get("initial_extent"),
+            "next_extent": segment.get("next_extent"),
+        },
+        "triggers": entry["triggers"],
+        "object_info": {
+            "name": table_name_upper,
+            "type": "TABLE",
+            "status": entry["status"],
+            "created": entry["created"],
+            "last_ddl_time": entry["last_ddl_time"],
+            "timestamp": entry["timestamp"],
+        },
+    }
+
+
+def primary_key(table_name, conn=None):
+    """
+    (constraint name, [column dicts with pk_position]) for a table's primary key.
+
+    Returns None if the table does not exist and (None, []) if it has no primary key.
+    """
+    entry = schema_snapshot.table(table_name, conn)
+    if entry is None:
+        return None
+    columns = {column["name"]: column for column in entry["columns"]}
+    pk = sorted(
+        (c for c in entry["constraints"] if c["type"] == "P" and c["column"] in columns),
+        key=lambda c: c["position"] or 0
+    )
+    if not pk:
+        return None, []
+    return pk[0]["name"], [dict(columns[c["column"]], pk_position=c["position"]) for c in pk]
+
+
+def column_names(table_name, conn=None):
+    """A table's column names in column order, or None if it does not exist"""
+    entry = schema_snapshot.table(table_name, conn)
+    if entry is None:
+        return None
+    return [column["name"] for column in entry["columns"]]